@@ -56,7 +56,7 @@ options:
     version_added: "1.2"
   mode:
     description:
-      - Switches the module behaviour between put (upload), get (download), geturl (return download url (Ansible 1.3+), getstr (download object as string (1.3+)), create (bucket) and delete (bucket). 
+      - Switches the module behaviour between put (upload), get (download), geturl (return download url (Ansible 1.3+), getstr (download object as string (1.3+)), create (bucket), delete (bucket) and sync (directory tree, Ansible 1.9+). 
     required: true
     default: null
     aliases: []
@@ -95,6 +95,45 @@ options:
     required: false
     default: null
     version_added: "1.8"
+  part_size:
+    description:
+      - Size in megabytes of the parts used for multipart uploads and ranged downloads. Objects larger than this are transferred in parts; S3 requires parts of at least 5 megabytes. Also used to compute the composite ETag of local files when comparing them with multipart objects.
+    required: false
+    default: 8
+    version_added: "1.9"
+  concurrency:
+    description:
+      - Number of parts transferred in parallel during a multipart upload or ranged download.
+    required: false
+    default: 4
+    version_added: "1.9"
+  resume:
+    description:
+      - Resume interrupted transfers. An unfinished multipart upload of the same object is reused and parts whose checksum matches are not sent again; an interrupted download keeps its partial file next to C(dest) and only fetches the missing parts. When disabled, a failed multipart upload is aborted and partial downloads are discarded. Unfinished multipart uploads are billed until they are completed or aborted, and a reused upload keeps the C(metadata) it was started with.
+    required: false
+    default: false
+    choices: [ "yes", "no" ]
+    version_added: "1.9"
+  direction:
+    description:
+      - Used with mode=sync. C(push) makes the objects below C(object) match the local directory C(src), C(pull) makes the local directory C(dest) match the objects below C(object). Files are compared on size and ETag and only the differences are transferred.
+    required: false
+    default: push
+    choices: [ "push", "pull" ]
+    version_added: "1.9"
+  delete:
+    description:
+      - Used with mode=sync. Remove objects (push) or local files (pull) that do not exist on the other side.
+    required: false
+    default: false
+    choices: [ "yes", "no" ]
+    version_added: "1.9"
+  manifest:
+    description:
+      - Used with mode=sync. Path of a local cache recording the size, modification time and ETag of every synced file. Files whose size and modification time did not change since the last sync are not hashed again.
+    required: false
+    default: null
+    version_added: "1.9"
 
 requirements: [ "boto" ]
 author: Lester Wade, Ralph Tice
@@ -127,16 +166,30 @@ EXAMPLES = '''
 - s3: bucket=mybucket mode=create region=eu-west-1
 # Delete a bucket and all contents
 - s3: bucket=mybucket mode=delete
+# Push a static site, removing objects that no longer exist locally
+- s3: bucket=mybucket object=/site src=/srv/www/site mode=sync delete=yes manifest=/var/cache/site.manifest concurrency=16
+# Pull everything below a prefix into a local directory
+- s3: bucket=mybucket object=/backups dest=/srv/backups mode=sync direction=pull
+# PUT/upload a large file in 64MB parts, 8 at a time
+- s3: bucket=mybucket object=/images/disk.img src=/srv/images/disk.img mode=put part_size=64 concurrency=8
 '''
 
 import sys
 import os
 import urlparse
 import hashlib
+import threading
+import Queue
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 try:
     import boto
     from boto.s3.connection import Location
+    from boto.s3.multipart import MultiPartUpload
 except ImportError:
     print "failed=True msg='boto required for this module'"
     sys.exit(1)
@@ -157,11 +210,125 @@ def keysum(module, s3, bucket, obj):
     key_check = bucket.get_key(obj)
     if not key_check:
         return None
-    md5_remote = key_check.etag[1:-1]
-    etag_multipart = '-' in md5_remote # Check for multipart, etag is not md5
-    if etag_multipart is True:
-        module.fail_json(msg="Files uploaded with multipart of s3 are not supported with checksum, unable to compute checksum.")
-    return md5_remote
+    return key_check.etag[1:-1]
+
+BLOCKSIZE = 64 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+def part_ranges(size, part_size):
+    """ Return a (part_number, offset, length) tuple for each part of a transfer """
+    ranges = []
+    offset = 0
+    part_number = 1
+    while offset < size:
+        length = min(part_size, size - offset)
+        ranges.append((part_number, offset, length))
+        offset += length
+        part_number += 1
+    return ranges
+
+def range_md5(path, offset, length):
+    """ Return the md5 of length bytes of path starting at offset, read in blocks """
+    digest = hashlib.md5()
+    f = open(path, 'rb')
+    try:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(BLOCKSIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    finally:
+        f.close()
+    return digest
+
+def multipart_etag(path, part_size):
+    """ Compute the ETag S3 assigns to path when uploaded in parts of part_size bytes """
+    ranges = part_ranges(os.path.getsize(path), part_size)
+    composite = hashlib.md5()
+    for part_number, offset, length in ranges:
+        composite.update(range_md5(path, offset, length).digest())
+    return '%s-%d' % (composite.hexdigest(), len(ranges))
+
+def etag_part_sizes(size, count, part_size):
+    """ Part sizes that split an object of size bytes into count parts.
+
+    The configured part_size is tried first, followed by the smallest whole
+    megabyte part size giving count parts, which is what most clients use."""
+    candidates = [part_size]
+    if count > 1:
+        mb = 1024 * 1024
+        guess = (size + count - 1) // count
+        candidates.append(((guess + mb - 1) // mb) * mb)
+    sizes = []
+    for candidate in candidates:
+        if candidate not in sizes and len(part_ranges(size, candidate)) == count:
+            sizes.append(candidate)
+    return sizes
+
+def etag_matches(module, path, etag, part_size):
+    """ Return True if the local file at path has the given S3 ETag """
+    if etag is None:
+        return False
+    if '-' not in etag:
+        return module.md5(path) == etag
+    try:
+        count = int(etag.split('-', 1)[1])
+    except ValueError:
+        return False
+    for candidate in etag_part_sizes(os.path.getsize(path), count, part_size):
+        if multipart_etag(path, candidate) == etag:
+            return True
+    return False
+
+def run_parallel(func, items, concurrency):
+    """ Call func for every item from up to concurrency threads.
+
+    The first exception raised by a worker is re-raised once all workers
+    have stopped."""
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for i in range(max(1, min(concurrency, len(items)))):
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+def thread_bucket(connect, bucket):
+    """ Return a function giving the calling thread its own copy of bucket.
+
+    boto connections must not be shared between threads, so every worker
+    opens a connection of its own the first time it asks for the bucket. The
+    calling thread keeps using bucket."""
+    local = threading.local()
+    local.bucket = bucket
+
+    def get_bucket():
+        if getattr(local, 'bucket', None) is None:
+            local.bucket = connect().get_bucket(bucket.name, validate=False)
+        return local.bucket
+    return get_bucket
 
 def bucket_check(module, s3, bucket):
     try:
@@ -223,27 +390,163 @@ def path_check(path):
     else:
         return False
 
-def upload_s3file(module, s3, bucket, obj, src, expiry, metadata):
+def find_multipart_upload(bucket, obj):
+    """ Return the most recently initiated unfinished multipart upload of obj """
+    found = None
+    for upload in bucket.list_multipart_uploads():
+        if upload.key_name != obj:
+            continue
+        if found is None or upload.initiated > found.initiated:
+            found = upload
+    return found
+
+def multipart_upload(get_bucket, obj, src, metadata, part_size, concurrency, resume):
+    bucket = get_bucket()
+    ranges = part_ranges(os.path.getsize(src), part_size)
+
+    mp = None
+    uploaded = {}
+    if resume:
+        mp = find_multipart_upload(bucket, obj)
+        if mp is not None:
+            lengths = dict([(part_number, length) for part_number, offset, length in ranges])
+            for part in mp:
+                uploaded[part.part_number] = (part.size, part.etag.strip('"'))
+                # completing the upload includes every part it holds, so an
+                # upload started with another part size cannot be reused
+                if lengths.get(part.part_number) != part.size:
+                    mp.cancel_upload()
+                    mp = None
+                    uploaded = {}
+                    break
+    if mp is None:
+        mp = bucket.initiate_multipart_upload(obj, metadata=metadata or {})
+
+    def upload_part(part):
+        part_number, offset, length = part
+        if part_number in uploaded:
+            size, etag = uploaded[part_number]
+            if size == length and etag == range_md5(src, offset, length).hexdigest():
+                return
+        part_mp = MultiPartUpload(get_bucket())
+        part_mp.key_name = mp.key_name
+        part_mp.id = mp.id
+        f = open(src, 'rb')
+        try:
+            f.seek(offset)
+            part_mp.upload_part_from_file(f, part_number, size=length)
+        finally:
+            f.close()
+
     try:
-        bucket = s3.lookup(bucket)
-        key = bucket.new_key(obj)
-        if metadata:
-            for meta_key in metadata.keys():
-                key.set_metadata(meta_key, metadata[meta_key])
+        if concurrency > 1:
+            run_parallel(upload_part, ranges, concurrency)
+        else:
+            for part in ranges:
+                upload_part(part)
+        completed = mp.complete_upload()
+    except Exception:
+        if not resume:
+            mp.cancel_upload()
+        raise
+    return completed.etag.strip('"')
+
+def multipart_download(get_bucket, key, dest, part_size, concurrency, resume):
+    """ Download key into dest with parallel ranged GETs.
+
+    Parts are written into a preallocated file next to dest and recorded in a
+    small state file as they complete, so an interrupted download can pick up
+    where it stopped as long as the object has not changed."""
+    partial = dest + '.s3part'
+    statefile = partial + '.json'
+    state = dict(etag=key.etag, size=key.size, part_size=part_size, done=[])
+
+    if resume and os.path.exists(partial) and os.path.exists(statefile):
+        try:
+            previous = json.loads(open(statefile).read())
+        except ValueError:
+            previous = {}
+        if [previous.get(k) for k in ('etag', 'size', 'part_size')] == [key.etag, key.size, part_size]:
+            state['done'] = previous.get('done', [])
+
+    if not state['done']:
+        f = open(partial, 'wb')
+        try:
+            f.truncate(key.size)
+        finally:
+            f.close()
+
+    lock = threading.Lock()
 
-        key.set_contents_from_filename(src)
+    def save_state():
+        f = open(statefile, 'w')
+        try:
+            f.write(json.dumps(state))
+        finally:
+            f.close()
+
+    def download_part(part):
+        part_number, offset, length = part
+        # Key objects hold the response of their last request, so every part
+        # needs its own
+        part_key = get_bucket().new_key(key.name)
+        f = open(partial, 'r+b')
+        try:
+            f.seek(offset)
+            part_key.get_contents_to_file(f, headers={'Range': 'bytes=%d-%d' % (offset, offset + length - 1)})
+        finally:
+            f.close()
+        lock.acquire()
+        try:
+            state['done'].append(part_number)
+            save_state()
+        finally:
+            lock.release()
+
+    pending = [part for part in part_ranges(key.size, part_size) if part[0] not in state['done']]
+    try:
+        save_state()
+        if concurrency > 1:
+            run_parallel(download_part, pending, concurrency)
+        else:
+            for part in pending:
+                download_part(part)
+    except Exception:
+        if not resume:
+            for path in (partial, statefile):
+                if os.path.exists(path):
+                    os.remove(path)
+        raise
+    os.rename(partial, dest)
+    os.remove(statefile)
+
+def upload_s3file(module, s3, bucket, obj, src, expiry, metadata, part_size, concurrency, resume, connect):
+    try:
+        bucket = s3.lookup(bucket)
+        if os.path.getsize(src) > part_size:
+            multipart_upload(thread_bucket(connect, bucket), obj, src, metadata, part_size, concurrency, resume)
+            key = bucket.get_key(obj)
+        else:
+            key = bucket.new_key(obj)
+            if metadata:
+                for meta_key in metadata.keys():
+                    key.set_metadata(meta_key, metadata[meta_key])
+            key.set_contents_from_filename(src)
         url = key.generate_url(expiry)
         module.exit_json(msg="PUT operation complete", url=url, changed=True)
-    except s3.provider.storage_copy_error, e:
+    except (s3.provider.storage_copy_error, s3.provider.storage_response_error), e:
         module.fail_json(msg= str(e))
 
-def download_s3file(module, s3, bucket, obj, dest):
+def download_s3file(module, s3, bucket, obj, dest, part_size, concurrency, resume, connect):
     try:
         bucket = s3.lookup(bucket)
         key = bucket.lookup(obj)
-        key.get_contents_to_filename(dest)
+        if key.size > part_size:
+            multipart_download(thread_bucket(connect, bucket), key, dest, part_size, concurrency, resume)
+        else:
+            key.get_contents_to_filename(dest)
         module.exit_json(msg="GET operation complete", changed=True)
-    except s3.provider.storage_copy_error, e:
+    except (s3.provider.storage_copy_error, s3.provider.storage_response_error), e:
         module.fail_json(msg= str(e))
 
 def download_s3str(module, s3, bucket, obj):
@@ -264,6 +567,214 @@ def get_download_url(module, s3, bucket, obj, expiry, changed=True):
     except s3.provider.storage_response_error, e:
         module.fail_json(msg= str(e))
 
+def walk_local(root):
+    """ Return a dict of relative name -> (size, mtime) for every file below root.
+
+    Partial downloads and their state files are left out, they are not part
+    of the tree being synced."""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith('.s3part') or filename.endswith('.s3part.json'):
+                continue
+            path = os.path.join(dirpath, filename)
+            st = os.stat(path)
+            name = path[len(root):].lstrip(os.sep).replace(os.sep, '/')
+            files[name] = (st.st_size, st.st_mtime)
+    return files
+
+def list_remote(bucket, prefix):
+    """ Return a dict of relative name -> (size, etag) for every object below prefix.
+
+    bucket.list() pages through the listing, so this is one request per
+    thousand objects rather than one per object."""
+    objects = {}
+    for key in bucket.list(prefix=prefix):
+        if key.name.endswith('/'):
+            continue
+        objects[key.name[len(prefix):]] = (key.size, key.etag.strip('"'))
+    return objects
+
+def load_manifest(path, identity):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        data = json.loads(open(path).read())
+    except ValueError:
+        return {}
+    if data.get('identity') != identity:
+        return {}
+    return data.get('files', {})
+
+def save_manifest(path, identity, files):
+    tmp = path + '.tmp'
+    f = open(tmp, 'w')
+    try:
+        f.write(json.dumps(dict(identity=identity, files=files)))
+    finally:
+        f.close()
+    os.rename(tmp, path)
+
+def sync_plan(module, root, local, remote, manifest, direction, delete, part_size, concurrency):
+    """ Work out which names to transfer and which to delete.
+
+    Files of equal size are compared by ETag; the manifest supplies the ETag
+    of files whose size and mtime are unchanged, everything else is hashed
+    in parallel. Returns (transfer, remove, etags) where etags holds the
+    ETag of every local file found to be in sync."""
+    transfer = []
+    remove = []
+    etags = {}
+    unknown = []
+
+    for name, (size, mtime) in local.items():
+        if name not in remote:
+            if direction == 'push':
+                transfer.append(name)
+            elif delete:
+                remove.append(name)
+            continue
+        remote_size, etag = remote[name]
+        if size != remote_size:
+            transfer.append(name)
+            continue
+        cached = manifest.get(name)
+        if cached and cached[0] == size and cached[1] == mtime and cached[2] == etag:
+            etags[name] = etag
+        else:
+            unknown.append(name)
+
+    for name in remote:
+        if name not in local:
+            if direction == 'pull':
+                transfer.append(name)
+            elif delete:
+                remove.append(name)
+
+    def compare(name):
+        etag = remote[name][1]
+        if etag_matches(module, os.path.join(root, name), etag, part_size):
+            etags[name] = etag
+        else:
+            transfer.append(name)
+
+    run_parallel(compare, unknown, concurrency)
+    return transfer, remove, etags
+
+def sync_dir(module, s3, bucket_name, obj, root, direction, delete, manifest_path, metadata, part_size, concurrency, resume, location, connect):
+    if obj:
+        prefix = obj.rstrip('/') + '/'
+    else:
+        prefix = ''
+    identity = '%s:%s:%s' % (bucket_name, prefix, os.path.abspath(root))
+    failed = []
+
+    try:
+        bucket = s3.lookup(bucket_name)
+        if bucket is None:
+            if direction == 'pull':
+                module.fail_json(msg="Bucket %s does not exist." % bucket_name)
+            create_bucket(module, s3, bucket_name, location)
+            bucket = s3.lookup(bucket_name)
+        get_bucket = thread_bucket(connect, bucket)
+
+        local = walk_local(root)
+        remote = list_remote(bucket, prefix)
+        manifest = load_manifest(manifest_path, identity)
+        transfer, remove, etags = sync_plan(module, root, local, remote, manifest, direction, delete, part_size, concurrency)
+
+        def local_path(name):
+            return os.path.join(root, *name.split('/'))
+
+        def push(name):
+            path = local_path(name)
+            if local[name][0] > part_size:
+                etags[name] = multipart_upload(get_bucket, prefix + name, path, metadata, part_size, 1, resume)
+            else:
+                key = get_bucket().new_key(prefix + name)
+                if metadata:
+                    for meta_key in metadata.keys():
+                        key.set_metadata(meta_key, metadata[meta_key])
+                key.set_contents_from_filename(path)
+                etags[name] = key.md5
+
+        def pull(name):
+            path = local_path(name)
+            dirname = os.path.dirname(path)
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    # another worker may have created it meanwhile
+                    if not os.path.isdir(dirname):
+                        raise
+            size, etag = remote[name]
+            key = get_bucket().new_key(prefix + name)
+            if size > part_size:
+                key.size = size
+                key.etag = '"%s"' % etag
+                multipart_download(get_bucket, key, path, part_size, 1, resume)
+            else:
+                key.get_contents_to_filename(path)
+            etags[name] = etag
+
+        if direction == 'push':
+            run_parallel(push, transfer, concurrency)
+            if remove:
+                result = bucket.delete_keys([prefix + name for name in remove])
+                failed = [error.key for error in result.errors]
+        else:
+            run_parallel(pull, transfer, concurrency)
+            for name in remove:
+                os.remove(local_path(name))
+    except (s3.provider.storage_copy_error, s3.provider.storage_response_error), e:
+        module.fail_json(msg=str(e))
+
+    if manifest_path:
+        files = {}
+        for name, etag in etags.items():
+            st = os.stat(local_path(name))
+            files[name] = [st.st_size, st.st_mtime, etag]
+        save_manifest(manifest_path, identity, files)
+
+    if failed:
+        failed.sort()
+        module.fail_json(msg="Failed to delete %d objects" % len(failed), failed_keys=failed,
+                         transferred=sorted(transfer))
+
+    transfer.sort()
+    remove.sort()
+    module.exit_json(msg="Sync complete", changed=bool(transfer or remove), transferred=transfer, deleted=remove)
+
+def connect_s3(module, s3_url, aws_access_key, aws_secret_key):
+    # Look at s3_url and tweak connection settings
+    # if connecting to Walrus or fakes3
+    if is_fakes3(s3_url):
+        try:
+            fakes3 = urlparse.urlparse(s3_url)
+            from boto.s3.connection import OrdinaryCallingFormat
+            s3 = boto.connect_s3(
+                aws_access_key,
+                aws_secret_key,
+                is_secure=False,
+                host=fakes3.hostname,
+                port=fakes3.port,
+                calling_format=OrdinaryCallingFormat())
+        except boto.exception.NoAuthHandlerFound, e:
+            module.fail_json(msg = str(e))
+    elif is_walrus(s3_url):
+        try:
+            walrus = urlparse.urlparse(s3_url).hostname
+            s3 = boto.connect_walrus(walrus, aws_access_key, aws_secret_key)
+        except boto.exception.NoAuthHandlerFound, e:
+            module.fail_json(msg = str(e))
+    else:
+        try:
+            s3 = boto.connect_s3(aws_access_key, aws_secret_key)
+        except boto.exception.NoAuthHandlerFound, e:
+            module.fail_json(msg = str(e))
+    return s3
+
 def is_fakes3(s3_url):
     """ Return True if s3_url has scheme fakes3:// """
     if s3_url is not None:
@@ -288,11 +799,17 @@ def main():
             object         = dict(),
             src            = dict(),
             dest           = dict(default=None),
-            mode           = dict(choices=['get', 'put', 'delete', 'create', 'geturl', 'getstr'], required=True),
+            mode           = dict(choices=['get', 'put', 'delete', 'create', 'geturl', 'getstr', 'sync'], required=True),
             expiry         = dict(default=600, aliases=['expiration']),
             s3_url         = dict(aliases=['S3_URL']),
             overwrite      = dict(aliases=['force'], default=True, type='bool'),
             metadata      = dict(type='dict'),
+            part_size      = dict(default=8, type='int'),
+            concurrency    = dict(default=4, type='int'),
+            resume         = dict(default=False, type='bool'),
+            direction      = dict(default='push', choices=['push', 'pull']),
+            delete         = dict(default=False, type='bool'),
+            manifest       = dict(default=None),
         ),
     )
     module = AnsibleModule(argument_spec=argument_spec)
@@ -307,6 +824,14 @@ def main():
     s3_url = module.params.get('s3_url')
     overwrite = module.params.get('overwrite')
     metadata = module.params.get('metadata')
+    part_size = module.params.get('part_size') * 1024 * 1024
+    concurrency = module.params.get('concurrency')
+    resume = module.params.get('resume')
+
+    if part_size < MIN_PART_SIZE:
+        module.fail_json(msg="part_size must be at least 5 (megabytes).")
+    if concurrency < 1:
+        module.fail_json(msg="concurrency must be at least 1.")
 
     ec2_url, aws_access_key, aws_secret_key, region = get_ec2_creds(module)
 
@@ -325,33 +850,11 @@ def main():
     if not s3_url and 'S3_URL' in os.environ:
         s3_url = os.environ['S3_URL']
 
-    # Look at s3_url and tweak connection settings
-    # if connecting to Walrus or fakes3
-    if is_fakes3(s3_url):
-        try:
-            fakes3 = urlparse.urlparse(s3_url)
-            from boto.s3.connection import OrdinaryCallingFormat
-            s3 = boto.connect_s3(
-                aws_access_key,
-                aws_secret_key,
-                is_secure=False,
-                host=fakes3.hostname,
-                port=fakes3.port,
-                calling_format=OrdinaryCallingFormat())
-        except boto.exception.NoAuthHandlerFound, e:
-            module.fail_json(msg = str(e))
-    elif is_walrus(s3_url):
-        try:
-            walrus = urlparse.urlparse(s3_url).hostname
-            s3 = boto.connect_walrus(walrus, aws_access_key, aws_secret_key)
-        except boto.exception.NoAuthHandlerFound, e:
-            module.fail_json(msg = str(e))
-    else:
-        try:
-            s3 = boto.connect_s3(aws_access_key, aws_secret_key)
-        except boto.exception.NoAuthHandlerFound, e:
-            module.fail_json(msg = str(e))
- 
+    def connect():
+        return connect_s3(module, s3_url, aws_access_key, aws_secret_key)
+
+    s3 = connect()
+
     # If our mode is a GET operation (download), go through the procedure as appropriate ...
     if mode == 'get':
     
@@ -368,22 +871,21 @@ def main():
         # If the destination path doesn't exist, no need to md5um etag check, so just download.
         pathrtn = path_check(dest)
         if pathrtn is False:
-            download_s3file(module, s3, bucket, obj, dest)
+            download_s3file(module, s3, bucket, obj, dest, part_size, concurrency, resume, connect)
 
         # Compare the remote MD5 sum of the object with the local dest md5sum, if it already exists. 
         if pathrtn is True:
             md5_remote = keysum(module, s3, bucket, obj)
-            md5_local = hashlib.md5(open(dest, 'rb').read()).hexdigest()
-            if md5_local == md5_remote:
+            if etag_matches(module, dest, md5_remote, part_size):
                 sum_matches = True
                 if overwrite is True:
-                    download_s3file(module, s3, bucket, obj, dest)
+                    download_s3file(module, s3, bucket, obj, dest, part_size, concurrency, resume, connect)
                 else:
                     module.exit_json(msg="Local and remote object are identical, ignoring. Use overwrite parameter to force.", changed=False)
             else:
                 sum_matches = False
                 if overwrite is True:
-                    download_s3file(module, s3, bucket, obj, dest)
+                    download_s3file(module, s3, bucket, obj, dest, part_size, concurrency, resume, connect)
                 else:
                     module.fail_json(msg="WARNING: Checksums do not match. Use overwrite parameter to force download.", failed=True)
         
@@ -393,7 +895,7 @@ def main():
 
         # At this point explicitly define the overwrite condition.
         if sum_matches is True and pathrtn is True and overwrite is True:
-            download_s3file(module, s3, bucket, obj, dest)
+            download_s3file(module, s3, bucket, obj, dest, part_size, concurrency, resume, connect)
 
         # If sum does not match but the destination exists, we 
                
@@ -417,28 +919,45 @@ def main():
         # Lets check key state. Does it exist and if it does, compute the etag md5sum.
         if bucketrtn is True and keyrtn is True:
                 md5_remote = keysum(module, s3, bucket, obj)
-                md5_local = hashlib.md5(open(src, 'rb').read()).hexdigest()
-                if md5_local == md5_remote:
+                if etag_matches(module, src, md5_remote, part_size):
                     sum_matches = True
                     if overwrite is True:
-                        upload_s3file(module, s3, bucket, obj, src, expiry, metadata)
+                        upload_s3file(module, s3, bucket, obj, src, expiry, metadata, part_size, concurrency, resume, connect)
                     else:
                         get_download_url(module, s3, bucket, obj, expiry, changed=False)
                 else:
                     sum_matches = False
                     if overwrite is True:
-                        upload_s3file(module, s3, bucket, obj, src, expiry, metadata)
+                        upload_s3file(module, s3, bucket, obj, src, expiry, metadata, part_size, concurrency, resume, connect)
                     else:
                         module.exit_json(msg="WARNING: Checksums do not match. Use overwrite parameter to force upload.", failed=True)
 
         # If neither exist (based on bucket existence), we can create both.
         if bucketrtn is False and pathrtn is True:
             create_bucket(module, s3, bucket, location)
-            upload_s3file(module, s3, bucket, obj, src, expiry, metadata)
+            upload_s3file(module, s3, bucket, obj, src, expiry, metadata, part_size, concurrency, resume, connect)
 
         # If bucket exists but key doesn't, just upload.
         if bucketrtn is True and pathrtn is True and keyrtn is False:
-            upload_s3file(module, s3, bucket, obj, src, expiry, metadata)
+            upload_s3file(module, s3, bucket, obj, src, expiry, metadata, part_size, concurrency, resume, connect)
+
+    if mode == 'sync':
+        direction = module.params.get('direction')
+        manifest = module.params.get('manifest')
+        if manifest:
+            manifest = os.path.expanduser(manifest)
+        if direction == 'push':
+            if not src or not os.path.isdir(os.path.expanduser(src)):
+                module.fail_json(msg="When using sync with direction=push, src must be an existing directory")
+            root = os.path.expanduser(src)
+        else:
+            if not module.params.get('dest'):
+                module.fail_json(msg="When using sync with direction=pull, dest is a mandatory parameter")
+            if not os.path.isdir(dest):
+                os.makedirs(dest)
+            root = dest
+        sync_dir(module, s3, bucket, obj, root, direction, module.params.get('delete'), manifest,
+                 metadata, part_size, concurrency, resume, location, connect)
 
     # Support for deleting an object if we have both params.  
     if mode == 'delete':
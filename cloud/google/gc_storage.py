@@ -65,11 +65,37 @@ options:
     aliases: []
   mode:
     description:
-      - Switches the module behaviour between upload, download, get_url (return download url) , get_str (download object as string), create (bucket) and delete (bucket). 
+      - Switches the module behaviour between upload, download, get_url (return download url) , get_str (download object as string), create (bucket), delete (bucket) and sync (directory tree, Ansible 1.9+). 
     required: true
     default: null
     aliases: []
-    choices: [ 'get', 'put', 'get_url', 'get_str', 'delete', 'create' ]
+    choices: [ 'get', 'put', 'get_url', 'get_str', 'delete', 'create', 'sync' ]
+  direction:
+    description:
+      - Used with mode=sync. C(push) makes the objects below C(object) match the local directory C(src), C(pull) makes the local directory C(dest) match the objects below C(object). Files are compared on size and MD5 and only the differences are transferred.
+    required: false
+    default: push
+    choices: [ 'push', 'pull' ]
+    version_added: "1.9"
+  delete:
+    description:
+      - Used with mode=sync. Remove objects (push) or local files (pull) that do not exist on the other side.
+    required: false
+    default: false
+    choices: [ 'yes', 'no' ]
+    version_added: "1.9"
+  manifest:
+    description:
+      - Used with mode=sync. Path of a local cache recording the size, modification time and MD5 of every synced file. Files whose size and modification time did not change since the last sync are not hashed again.
+    required: false
+    default: null
+    version_added: "1.9"
+  concurrency:
+    description:
+      - Used with mode=sync. Number of objects transferred, deleted or hashed in parallel.
+    required: false
+    default: 4
+    version_added: "1.9"
   gcs_secret_key:
     description:
       - GCS secret key. If not set then the value of the GCS_SECRET_KEY environment variable is used. 
@@ -105,12 +131,22 @@ EXAMPLES = '''
 
 # Delete a bucket and all contents
 - gc_storage: bucket=mybucket mode=delete
+
+# Push a local directory, removing objects that no longer exist locally
+- gc_storage: bucket=mybucket object=site src=/srv/www/site mode=sync delete=yes manifest=/var/cache/site.manifest concurrency=16
 '''
 
 import sys
 import os
 import urlparse
 import hashlib
+import threading
+import Queue
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 try:
     import boto
@@ -332,6 +368,188 @@ def handle_create(module, gs, bucket, obj):
             create_bucket(module, gs, bucket)
             create_dirkey(module, gs, bucket, dirobj)
 
+def run_parallel(func, items, concurrency):
+    """ Call func for every item from up to concurrency threads.
+
+    The first exception raised by a worker is re-raised once all workers
+    have stopped."""
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for i in range(max(1, min(concurrency, len(items)))):
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+def thread_bucket(connect, bucket):
+    """ Return a function giving the calling thread its own copy of bucket.
+
+    boto connections must not be shared between threads, so every worker
+    opens a connection of its own the first time it asks for the bucket. The
+    calling thread keeps using bucket."""
+    local = threading.local()
+    local.bucket = bucket
+
+    def get_bucket():
+        if getattr(local, 'bucket', None) is None:
+            local.bucket = connect().get_bucket(bucket.name, validate=False)
+        return local.bucket
+    return get_bucket
+
+def sync_plan(module, root, local, remote, manifest, direction, delete, concurrency):
+    """ Work out which names to transfer and which to delete.
+
+    Returns (transfer, remove, sums) where sums holds the md5 of every local
+    file found to be in sync."""
+    transfer = []
+    remove = []
+    sums = {}
+    unknown = []
+
+    for name, (size, mtime) in local.items():
+        if name not in remote:
+            if direction == 'push':
+                transfer.append(name)
+            elif delete:
+                remove.append(name)
+            continue
+        remote_size, md5_remote = remote[name]
+        if size != remote_size:
+            transfer.append(name)
+            continue
+        cached = manifest.get(name)
+        if cached and cached[0] == size and cached[1] == mtime and cached[2] == md5_remote:
+            sums[name] = md5_remote
+        else:
+            unknown.append(name)
+
+    for name in remote:
+        if name not in local:
+            if direction == 'pull':
+                transfer.append(name)
+            elif delete:
+                remove.append(name)
+
+    def compare(name):
+        md5_remote = remote[name][1]
+        if module.md5(os.path.join(root, name)) == md5_remote:
+            sums[name] = md5_remote
+        else:
+            transfer.append(name)
+
+    run_parallel(compare, unknown, concurrency)
+    return transfer, remove, sums
+
+def handle_sync(module, gs, bucket_name, obj, root, direction, delete, manifest_path, concurrency, connect):
+    if obj:
+        prefix = obj.rstrip('/') + '/'
+    else:
+        prefix = ''
+    identity = '%s:%s:%s' % (bucket_name, prefix, os.path.abspath(root))
+    permission = module.params.get('permission')
+
+    try:
+        bucket = gs.lookup(bucket_name)
+        if bucket is None:
+            if direction == 'pull':
+                module.fail_json(msg="Bucket %s does not exist." % bucket_name)
+            create_bucket(module, gs, bucket_name)
+            bucket = gs.lookup(bucket_name)
+
+        local = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                st = os.stat(path)
+                local[path[len(root):].lstrip(os.sep).replace(os.sep, '/')] = (st.st_size, st.st_mtime)
+
+        # bucket.list() pages through the listing
+        remote = {}
+        for key in bucket.list(prefix=prefix):
+            if not key.name.endswith('/'):
+                remote[key.name[len(prefix):]] = (key.size, key.etag.strip('"'))
+
+        manifest = {}
+        if manifest_path and os.path.exists(manifest_path):
+            try:
+                data = json.loads(open(manifest_path).read())
+            except ValueError:
+                data = {}
+            if data.get('identity') == identity:
+                manifest = data.get('files', {})
+
+        transfer, remove, sums = sync_plan(module, root, local, remote, manifest, direction, delete, concurrency)
+        get_bucket = thread_bucket(connect, bucket)
+
+        def local_path(name):
+            return os.path.join(root, *name.split('/'))
+
+        def push(name):
+            key = get_bucket().new_key(prefix + name)
+            key.set_contents_from_filename(local_path(name), policy=permission)
+            sums[name] = key.md5
+
+        def pull(name):
+            path = local_path(name)
+            dirname = os.path.dirname(path)
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    # another worker may have created it meanwhile
+                    if not os.path.isdir(dirname):
+                        raise
+            get_bucket().new_key(prefix + name).get_contents_to_filename(path)
+            sums[name] = remote[name][1]
+
+        def delete_object(name):
+            get_bucket().delete_key(prefix + name)
+
+        if direction == 'push':
+            run_parallel(push, transfer, concurrency)
+            run_parallel(delete_object, remove, concurrency)
+        else:
+            run_parallel(pull, transfer, concurrency)
+            for name in remove:
+                os.remove(local_path(name))
+    except (gs.provider.storage_copy_error, gs.provider.storage_response_error), e:
+        module.fail_json(msg=str(e))
+
+    if manifest_path:
+        files = {}
+        for name, md5 in sums.items():
+            st = os.stat(local_path(name))
+            files[name] = [st.st_size, st.st_mtime, md5]
+        f = open(manifest_path + '.tmp', 'w')
+        try:
+            f.write(json.dumps(dict(identity=identity, files=files)))
+        finally:
+            f.close()
+        os.rename(manifest_path + '.tmp', manifest_path)
+
+    transfer.sort()
+    remove.sort()
+    module.exit_json(msg="Sync complete", changed=bool(transfer or remove), transferred=transfer, deleted=remove)
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
@@ -340,11 +558,15 @@ def main():
             src            = dict(default=None),
             dest           = dict(default=None),
             expiration     = dict(default=600, aliases=['expiry']),
-            mode           = dict(choices=['get', 'put', 'delete', 'create', 'get_url', 'get_str'], required=True),
+            mode           = dict(choices=['get', 'put', 'delete', 'create', 'get_url', 'get_str', 'sync'], required=True),
             permission     = dict(choices=['private', 'public-read', 'authenticated-read'], default='private'),
             gs_secret_key  = dict(no_log=True, required=True),
             gs_access_key  = dict(required=True),
             overwrite      = dict(default=True, type='bool', aliases=['force']),
+            direction      = dict(default='push', choices=['push', 'pull']),
+            delete         = dict(default=False, type='bool'),
+            manifest       = dict(default=None),
+            concurrency    = dict(default=4, type='int'),
         ),
     )
 
@@ -369,10 +591,13 @@ def main():
     if obj:
         obj = os.path.expanduser(module.params['object'])
 
-    try:
-        gs = boto.connect_gs(gs_access_key, gs_secret_key)
-    except boto.exception.NoAuthHandlerFound, e:
-        module.fail_json(msg = str(e))
+    def connect():
+        try:
+            return boto.connect_gs(gs_access_key, gs_secret_key)
+        except boto.exception.NoAuthHandlerFound, e:
+            module.fail_json(msg = str(e))
+
+    gs = connect()
  
     if mode == 'get':
         if not bucket_check(module, gs, bucket) or not key_check(module, gs, bucket, obj):
@@ -387,6 +612,24 @@ def main():
             module.fail_json(msg="Local object for PUT does not exist", failed=True)
         handle_put(module, gs, bucket, obj, overwrite, src, expiry)
 
+    if mode == 'sync':
+        direction = module.params.get('direction')
+        manifest = module.params.get('manifest')
+        if manifest:
+            manifest = os.path.expanduser(manifest)
+        if direction == 'push':
+            if not src or not os.path.isdir(os.path.expanduser(src)):
+                module.fail_json(msg="When using sync with direction=push, src must be an existing directory")
+            root = os.path.expanduser(src)
+        else:
+            if not dest:
+                module.fail_json(msg="When using sync with direction=pull, dest is a mandatory parameter")
+            if not os.path.isdir(dest):
+                os.makedirs(dest)
+            root = dest
+        handle_sync(module, gs, bucket, obj, root, direction, module.params.get('delete'), manifest,
+                    max(1, module.params.get('concurrency')), connect)
+
     # Support for deleting an object if we have both params.  
     if mode == 'delete':
         handle_delete(module, gs, bucket, obj)
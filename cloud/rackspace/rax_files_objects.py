@@ -27,6 +27,13 @@ description:
   - Upload, download, and delete objects in Rackspace Cloud Files
 version_added: "1.5"
 options:
+  concurrency:
+    description:
+      - Number of objects (or large object segments) transferred in parallel
+        when uploading, downloading or deleting files. Every worker reuses one
+        connection to Cloud Files for all of its requests.
+    default: 10
+    version_added: "1.9"
   clear_meta:
     description:
       - Optionally clear existing metadata when applying metadata to existing objects.
@@ -45,10 +52,23 @@ options:
       - The destination of a "get" operation; i.e. a local directory, "/home/user/myfolder".
         Used to specify the destination of an operation on a remote object; i.e. a file name,
         "file1", or a comma-separated list of remote objects, "file1,file2,file17"
+  extract_archive:
+    description:
+      - When uploading a directory, pack the files into compressed archives
+        and upload them through the Cloud Files bulk archive extraction API
+        instead of one request per file. Metadata and TTL are applied to the
+        extracted objects afterwards.
+    choices:
+      - "yes"
+      - "no"
+    default: "no"
+    version_added: "1.9"
   expires:
     description:
       - Used to set an expiration on a file or folder uploaded to Cloud Files.
-        Requires an integer, specifying expiration in seconds
+        Requires an integer, specifying expiration in seconds. Objects that
+        are not uploaded again because they are unchanged keep an expiration
+        they already have.
     default: null
   meta:
     description:
@@ -64,6 +84,14 @@ options:
       - put
       - delete
     default: get
+  segment_size:
+    description:
+      - Files larger than this many megabytes are uploaded as segmented large
+        objects, with the segments stored in a C(<container>_segments)
+        container. Segments already uploaded with a matching checksum are not
+        sent again, so interrupted uploads of large files resume.
+    default: 1024
+    version_added: "1.9"
   src:
     description:
       - Source from which to upload files.  Used to specify a remote object as a source for
@@ -122,6 +150,9 @@ EXAMPLES = '''
     - name: "Upload all files to test container"
       rax_files_objects: container=testcont method=put src=~/Downloads/onehundred
 
+    - name: "Mirror a large directory, 32 objects at a time, through archive extraction"
+      rax_files_objects: container=testcont method=put src=~/Downloads/mirror concurrency=32 extract_archive=yes
+
     - name: "Upload one file to test container"
       rax_files_objects: container=testcont method=put src=~/Downloads/testcont/file1
 
@@ -183,6 +214,24 @@ EXAMPLES = '''
       rax_files_objects:  container=testcont type=meta
 '''
 
+import hashlib
+import httplib
+import os
+import re
+import socket
+import sys
+import tarfile
+import tempfile
+import threading
+import urllib
+import urlparse
+import Queue
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
 try:
     import pyrax
     HAS_PYRAX = True
@@ -191,6 +240,9 @@ except ImportError:
 
 EXIT_DICT = dict(success=False)
 META_PREFIX = 'x-object-meta-'
+BLOCKSIZE = 64 * 1024
+# Maximum number of objects in one bulk delete or archive extraction request
+BULK_LIMIT = 10000
 
 
 def _get_container(module, cf, container):
@@ -200,14 +252,400 @@ def _get_container(module, cf, container):
         module.fail_json(msg=e.message)
 
 
-def upload(module, cf, container, src, dest, meta, expires):
-    """ Uploads a single object or a folder to Cloud Files Optionally sets an
-    metadata, TTL value (expires), or Content-Disposition and Content-Encoding
-    headers.
+def _split_names(objs):
+    return [obj.strip() for obj in objs.split(',')]
+
+
+class TransferError(Exception):
+    pass
+
+
+class _FileSlice(object):
+    """ File-like view of length bytes of f starting at offset, so files and
+    large object segments can be streamed by httplib and resent on retry
     """
-    c = _get_container(module, cf, container)
+    def __init__(self, f, offset, length):
+        self.f = f
+        self.offset = offset
+        self.length = length
+        self.rewind()
+
+    def rewind(self):
+        self.f.seek(self.offset)
+        self.remaining = self.length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def md5(self):
+        digest = hashlib.md5()
+        self.rewind()
+        while True:
+            block = self.read(BLOCKSIZE)
+            if not block:
+                break
+            digest.update(block)
+        return digest.hexdigest()
+
+
+def run_parallel(func, items, concurrency):
+    """ Call func for every item from up to concurrency threads.
 
-    num_objs_before = len(c.get_object_names())
+    The first exception raised by a worker is re-raised once all workers
+    have stopped."""
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for i in range(max(1, min(concurrency, len(items)))):
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+
+class CloudFilesTransfer(object):
+    """ Moves objects to and from a Cloud Files container from a bounded pool
+    of worker threads. Each worker keeps one persistent HTTP connection to the
+    storage endpoint for all of its requests, and the bulk delete and archive
+    extraction APIs are used to cut the number of requests.
+    """
+    def __init__(self, cf, container, concurrency, segment_size):
+        url = getattr(cf, 'management_url', None)
+        token = getattr(pyrax.identity, 'token', None)
+        if not url and getattr(cf, 'connection', None) is not None:
+            # pyrax releases built on python-swiftclient
+            url = cf.connection.url
+            token = cf.connection.token
+        parts = urlparse.urlparse(url)
+        self.scheme = parts[0]
+        self.netloc = parts[1]
+        self.base = parts[2].rstrip('/')
+        self.token = token
+        self.container = container
+        self.segment_container = container + '_segments'
+        self.concurrency = concurrency
+        self.segment_size = segment_size
+        self._local = threading.local()
+
+    def _connection(self, fresh=False):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and fresh:
+            conn.close()
+            conn = None
+        if conn is None:
+            if self.scheme == 'https':
+                conn = httplib.HTTPSConnection(self.netloc)
+            else:
+                conn = httplib.HTTPConnection(self.netloc)
+            self._local.conn = conn
+        return conn
+
+    def _quote(self, container, name=None):
+        path = '/' + urllib.quote(container.encode('utf-8'))
+        if name is not None:
+            path += '/' + urllib.quote(name.encode('utf-8'))
+        return path
+
+    def path(self, name=None, container=None, query=None):
+        path = self.base + self._quote(container or self.container, name)
+        if query:
+            path += '?' + query
+        return path
+
+    def request(self, method, path, body=None, headers=None, sink=None, allow=()):
+        """ Issue a request on this thread's connection and return (status,
+        headers, body). A keep-alive connection dropped by the server is
+        reopened once. With sink, a successful response body is streamed into
+        that file instead of being returned.
+        """
+        hdrs = {'X-Auth-Token': self.token}
+        if headers:
+            hdrs.update(headers)
+        if isinstance(body, basestring):
+            hdrs['Content-Length'] = str(len(body))
+        for attempt in (0, 1):
+            conn = self._connection(fresh=attempt)
+            try:
+                if hasattr(body, 'rewind'):
+                    body.rewind()
+                if sink is not None:
+                    sink.seek(0)
+                    sink.truncate()
+                conn.request(method, path, body, hdrs)
+                resp = conn.getresponse()
+                data = ''
+                if sink is not None and resp.status < 300:
+                    while True:
+                        block = resp.read(BLOCKSIZE)
+                        if not block:
+                            break
+                        sink.write(block)
+                else:
+                    data = resp.read()
+                break
+            except (httplib.HTTPException, socket.error):
+                if attempt:
+                    raise
+        if resp.status >= 300 and resp.status not in allow:
+            raise TransferError('%s %s failed: %s %s' % (method, path, resp.status, resp.reason))
+        return resp.status, dict([(k.lower(), v) for k, v in resp.getheaders()]), data
+
+    def list_objects(self, prefix=None, container=None):
+        """ Return a dict of name -> (bytes, hash) for the objects in a
+        container, paging through the listing. A missing container is empty.
+        """
+        objects = {}
+        marker = ''
+        while True:
+            query = dict(format='json', marker=marker)
+            if prefix:
+                query['prefix'] = prefix.encode('utf-8')
+            status, headers, data = self.request('GET', self.path(container=container, query=urllib.urlencode(query)), allow=(404,))
+            if status == 404 or not data:
+                break
+            listing = json.loads(data)
+            if not listing:
+                break
+            for item in listing:
+                objects[item['name']] = (item['bytes'], item['hash'])
+            marker = listing[-1]['name'].encode('utf-8')
+        return objects
+
+    def head(self, name):
+        """ Return (bytes, etag) of an object, or None if it does not exist """
+        status, headers, data = self.request('HEAD', self.path(name), allow=(404,))
+        if status == 404:
+            return None
+        return int(headers.get('content-length', 0)), headers.get('etag', '').strip('"')
+
+    def upload(self, name, src, headers):
+        """ Upload a file, splitting it into a segmented large object when it
+        is bigger than segment_size. Returns the ETag of the stored object.
+        """
+        size = os.path.getsize(src)
+        if size > self.segment_size:
+            return self._upload_segments(name, src, size, headers)
+        hdrs = dict(headers)
+        hdrs['Content-Length'] = str(size)
+        f = open(src, 'rb')
+        try:
+            status, resp_headers, data = self.request('PUT', self.path(name), _FileSlice(f, 0, size), hdrs)
+        finally:
+            f.close()
+        return resp_headers.get('etag', '').strip('"')
+
+    def _upload_segments(self, name, src, size, headers):
+        """ Upload a file as a dynamic large object. Segments live in a
+        separate container below a prefix derived from the file's size and
+        mtime; segments that are already stored with the right checksum are
+        not sent again, so an interrupted upload resumes where it stopped.
+        Segments left over from earlier versions of the file are deleted once
+        the new manifest is stored.
+        """
+        prefix = '%s/%d/%d/%d/' % (name, int(os.path.getmtime(src)), size, self.segment_size)
+        self.request('PUT', self.path(container=self.segment_container), '', {})
+        stored = self.list_objects(prefix=prefix, container=self.segment_container)
+
+        segments = []
+        offset = 0
+        while offset < size:
+            length = min(self.segment_size, size - offset)
+            segments.append(('%s%08d' % (prefix, len(segments)), offset, length))
+            offset += length
+
+        def upload_segment(segment):
+            segment_name, offset, length = segment
+            f = open(src, 'rb')
+            try:
+                if segment_name in stored and stored[segment_name][0] == length:
+                    if _FileSlice(f, offset, length).md5() == stored[segment_name][1]:
+                        return
+                self.request('PUT', self.path(segment_name, self.segment_container),
+                             _FileSlice(f, offset, length), {'Content-Length': str(length)})
+            finally:
+                f.close()
+
+        run_parallel(upload_segment, segments, self.concurrency)
+
+        hdrs = dict(headers)
+        hdrs['X-Object-Manifest'] = self._quote(self.segment_container, prefix).lstrip('/')
+        status, resp_headers, data = self.request('PUT', self.path(name), '', hdrs)
+
+        # only names laid out as above, the segments of an object nested
+        # below name stay untouched
+        pattern = re.compile(re.escape(name) + r'/\d+/\d+/\d+/\d{8}$')
+        stale = [segment_name for segment_name in
+                 self.list_objects(prefix=name + '/', container=self.segment_container)
+                 if pattern.match(segment_name) and not segment_name.startswith(prefix)]
+        if stale:
+            self.delete(stale, container=self.segment_container)
+        return resp_headers.get('etag', '').strip('"')
+
+    def etag(self, path):
+        """ Return the ETag path has once uploaded: its MD5, or for a file
+        stored as a segmented object the MD5 of the concatenated checksums
+        of its segments, which is what Cloud Files reports for those.
+        """
+        size = os.path.getsize(path)
+        f = open(path, 'rb')
+        try:
+            if size <= self.segment_size:
+                return _FileSlice(f, 0, size).md5()
+            digest = hashlib.md5()
+            for offset in range(0, size, self.segment_size):
+                digest.update(_FileSlice(f, offset, min(self.segment_size, size - offset)).md5())
+            return digest.hexdigest()
+        finally:
+            f.close()
+
+    def extract_archive(self, names, files):
+        """ Upload files through the bulk archive extraction API, packing up
+        to BULK_LIMIT files (and roughly segment_size bytes) per archive
+        """
+        batches = []
+        batch = []
+        batch_size = 0
+        for name in names:
+            batch.append(name)
+            batch_size += os.path.getsize(files[name])
+            if len(batch) >= BULK_LIMIT or batch_size >= self.segment_size:
+                batches.append(batch)
+                batch = []
+                batch_size = 0
+        if batch:
+            batches.append(batch)
+
+        def extract(batch):
+            tmp = tempfile.TemporaryFile()
+            try:
+                tar = tarfile.open(fileobj=tmp, mode='w:gz')
+                for name in batch:
+                    tar.add(files[name], arcname=name.encode('utf-8'))
+                tar.close()
+                length = tmp.tell()
+                status, headers, data = self.request(
+                    'PUT', self.path(query='extract-archive=tar.gz'), _FileSlice(tmp, 0, length),
+                    {'Content-Length': str(length), 'Accept': 'application/json'})
+            finally:
+                tmp.close()
+            result = json.loads(data)
+            if result.get('Errors'):
+                raise TransferError('archive extraction failed: %s' % result['Errors'])
+
+        run_parallel(extract, batches, self.concurrency)
+
+    def post(self, name, headers):
+        """ Update the metadata of an object unless it already has the given
+        values, returning whether it was changed. A POST replaces all of the
+        metadata, so the metadata, large object manifest and expiry the object
+        already has are sent again along with the new headers. An object that
+        already expires keeps its expiry.
+        """
+        status, current, data = self.request('HEAD', self.path(name))
+        hdrs = dict()
+        for k, v in current.items():
+            if k.startswith('x-object-meta-') or k in ('x-object-manifest', 'x-delete-at'):
+                hdrs[k] = v
+        changed = False
+        for k, v in headers.items():
+            k = k.lower()
+            if k == 'x-delete-after':
+                if 'x-delete-at' in hdrs:
+                    continue
+            elif hdrs.get(k) == v:
+                continue
+            hdrs[k] = v
+            changed = True
+        if not changed:
+            return False
+        if 'x-delete-after' in hdrs:
+            hdrs.pop('x-delete-at', None)
+        self.request('POST', self.path(name), '', hdrs)
+        return True
+
+    def download(self, name, dest):
+        """ Stream an object into dest through a temporary file next to it """
+        tmp = dest + '.part'
+        f = open(tmp, 'wb')
+        try:
+            self.request('GET', self.path(name), sink=f)
+        finally:
+            f.close()
+        os.rename(tmp, dest)
+
+    def delete(self, names, container=None):
+        """ Delete objects with the bulk delete API, falling back to one
+        request per object when the endpoint does not support it. Returns
+        the number of objects deleted.
+        """
+        container = container or self.container
+        chunks = [names[i:i + BULK_LIMIT] for i in range(0, len(names), BULK_LIMIT)]
+        deleted = []
+        unsupported = []
+
+        def delete_chunk(chunk):
+            body = '\n'.join([self._quote(container, name) for name in chunk])
+            status, headers, data = self.request(
+                'POST', self.base + '?bulk-delete', body,
+                {'Content-Type': 'text/plain', 'Accept': 'application/json'})
+            try:
+                result = json.loads(data)
+            except ValueError:
+                unsupported.extend(chunk)
+                return
+            if result.get('Errors'):
+                raise TransferError('bulk delete failed: %s' % result['Errors'])
+            deleted.append(int(result.get('Number Deleted', 0)))
+
+        def delete_object(name):
+            status, headers, data = self.request('DELETE', self.path(name, container), allow=(404,))
+            if status != 404:
+                deleted.append(1)
+
+        run_parallel(delete_chunk, chunks, self.concurrency)
+        run_parallel(delete_object, unsupported, self.concurrency)
+        return sum(deleted)
+
+
+def _object_headers(meta, expires):
+    headers = dict()
+    for k, v in (meta or {}).items():
+        headers['X-Object-Meta-%s' % k] = str(v)
+    if expires:
+        headers['X-Delete-After'] = str(expires)
+    return headers
+
+
+def upload(module, cf, container, src, dest, meta, expires, engine,
+           extract_archive):
+    """ Uploads a single object or a folder to Cloud Files. Optionally sets
+    metadata and a TTL value (expires). Objects that are already stored with
+    the same size and checksum are not uploaded again; they only have the
+    metadata and TTL applied when those are given and not already set.
+    """
+    c = _get_container(module, cf, container)
 
     if not src:
         module.fail_json(msg='src must be specified when uploading')
@@ -221,84 +659,91 @@ def upload(module, cf, container, src, dest, meta, expires):
         module.fail_json(msg='dest cannot be set when whole '
                              'directories are uploaded')
 
-    cont_obj = None
-    if dest and not is_dir:
-        try:
-            cont_obj = c.upload_file(src, obj_name=dest, ttl=expires)
-        except Exception, e:
-            module.fail_json(msg=e.message)
-    elif is_dir:
-        try:
-            id, total_bytes = cf.upload_folder(src, container=c.name, ttl=expires)
-        except Exception, e:
-            module.fail_json(msg=e.message)
-
-        while True:
-            bytes = cf.get_uploaded(id)
-            if bytes == total_bytes:
-                break
-            time.sleep(1)
+    files = dict()
+    if is_dir:
+        for dirpath, dirnames, filenames in os.walk(src):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = path[len(src):].lstrip(os.sep).replace(os.sep, '/')
+                files[name] = path
     else:
-        try:
-            cont_obj = c.upload_file(src, ttl=expires)
-        except Exception, e:
-            module.fail_json(msg=e.message)
+        files[dest or os.path.basename(src)] = src
+
+    headers = _object_headers(meta, expires)
+    pending = []
+    unchanged = []
+    updated = []
+    etags = dict()
+
+    def compare(name):
+        path = files[name]
+        size, etag = existing[name]
+        if is_dir and os.path.getsize(path) > engine.segment_size:
+            # listings show the manifest of a segmented object, only a HEAD
+            # returns its size and ETag
+            size, etag = engine.head(name)
+        if os.path.getsize(path) == size and engine.etag(path) == etag:
+            unchanged.append(name)
+        else:
+            pending.append(name)
 
-    num_objs_after = len(c.get_object_names())
+    def put(name):
+        etags[name] = engine.upload(name, files[name], headers)
 
-    if not meta:
-        meta = dict()
+    def post(name):
+        if engine.post(name, headers):
+            updated.append(name)
 
-    meta_result = dict()
-    if meta:
-        if cont_obj:
-            meta_result = cont_obj.set_metadata(meta)
+    try:
+        if is_dir:
+            existing = engine.list_objects()
         else:
-            def _set_meta(objs, meta):
-                """ Sets metadata on a list of objects specified by name """
-                for obj in objs:
-                    try:
-                        result = c.get_object(obj).set_metadata(meta)
-                    except Exception, e:
-                        module.fail_json(msg=e.message)
-                    else:
-                        meta_result[obj] = result
-                return meta_result
-
-            def _walker(objs, path, filenames):
-                """ Callback func for os.path.walk  """
-                prefix = ''
-                if path != src:
-                    prefix = path.split(src)[-1].lstrip('/')
-                filenames = [os.path.join(prefix, name) for name in filenames
-                             if not os.path.isdir(name)]
-                objs += filenames
-
-            _objs = []
-            os.path.walk(src, _walker, _objs)
-            meta_result = _set_meta(_objs, meta)
+            existing = dict()
+            stat = engine.head(files.keys()[0])
+            if stat is not None:
+                existing[files.keys()[0]] = stat
+        for name in files:
+            if name not in existing:
+                pending.append(name)
+        run_parallel(compare, [name for name in files if name in existing], engine.concurrency)
+
+        if extract_archive and is_dir:
+            archived = [name for name in pending
+                        if os.path.getsize(files[name]) <= engine.segment_size]
+            engine.extract_archive(archived, files)
+            run_parallel(put, [name for name in pending if name not in archived], engine.concurrency)
+            # archive members are stored without metadata or TTL
+            if headers:
+                run_parallel(post, archived, engine.concurrency)
+        else:
+            run_parallel(put, pending, engine.concurrency)
+        if headers:
+            run_parallel(post, unchanged, engine.concurrency)
+    except Exception, e:
+        module.fail_json(msg=str(e))
 
     EXIT_DICT['success'] = True
     EXIT_DICT['container'] = c.name
     EXIT_DICT['msg'] = "Uploaded %s to container: %s" % (src, c.name)
-    if cont_obj or locals().get('bytes'):
+    EXIT_DICT['uploaded'] = len(pending)
+    EXIT_DICT['unchanged'] = len(unchanged)
+    if pending or updated:
         EXIT_DICT['changed'] = True
-    if meta_result:
+    if updated and meta:
         EXIT_DICT['meta'] = dict(updated=True)
 
-    if cont_obj:
-        EXIT_DICT['bytes'] = cont_obj.total_bytes
-        EXIT_DICT['etag'] = cont_obj.etag
-    else:
-        EXIT_DICT['bytes'] = total_bytes
+    EXIT_DICT['bytes'] = sum([os.path.getsize(files[name]) for name in pending])
+    if not is_dir and pending:
+        EXIT_DICT['etag'] = etags[pending[0]]
 
     module.exit_json(**EXIT_DICT)
 
 
-def download(module, cf, container, src, dest, structure):
+def download(module, cf, container, src, dest, structure, engine):
     """ Download objects from Cloud Files to a local path specified by "dest".
     Optionally disable maintaining a directory structure by by passing a
-    false value to "structure".
+    false value to "structure". Local files with the same size and checksum
+    as the remote object are left alone.
     """
     # Looking for an explicit destination
     if not dest:
@@ -308,14 +753,6 @@ def download(module, cf, container, src, dest, structure):
     # Attempt to fetch the container by name
     c = _get_container(module, cf, container)
 
-    # Accept a single object name or a comma-separated list of objs
-    # If not specified, get the entire container
-    if src:
-        objs = src.split(',')
-        objs = map(str.strip, objs)
-    else:
-        objs = c.get_object_names()
-
     dest = os.path.abspath(os.path.expanduser(dest))
     is_dir = os.path.isdir(dest)
 
@@ -323,31 +760,69 @@ def download(module, cf, container, src, dest, structure):
         module.fail_json(msg='dest must be a directory')
 
     results = []
-    for obj in objs:
-        try:
-            c.download_object(obj, dest, structure=structure)
-        except Exception, e:
-            module.fail_json(msg=e.message)
+    downloaded = []
+
+    def stat(name):
+        listing[name] = engine.head(name)
+
+    def fetch(name):
+        if structure:
+            path = os.path.join(dest, *name.split('/'))
+        else:
+            path = os.path.join(dest, os.path.basename(name))
+        size, etag = listing[name]
+        if not src and os.path.isfile(path) and os.path.getsize(path) > engine.segment_size:
+            # listings show the manifest of a segmented object, only a HEAD
+            # returns its size and ETag
+            size, etag = engine.head(name)
+        if not (os.path.isfile(path) and os.path.getsize(path) == size
+                and engine.etag(path) == etag):
+            dirname = os.path.dirname(path)
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    # another worker may have created it meanwhile
+                    if not os.path.isdir(dirname):
+                        raise
+            engine.download(name, path)
+            downloaded.append(name)
+        results.append(name)
+
+    # Accept a single object name or a comma-separated list of objs
+    # If not specified, get the entire container
+    try:
+        if src:
+            objs = _split_names(src)
+            listing = dict()
+            run_parallel(stat, objs, engine.concurrency)
+            missing = [name for name in objs if listing[name] is None]
+            if missing:
+                module.fail_json(msg='Object(s) not found: %s' % ', '.join(missing))
         else:
-            results.append(obj)
+            listing = engine.list_objects()
+            objs = listing.keys()
+        run_parallel(fetch, objs, engine.concurrency)
+    except Exception, e:
+        module.fail_json(msg=str(e))
 
     len_results = len(results)
     len_objs = len(objs)
 
     EXIT_DICT['container'] = c.name
     EXIT_DICT['requested_downloaded'] = results
-    if results:
+    if downloaded:
         EXIT_DICT['changed'] = True
     if len_results == len_objs:
         EXIT_DICT['success'] = True
-        EXIT_DICT['msg'] = "%s objects downloaded to %s" % (len_results, dest)
+        EXIT_DICT['msg'] = "%s objects downloaded to %s" % (len(downloaded), dest)
     else:
         EXIT_DICT['msg'] = "Error: only %s of %s objects were " \
                            "downloaded" % (len_results, len_objs)
     module.exit_json(**EXIT_DICT)
 
 
-def delete(module, cf, container, src, dest):
+def delete(module, cf, container, src, dest, engine):
     """ Delete specific objects by proving a single file name or a
     comma-separated list to src OR dest (but not both).  Omitting file name(s)
     assumes the entire container is to be deleted.
@@ -363,24 +838,16 @@ def delete(module, cf, container, src, dest):
 
     c = _get_container(module, cf, container)
 
-    if objs:
-        objs = objs.split(',')
-        objs = map(str.strip, objs)
-    else:
-        objs = c.get_object_names()
-
-    num_objs = len(objs)
-
-    results = []
-    for obj in objs:
-        try:
-            result = c.delete_object(obj)
-        except Exception, e:
-            module.fail_json(msg=e.message)
+    try:
+        if objs:
+            objs = _split_names(objs)
         else:
-            results.append(result)
+            objs = engine.list_objects().keys()
+        num_deleted = engine.delete(objs)
+    except Exception, e:
+        module.fail_json(msg=str(e))
 
-    num_deleted = results.count(True)
+    num_objs = len(objs)
 
     EXIT_DICT['container'] = c.name
     EXIT_DICT['deleted'] = num_deleted
@@ -526,7 +993,7 @@ def delete_meta(module, cf, container, src, dest, meta):
 
 
 def cloudfiles(module, container, src, dest, method, typ, meta, clear_meta,
-               structure, expires):
+               structure, expires, concurrency, segment_size, extract_archive):
     """ Dispatch from here to work with metadata or file objects """
     cf = pyrax.cloudfiles
 
@@ -536,14 +1003,17 @@ def cloudfiles(module, container, src, dest, method, typ, meta, clear_meta,
                              'incorrectly capitalized region name.')
 
     if typ == "file":
+        engine = CloudFilesTransfer(cf, container, concurrency, segment_size)
+
         if method == 'put':
-            upload(module, cf, container, src, dest, meta, expires)
+            upload(module, cf, container, src, dest, meta, expires, engine,
+                   extract_archive)
 
         elif method == 'get':
-            download(module, cf, container, src, dest, structure)
+            download(module, cf, container, src, dest, structure, engine)
 
         elif method == 'delete':
-            delete(module, cf, container, src, dest)
+            delete(module, cf, container, src, dest, engine)
 
     else:
         if method == 'get':
@@ -569,6 +1039,9 @@ def main():
             clear_meta=dict(default=False, type='bool'),
             structure=dict(default=True, type='bool'),
             expires=dict(type='int'),
+            concurrency=dict(default=10, type='int'),
+            segment_size=dict(default=1024, type='int'),
+            extract_archive=dict(default=False, type='bool'),
         )
     )
 
@@ -589,12 +1062,23 @@ def main():
     clear_meta = module.params.get('clear_meta')
     structure = module.params.get('structure')
     expires = module.params.get('expires')
+    concurrency = module.params.get('concurrency')
+    segment_size = module.params.get('segment_size')
+    extract_archive = module.params.get('extract_archive')
 
     if clear_meta and not typ == 'meta':
         module.fail_json(msg='clear_meta can only be used when setting metadata')
 
+    if concurrency < 1:
+        module.fail_json(msg='concurrency must be at least 1')
+
+    if segment_size < 1 or segment_size > 5120:
+        module.fail_json(msg='segment_size must be between 1 and 5120')
+
     setup_rax_module(module, pyrax)
-    cloudfiles(module, container, src, dest, method, typ, meta, clear_meta, structure, expires)
+    cloudfiles(module, container, src, dest, method, typ, meta, clear_meta,
+               structure, expires, concurrency, segment_size * 1024 * 1024,
+               extract_archive)
 
 
 from ansible.module_utils.basic import *
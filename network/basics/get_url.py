@@ -22,8 +22,15 @@
 
 import shutil
 import datetime
+import errno
+import httplib
+import os
 import re
+import stat
+import StringIO
 import tempfile
+import threading
+import time
 
 DOCUMENTATION = '''
 ---
@@ -73,9 +80,54 @@ options:
       - If a SHA-256 checksum is passed to this parameter, the digest of the
         destination file will be calculated after it is downloaded to ensure
         its integrity and verify that the transfer completed successfully.
+      - Since 1.9 the download is checked before it replaces C(dest), and
+        nothing is downloaded when C(dest) (or the cached copy of C(url))
+        already has this checksum.
     version_added: "1.3"
     required: false
     default: null
+  cache_dir:
+    description:
+      - Directory of a download cache shared by all get_url tasks on the
+        host, for example C(/var/cache/ansible/get_url). Downloads are kept
+        there by their SHA-256, along with the ETag and Last-Modified of their
+        url. Later downloads of the url are conditional requests (If-None-Match
+        and If-Modified-Since), and are served from the cache on a 304 or,
+        when C(sha256sum) matches the cached copy, without any request at all,
+        so they also work offline.
+    version_added: "1.9"
+    required: false
+    default: null
+  cache_size:
+    description:
+      - Size in MB the C(cache_dir) is kept below. The least recently used
+        downloads are removed first.
+    version_added: "1.9"
+    required: false
+    default: 1024
+  retries:
+    description:
+      - How many times a download that breaks off is resumed, with a Range
+        request from where it stopped. A download that still fails is kept
+        next to C(dest), and resumed by the next run if the server gave it an
+        ETag or Last-Modified.
+    version_added: "1.9"
+    required: false
+    default: 3
+  segments:
+    description:
+      - Fetch files of more than C(segments) MB in that many ranges at the
+        same time, when the server advertises C(Accept-Ranges).
+    version_added: "1.9"
+    required: false
+    default: 1
+  bandwidth_limit:
+    description:
+      - Limit the download to this many KB per second, over all its
+        segments. C(0) means no limit.
+    version_added: "1.9"
+    required: false
+    default: 0
   use_proxy:
     description:
       - if C(no), it will not use a proxy, even if one is defined in
@@ -114,6 +166,9 @@ options:
     required: false
 notes:
     - This module doesn't yet support configuration for proxies.
+    - Since 1.9 the result has a I(download) dict with the bytes
+      transferred, seconds, rate (bytes per second), retries, bytes resumed
+      from an earlier attempt and segments of the download.
 # informational: requirements for nodes
 requirements: [ urllib2, urlparse ]
 author: Jan-Piet Mens
@@ -125,6 +180,12 @@ EXAMPLES='''
 
 - name: download file with sha256 check
   get_url: url=http://example.com/path/file.conf dest=/etc/foo.conf sha256sum=b5bb9d8014a0f9b1d61e21e796d78dccdf1352f23cd32812f4850b878ae4944c
+
+- name: download an image through the host download cache
+  get_url: url=http://example.com/images/base.img dest=/srv/images/ force=yes cache_dir=/var/cache/ansible/get_url
+
+- name: download an iso in four ranges at once, without taking more than 20MB/s of the mirror
+  get_url: url=http://mirror.example.com/isos/install.iso dest=/srv/isos/install.iso segments=4 bandwidth_limit=20480
 '''
 
 try:
@@ -133,6 +194,12 @@ try:
 except ImportError:
     HAS_HASHLIB=False
 
+# size of the chunks downloads are read, hashed and written in
+BUFSIZE = 65536
+# smallest range worth a connection of its own
+MIN_SEGMENT = 1024 * 1024
+O_NOFOLLOW = getattr(os, 'O_NOFOLLOW', 0)
+
 # ==============================================================
 # url handling
 
@@ -142,32 +209,491 @@ def url_filename(url):
         return 'index.html'
     return fn
 
-def url_get(module, url, dest, use_proxy, last_mod_time, force, timeout=10):
+def new_digests():
+    """ the digests computed while a download is written """
+    digests = {}
+    if HAS_HASHLIB:
+        digests['sha1'] = hashlib.sha1()
+        digests['sha256'] = hashlib.sha256()
+        try:
+            digests['md5'] = hashlib.md5()
+        except ValueError:
+            # FIPS enabled systems
+            pass
+    return digests
+
+class DownloadError(Exception):
+    pass
+
+class Transfer(object):
+    """ Progress of one download, for the result, and the bandwidth limit
+    shared by all of its connections """
+
+    def __init__(self, limit=0):
+        # bytes per second, 0 for no limit
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.bytes = 0
+        self.retries = 0
+        self.resumed = 0
+        self.segments = 1
+
+    def received(self, size):
+        self.lock.acquire()
+        try:
+            self.bytes += size
+            delay = 0
+            if self.limit:
+                delay = self.start + float(self.bytes) / self.limit - time.time()
+        finally:
+            self.lock.release()
+        if delay > 0:
+            time.sleep(delay)
+
+    def retry(self, retries):
+        """ Counts a retry, False once there were retries already """
+        self.lock.acquire()
+        try:
+            if self.retries >= retries:
+                return False
+            self.retries += 1
+            attempt = self.retries
+        finally:
+            self.lock.release()
+        time.sleep(min(attempt, 10))
+        return True
+
+    def result(self):
+        seconds = time.time() - self.start
+        rate = None
+        if seconds > 0:
+            rate = int(self.bytes / seconds)
+        return dict(bytes=self.bytes, seconds=round(seconds, 3), rate=rate,
+                    retries=self.retries, resumed=self.resumed, segments=self.segments)
+
+def content_length(info):
+    try:
+        return int(info.get('content-length'))
+    except (TypeError, ValueError):
+        return None
+
+def content_range(info):
+    """ (first byte, total size) of a partial response, (None, None) for a
+    whole one; the size is None if the server does not know it """
+    match = re.match(r'bytes (\d+)-(\d+)/(\d+|\*)', info.get('content-range', ''))
+    if not match:
+        return None, None
+    total = None
+    if match.group(3) != '*':
+        total = int(match.group(3))
+    return int(match.group(1)), total
+
+def range_validator(info):
+    """ What If-Range compares a resumed download with, None if the
+    response has neither a strong ETag nor a Last-Modified """
+    etag = info.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return info.get('last-modified')
+
+def open_own(path, mode):
+    """ Opens path only if it is a regular file of ours with no other
+    links, never through a symlink, as the name is predictable. None if
+    there is no such file """
+    try:
+        st = os.lstat(path)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        if mode == 'rb':
+            fd = os.open(path, os.O_RDONLY | O_NOFOLLOW)
+        else:
+            fd = os.open(path, os.O_RDWR | O_NOFOLLOW)
+    except OSError:
+        return None
+    st = os.fstat(fd)
+    if not stat.S_ISREG(st.st_mode) or st.st_uid != os.getuid() or st.st_nlink != 1:
+        os.close(fd)
+        return None
+    return os.fdopen(fd, mode)
+
+def create_partial(partname):
+    """ Creates the partial download file, or returns None if the name is
+    taken by something that is not a leftover of ours """
+    for attempt in range(2):
+        try:
+            fd = os.open(partname, os.O_RDWR | os.O_CREAT | os.O_EXCL | O_NOFOLLOW, 0600)
+            return os.fdopen(fd, 'w+b')
+        except OSError, e:
+            if e.errno != errno.EEXIST:
+                raise
+        f = open_own(partname, 'rb')
+        if f is None:
+            return None
+        f.close()
+        os.remove(partname)
+    return None
+
+def read_partial(partname, url):
+    """ (size, validator) of a download of url that failed part way """
+    f = open_own(partname + '.json', 'rb')
+    if f is None:
+        return 0, None
+    try:
+        try:
+            state = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return 0, None
+    part = open_own(partname, 'rb')
+    if state.get('url') != url or not state.get('validator') or part is None:
+        return 0, None
+    size = os.fstat(part.fileno()).st_size
+    part.close()
+    return size, state['validator']
+
+def write_partial_state(partname, url, validator):
+    """ Records what the partial download can be resumed against. The file
+    is renamed in place, which never follows a symlink. Returns False if
+    that is not possible """
+    tempname = None
+    try:
+        fd, tempname = tempfile.mkstemp(dir=os.path.dirname(partname), prefix='.get_url.')
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(dict(url=url, validator=validator), f)
+        finally:
+            f.close()
+        os.rename(tempname, partname + '.json')
+    except (IOError, OSError):
+        remove_files(tempname)
+        return False
+    return True
+
+def remove_files(*paths):
+    for path in paths:
+        if path and os.path.lexists(path):
+            os.remove(path)
+
+def copy_stream(rsp, files, digests, transfer, length=None):
+    """ Copies rsp to files, hashing it on the way, until its end or length
+    bytes. Returns the number of bytes copied. Errors reading rsp are raised
+    as DownloadError, so that the download can be resumed """
+    copied = 0
+    while length is None or copied < length:
+        size = BUFSIZE
+        if length is not None:
+            size = min(size, length - copied)
+        try:
+            data = rsp.read(size)
+        except (IOError, httplib.HTTPException), e:
+            raise DownloadError(str(e) or e.__class__.__name__)
+        if not data:
+            break
+        for digest in digests.values():
+            digest.update(data)
+        for f in files:
+            f.write(data)
+        copied += len(data)
+        transfer.received(len(data))
+    return copied
+
+def url_get(module, url, dest, use_proxy, last_mod_time, force, timeout=10, headers=None, cache_dir=None,
+            retries=0, segments=1, transfer=None):
     """
-    Download data from the url and store in a temporary file.
+    Download data from the url into a temporary file in the directory of
+    dest, and into another one in cache_dir if given, hashing it on the way.
 
-    Return (tempfile, info about the request)
+    A download that breaks off is resumed with a Range request, up to
+    retries times, and one that fails altogether is kept to be resumed by
+    the next run. With segments > 1 a large file is fetched in that many
+    ranges at the same time, when the server supports it.
+
+    Return (tempfile, info about the request, hex digests, cache tempfile).
+    For a 304 tempfile is None.
     """
+    if transfer is None:
+        transfer = Transfer()
+    headers = dict(headers or {})
 
-    rsp, info = fetch_url(module, url, use_proxy=use_proxy, force=force, last_mod_time=last_mod_time, timeout=timeout)
+    if os.path.isdir(dest):
+        tempdir = dest
+    else:
+        tempdir = os.path.dirname(dest)
+    if not os.access(tempdir, os.W_OK):
+        module.fail_json(msg="Destination %s not writable" % tempdir)
+
+    # the temporary file is next to dest, so it can be renamed over it, and
+    # named after the url so that the next run can resume it
+    partname = None
+    start, validator = 0, None
+    if HAS_HASHLIB:
+        partname = os.path.join(tempdir, '.get_url.%s.part' % hashlib.sha1(url).hexdigest())
+        start, validator = read_partial(partname, url)
+
+    def fetch(first=0, last=None, validator=None):
+        request_headers = dict(headers)
+        if first or last is not None:
+            if last is None:
+                request_headers['Range'] = 'bytes=%d-' % first
+            else:
+                request_headers['Range'] = 'bytes=%d-%d' % (first, last)
+            request_headers['If-Range'] = validator
+        rsp, info = fetch_url(module, url, use_proxy=use_proxy, force=force, last_mod_time=last_mod_time,
+                              timeout=timeout, headers=request_headers)
+        # partial responses are told apart by their Content-Range
+        if info['status'] == 206:
+            info['status'] = 200
+        return rsp, info
+
+    rsp, info = fetch(start, None, validator)
+    if start and (info['status'] == 416 or content_range(info)[0] not in (None, start)):
+        # the partial download is of no use
+        rsp, info = fetch()
+        start = 0
 
     if info['status'] == 304:
-        module.exit_json(url=url, dest=dest, changed=False, msg=info.get('msg', ''))
+        return None, info, None, None
 
-    # create a temporary file and copy content to do checksum-based replacement
     if info['status'] != 200:
         module.fail_json(msg="Request failed", status_code=info['status'], response=info['msg'], url=url, dest=dest)
 
-    fd, tempname = tempfile.mkstemp()
-    f = os.fdopen(fd, 'wb')
+    first, total = content_range(info)
+    if first is None:
+        start = 0
+        total = content_length(info)
+        validator = range_validator(info)
+    transfer.resumed = start
+
+    segmented = (segments > 1 and not start and validator and total and total >= segments * MIN_SEGMENT
+                 and info.get('accept-ranges') == 'bytes')
+
+    files = []
+    cachename = None
+    statename = None
+    f = None
     try:
-        shutil.copyfileobj(rsp, f)
+        if cache_dir:
+            fd, cachename = tempfile.mkstemp(dir=cache_dir, prefix='.tmp')
+            files.append(os.fdopen(fd, 'wb'))
+        digests = new_digests()
+
+        try:
+            if start:
+                f = open_own(partname, 'r+b')
+                if f is not None:
+                    f.truncate(start)
+                    # hash what the previous run got
+                    copy_stream(f, files, digests, Transfer(), start)
+                    f.seek(start)
+                    statename = partname + '.json'
+            elif partname:
+                f = create_partial(partname)
+                # the segments are written out of order, so they cannot be resumed
+                if f is not None and validator and not segmented and write_partial_state(partname, url, validator):
+                    statename = partname + '.json'
+            if f is None:
+                if start:
+                    raise DownloadError("partial download %s went away" % partname)
+                # no resuming: use a name of our own
+                fd, partname = tempfile.mkstemp(dir=tempdir, prefix='.get_url.')
+                f = os.fdopen(fd, 'w+b')
+            files.insert(0, f)
+
+            if segmented:
+                # the segments are written out of order: hash the file afterwards
+                f.truncate(total)
+                get_segments(fetch, rsp, partname, total, segments, validator, retries, transfer)
+                transfer.segments = segments
+                f.seek(0)
+                digests = new_digests()
+                copy_stream(f, files[1:], digests, Transfer(), total)
+            else:
+                pos = start
+                while True:
+                    if rsp is None:
+                        error = "Request failed: %s" % info['msg']
+                    else:
+                        try:
+                            pos += copy_stream(rsp, files, digests, transfer)
+                            if total is None or pos >= total:
+                                break
+                            error = "connection closed after %d of %d bytes" % (pos, total)
+                        except DownloadError, e:
+                            error = str(e)
+                        rsp.close()
+                    if not transfer.retry(retries):
+                        raise DownloadError(error)
+                    if validator:
+                        rsp, info = fetch(pos, None, validator)
+                    else:
+                        rsp, info = fetch()
+                    if info['status'] != 200:
+                        rsp = None
+                    elif content_range(info)[0] is None:
+                        # the server sends it all again
+                        for out in files:
+                            out.seek(0)
+                            out.truncate()
+                        digests = new_digests()
+                        pos = 0
+                        total = content_length(info)
+                        validator = range_validator(info)
+                    elif content_range(info)[0] != pos:
+                        rsp.close()
+                        rsp = None
+        finally:
+            for out in files:
+                out.close()
+            if rsp is not None:
+                rsp.close()
+    except DownloadError, err:
+        # a partial download with a state file is kept to be resumed
+        if statename is None:
+            remove_files(f and partname)
+        remove_files(cachename)
+        module.fail_json(msg="failed to download %s: %s" % (url, str(err)), url=url, dest=dest,
+                         download=transfer.result())
     except Exception, err:
-        os.remove(tempname)
+        remove_files(f and partname, statename, cachename)
         module.fail_json(msg="failed to create temporary content file: %s" % str(err))
-    f.close()
-    rsp.close()
-    return tempname, info
+
+    remove_files(statename)
+
+    hexdigests = dict((name, digest.hexdigest()) for (name, digest) in digests.items())
+    if 'sha1' not in hexdigests:
+        hexdigests['sha1'] = module.sha1(partname)
+    if cache_dir:
+        return partname, info, hexdigests, cachename
+    return partname, info, hexdigests, None
+
+def get_segments(fetch, rsp, partname, total, segments, validator, retries, transfer):
+    """ Fetches the file in segments ranges at the same time into partname.
+    The first range is read from rsp, the response to the plain request """
+    size = (total + segments - 1) // segments
+    errors = []
+
+    def get_segment(first, last, rsp):
+        f = os.fdopen(os.open(partname, os.O_RDWR | O_NOFOLLOW), 'r+b')
+        try:
+            f.seek(first)
+            pos = first
+            while True:
+                if rsp is not None:
+                    try:
+                        pos += copy_stream(rsp, [f], {}, transfer, last + 1 - pos)
+                        if pos > last:
+                            return
+                        error = "connection closed after %d of %d bytes" % (pos - first, last + 1 - first)
+                    except DownloadError, e:
+                        error = str(e)
+                    rsp.close()
+                    if errors or not transfer.retry(retries):
+                        raise DownloadError(error)
+                rsp, info = fetch(pos, last, validator)
+                if info['status'] != 200 or content_range(info)[0] != pos:
+                    rsp = StringIO.StringIO('')
+        finally:
+            f.close()
+
+    def worker(first, last, rsp):
+        try:
+            get_segment(first, last, rsp)
+        except Exception, e:
+            errors.append(e)
+        if rsp is not None:
+            rsp.close()
+
+    threads = []
+    for i in range(1, segments):
+        thread = threading.Thread(target=worker, args=(i * size, min(total, (i + 1) * size) - 1, None))
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    worker(0, size - 1, rsp)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise DownloadError(str(errors[0]))
+
+# ==============================================================
+# download cache
+
+def cache_meta_path(cache_dir, url):
+    return os.path.join(cache_dir, '%s.json' % hashlib.sha256(url).hexdigest())
+
+def cache_lookup(cache_dir, url):
+    """ The cache entry of url, or {} if there is none or its content has
+    been evicted """
+    try:
+        f = open(cache_meta_path(cache_dir, url))
+        try:
+            entry = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return {}
+    if entry.get('url') != url or not entry.get('sha256') or not os.path.exists(os.path.join(cache_dir, entry['sha256'])):
+        return {}
+    return entry
+
+def cache_store(cache_dir, url, cachename, info, digests, filename):
+    """ Moves a downloaded file into the cache under its sha256, and records
+    it as the content of url. Returns the cache entry """
+    blob = os.path.join(cache_dir, digests['sha256'])
+    if os.path.exists(blob):
+        os.remove(cachename)
+    else:
+        os.rename(cachename, blob)
+    entry = dict(url=url, sha256=digests['sha256'], sha1=digests['sha1'], md5=digests.get('md5'),
+                 size=os.path.getsize(blob), etag=info.get('etag'),
+                 last_modified=info.get('last-modified'), filename=filename)
+    fd, tempname = tempfile.mkstemp(dir=cache_dir, prefix='.tmp')
+    f = os.fdopen(fd, 'w')
+    try:
+        json.dump(entry, f)
+    finally:
+        f.close()
+    os.rename(tempname, cache_meta_path(cache_dir, url))
+    return entry
+
+def cache_prune(cache_dir, max_size, keep):
+    """ Removes the least recently used downloads until the cache is no
+    bigger than max_size bytes, never removing keep """
+    blobs = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if name.startswith('.') or name.endswith('.json'):
+            continue
+        path = os.path.join(cache_dir, name)
+        st = os.stat(path)
+        blobs.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    if total <= max_size:
+        return
+    blobs.sort()
+    for (mtime, size, path) in blobs:
+        if total <= max_size:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total -= size
+    # drop the entries of the urls whose content is gone
+    for name in os.listdir(cache_dir):
+        if name.endswith('.json'):
+            path = os.path.join(cache_dir, name)
+            try:
+                f = open(path)
+                try:
+                    entry = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError):
+                entry = {}
+            if not entry.get('sha256') or not os.path.exists(os.path.join(cache_dir, entry['sha256'])):
+                os.remove(path)
 
 def extract_filename_from_headers(headers):
     """
@@ -199,6 +725,11 @@ def main():
         dest = dict(required=True),
         sha256sum = dict(default=''),
         timeout = dict(required=False, type='int', default=10),
+        cache_dir = dict(required=False, default=None),
+        cache_size = dict(required=False, type='int', default=1024),
+        retries = dict(required=False, type='int', default=3),
+        segments = dict(required=False, type='int', default=1),
+        bandwidth_limit = dict(required=False, type='int', default=0),
     )
 
     module = AnsibleModule(
@@ -213,6 +744,22 @@ def main():
     sha256sum = module.params['sha256sum']
     use_proxy = module.params['use_proxy']
     timeout = module.params['timeout']
+    cache_dir = module.params['cache_dir']
+    transfer = Transfer(module.params['bandwidth_limit'] * 1024)
+    download = None
+
+    if sha256sum != '':
+        if not HAS_HASHLIB:
+            module.fail_json(msg="The sha256sum parameter requires hashlib, which is available in Python 2.5 and higher")
+        # Remove any non-alphanumeric characters, including the infamous
+        # Unicode zero-width space
+        sha256sum = re.sub(r'\W+', '', sha256sum).lower()
+    if cache_dir:
+        if not HAS_HASHLIB:
+            module.fail_json(msg="The cache_dir parameter requires hashlib, which is available in Python 2.5 and higher")
+        cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
 
     dest_is_dir = os.path.isdir(dest)
     last_mod_time = None
@@ -220,82 +767,117 @@ def main():
     if not dest_is_dir and os.path.exists(dest):
         if not force:
             module.exit_json(msg="file already exists", dest=dest, url=url, changed=False)
+        if sha256sum != '' and os.access(dest, os.R_OK) and module.sha256(dest) == sha256sum:
+            module.exit_json(msg="file already has the sha256sum", dest=dest, url=url, changed=False)
 
         # If the file already exists, prepare the last modified time for the
         # request.
         mtime = os.path.getmtime(dest)
         last_mod_time = datetime.datetime.utcfromtimestamp(mtime)
 
-    # download to tmpsrc
-    tmpsrc, info = url_get(module, url, dest, use_proxy, last_mod_time, force, timeout)
+    entry = {}
+    if cache_dir:
+        entry = cache_lookup(cache_dir, url)
 
-    # Now the request has completed, we can finally generate the final
-    # destination file name from the info dict.
+    tmpsrc = None
+    cached = False
+    if entry and sha256sum != '' and entry['sha256'] == sha256sum:
+        # the cache has the very content asked for: no request needed
+        info = dict(status=200, msg='OK (cached)', url=url)
+        cached = True
+    else:
+        headers = {}
+        if entry:
+            # the cache entry knows better than the mtime of dest
+            last_mod_time = None
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        # download to tmpsrc
+        tmpsrc, info, digests, cachename = url_get(module, url, dest, use_proxy, last_mod_time, force, timeout, headers, cache_dir,
+                                                   module.params['retries'], module.params['segments'], transfer)
+
+        if tmpsrc is None:
+            if not entry:
+                module.exit_json(url=url, dest=dest, changed=False, msg=info.get('msg', ''))
+            cached = True
+        else:
+            download = transfer.result()
+            # Now the request has completed, we can finally generate the final
+            # destination file name from the info dict.
+            filename = extract_filename_from_headers(info)
+            if not filename:
+                # Fall back to extracting the filename from the URL.
+                # Pluck the URL from the info, since a redirect could have changed
+                # it.
+                filename = url_filename(info['url'])
+            if cachename:
+                entry = cache_store(cache_dir, url, cachename, info, digests, filename)
+                cache_prune(cache_dir, module.params['cache_size'] * 1024 * 1024, os.path.join(cache_dir, entry['sha256']))
+
+    if cached:
+        blob = os.path.join(cache_dir, entry['sha256'])
+        # keep recently used downloads from being evicted
+        os.utime(blob, None)
+        digests = dict(sha1=entry['sha1'], sha256=entry['sha256'], md5=entry.get('md5'))
+        filename = entry['filename']
 
     if dest_is_dir:
-        filename = extract_filename_from_headers(info)
-        if not filename:
-            # Fall back to extracting the filename from the URL.
-            # Pluck the URL from the info, since a redirect could have changed
-            # it.
-            filename = url_filename(info['url'])
         dest = os.path.join(dest, filename)
 
-    checksum_src   = None
-    checksum_dest  = None
+    # Check the digest of the download and ensure that it matches the
+    # sha256sum parameter if it is present, before it replaces dest
+    if sha256sum != '' and sha256sum != digests['sha256']:
+        if tmpsrc:
+            os.remove(tmpsrc)
+        module.fail_json(msg="The SHA-256 checksum for %s did not match %s; it was %s." % (dest, sha256sum, digests['sha256']))
 
-    # raise an error if there is no tmpsrc file
-    if not os.path.exists(tmpsrc):
-        os.remove(tmpsrc)
-        module.fail_json(msg="Request failed", status_code=info['status'], response=info['msg'])
-    if not os.access(tmpsrc, os.R_OK):
-        os.remove(tmpsrc)
-        module.fail_json( msg="Source %s not readable" % (tmpsrc))
-    checksum_src = module.sha1(tmpsrc)
+    checksum_src = digests['sha1']
+    checksum_dest = None
 
     # check if there is no dest file
     if os.path.exists(dest):
         # raise an error if copy has no permission on dest
         if not os.access(dest, os.W_OK):
-            os.remove(tmpsrc)
+            if tmpsrc:
+                os.remove(tmpsrc)
             module.fail_json( msg="Destination %s not writable" % (dest))
         if not os.access(dest, os.R_OK):
-            os.remove(tmpsrc)
+            if tmpsrc:
+                os.remove(tmpsrc)
             module.fail_json( msg="Destination %s not readable" % (dest))
         checksum_dest = module.sha1(dest)
-    else:
-        if not os.access(os.path.dirname(dest), os.W_OK):
+    elif not os.access(os.path.dirname(dest), os.W_OK):
+        if tmpsrc:
             os.remove(tmpsrc)
-            module.fail_json( msg="Destination %s not writable" % (os.path.dirname(dest)))
+        module.fail_json( msg="Destination %s not writable" % (os.path.dirname(dest)))
 
     if checksum_src != checksum_dest:
         try:
-            shutil.copyfile(tmpsrc, dest)
+            if tmpsrc is None:
+                # put the cached copy next to dest
+                fd, tmpsrc = tempfile.mkstemp(dir=os.path.dirname(dest), prefix='.get_url.')
+                f = os.fdopen(fd, 'wb')
+                try:
+                    src = open(blob, 'rb')
+                    try:
+                        shutil.copyfileobj(src, f, BUFSIZE)
+                    finally:
+                        src.close()
+                finally:
+                    f.close()
+            module.atomic_move(tmpsrc, dest)
         except Exception, err:
-            os.remove(tmpsrc)
-            module.fail_json(msg="failed to copy %s to %s: %s" % (tmpsrc, dest, str(err)))
+            if tmpsrc and os.path.exists(tmpsrc):
+                os.remove(tmpsrc)
+            module.fail_json(msg="failed to move %s to %s: %s" % (tmpsrc, dest, str(err)))
         changed = True
     else:
         changed = False
-
-    # Check the digest of the destination file and ensure that it matches the
-    # sha256sum parameter if it is present
-    if sha256sum != '':
-        # Remove any non-alphanumeric characters, including the infamous
-        # Unicode zero-width space
-        stripped_sha256sum = re.sub(r'\W+', '', sha256sum)
-
-        if not HAS_HASHLIB:
-            os.remove(dest)
-            module.fail_json(msg="The sha256sum parameter requires hashlib, which is available in Python 2.5 and higher")
-        else:
-            destination_checksum = module.sha256(dest)
-
-        if stripped_sha256sum.lower() != destination_checksum:
-            os.remove(dest)
-            module.fail_json(msg="The SHA-256 checksum for %s did not match %s; it was %s." % (dest, sha256sum, destination_checksum))
-
-    os.remove(tmpsrc)
+        if tmpsrc:
+            os.remove(tmpsrc)
 
     # allow file attribute changes
     module.params['path'] = dest
@@ -304,15 +886,17 @@ def main():
     changed = module.set_fs_attributes_if_different(file_args, changed)
 
     # Backwards compat only.  We'll return None on FIPS enabled systems
-    try:
-        md5sum = module.md5(dest)
-    except ValueError:
-        md5sum = None
+    md5sum = digests.get('md5')
+    if md5sum is None and not HAS_HASHLIB:
+        try:
+            md5sum = module.md5(dest)
+        except ValueError:
+            md5sum = None
 
     # Mission complete
 
     module.exit_json(url=url, dest=dest, src=tmpsrc, md5sum=md5sum, checksum=checksum_src,
-        sha256sum=sha256sum, changed=changed, msg=info.get('msg', ''))
+        sha256sum=sha256sum, changed=changed, cached=cached, download=download, msg=info.get('msg', ''))
 
 # import module snippets
 from ansible.module_utils.basic import *
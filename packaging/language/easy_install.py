@@ -22,6 +22,11 @@
 import tempfile
 import os.path
 
+try:
+    import pkg_resources
+except ImportError:
+    pkg_resources = None
+
 DOCUMENTATION = '''
 ---
 module: easy_install
@@ -32,7 +37,10 @@ version_added: "0.7"
 options:
   name:
     description:
-      - A Python library name
+      - A Python library name, or since 1.9 a list of them. The libraries
+        that are not installed yet are installed with one easy_install run.
+        Version specifiers following a comma, as in C(foo>=1.0,<2.0), stay
+        part of the library before them.
     required: true
     default: null
     aliases: []
@@ -77,6 +85,10 @@ notes:
       using M(easy_install).
     - Also note that I(virtualenv) must be installed on the remote host if the
       C(virtualenv) parameter is specified.
+    - When pkg_resources (setuptools) is available, whether a library is
+      installed is read from the egg-info/dist-info metadata on the sys.path of
+      easy_install's interpreter. Otherwise, and for urls and paths, it is
+      found out with C(easy_install --dry-run).
 requirements: [ "virtualenv" ]
 author: Matt Wright
 '''
@@ -87,6 +99,9 @@ EXAMPLES = '''
 
 # Install Bottle into the specified virtualenv.
 - easy_install: name=bottle virtualenv=/webapps/myapp/venv
+
+# Install several libraries with one easy_install run.
+- easy_install: name=bottle,Jinja2>=2.7 virtualenv=/webapps/myapp/venv
 '''
 
 def _is_package_installed(module, name, easy_install):
@@ -95,6 +110,73 @@ def _is_package_installed(module, name, easy_install):
     return not ('Reading' in status_stdout or 'Downloading' in status_stdout)
 
 
+def _get_interpreter(module, easy_install):
+    """ python interpreter easy_install runs with, taken from its #! line """
+    try:
+        f = open(easy_install)
+        try:
+            line = f.readline()
+        finally:
+            f.close()
+    except IOError:
+        return None
+    if not line.startswith('#!'):
+        return None
+    words = line[2:].split()
+    if words and os.path.basename(words[0]) == 'env' and len(words) > 1:
+        return module.get_bin_path(words[1], False)
+    if not words or not os.path.basename(words[0]).startswith('python'):
+        return None
+    return words[0]
+
+
+def _get_installed(module, easy_install):
+    """ Distributions installed for easy_install's interpreter, read from
+    the *.egg-info, *.egg and *.dist-info metadata on its sys.path.
+
+    Returns a pkg_resources.WorkingSet, or None if it cannot be found out """
+    if pkg_resources is None:
+        return None
+    python = _get_interpreter(module, easy_install)
+    if python is None:
+        return None
+    rc, out, err = module.run_command([python, '-c', 'import sys; print("\\n".join(sys.path))'],
+                                      cwd=tempfile.gettempdir())
+    if rc != 0:
+        return None
+    paths = [p for p in out.splitlines() if p and os.path.isdir(p)]
+    return pkg_resources.WorkingSet(paths)
+
+
+def _is_satisfied(name, installed):
+    """ True or False for a requirement the installed metadata answers,
+    None for urls, paths and anything else only easy_install can judge """
+    if installed is None or '/' in name or '\\' in name or name.startswith('.'):
+        return None
+    try:
+        req = pkg_resources.Requirement.parse(name)
+    except ValueError:
+        return None
+    try:
+        installed.resolve([req])
+    except pkg_resources.ResolutionError:
+        return False
+    return True
+
+
+def _join_specifiers(names):
+    """ Put back together requirements like foo>=1.0,<2.0 that were split
+    into several names at their commas """
+    joined = []
+    for name in names:
+        name = name.strip()
+        if joined and name[:1] in ('<', '>', '=', '!', '~'):
+            joined[-1] = '%s,%s' % (joined[-1], name)
+        elif name:
+            joined.append(name)
+    return joined
+
+
 def _get_easy_install(module, env=None, executable=None):
     candidate_easy_inst_basenames = ['easy_install']
     easy_install = None
@@ -123,7 +205,7 @@ def _get_easy_install(module, env=None, executable=None):
 
 def main():
     arg_spec = dict(
-        name=dict(required=True),
+        name=dict(required=True, type='list'),
         virtualenv=dict(default=None, required=False),
         virtualenv_site_packages=dict(default='no', type='bool'),
         virtualenv_command=dict(default='virtualenv', required=False),
@@ -132,7 +214,7 @@ def main():
 
     module = AnsibleModule(argument_spec=arg_spec, supports_check_mode=True)
 
-    name = module.params['name']
+    names = _join_specifiers(module.params['name'])
     env = module.params['virtualenv']
     executable = module.params['executable']
     site_packages = module.params['virtualenv_site_packages']
@@ -162,12 +244,19 @@ def main():
 
     cmd = None
     changed = False
-    installed = _is_package_installed(module, name, easy_install)
+    installed = _get_installed(module, easy_install)
+    missing = []
+    for name in names:
+        satisfied = _is_satisfied(name, installed)
+        if satisfied is None:
+            satisfied = _is_package_installed(module, name, easy_install)
+        if not satisfied:
+            missing.append(name)
 
-    if not installed:
+    if missing:
         if module.check_mode:
-            module.exit_json(changed=True)
-        cmd = '%s %s' % (easy_install, name)
+            module.exit_json(changed=True, missing=missing)
+        cmd = [easy_install] + missing
         rc_easy_inst, out_easy_inst, err_easy_inst = module.run_command(cmd)
 
         rc += rc_easy_inst
@@ -180,7 +269,7 @@ def main():
         module.fail_json(msg=err, cmd=cmd)
 
     module.exit_json(changed=changed, binary=easy_install,
-                     name=name, virtualenv=env)
+                     name=','.join(names), virtualenv=env, installed=missing)
 
 # import module snippets
 from ansible.module_utils.basic import *
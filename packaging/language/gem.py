@@ -30,6 +30,12 @@ options:
   name:
     description:
       - The name of the gem to be managed.
+      - Since 1.9 this can also be a list of gems. Entries are names, or dicts
+        with C(name) and optionally C(version) and C(state) overriding the
+        module options for that gem. The installed (and for C(latest), remote)
+        versions of all gems are read with one C(gem query), and the missing
+        gems are installed with one C(gem install). The result has a
+        C(changed) flag per gem in I(results).
     required: true
   state:
     description:
@@ -85,6 +91,14 @@ EXAMPLES = '''
 
 # Installs rake version 1.0 from a local gem on disk.
 - gem: name=rake gem_source=/path/to/gems/rake-1.0.gem state=present
+
+# Installs all the gems of an app server in one go.
+- gem:
+    name:
+      - bundler
+      - { name: rack, version: 1.5.2 }
+      - { name: unicorn, state: latest }
+      - { name: mongrel, state: absent }
 '''
 
 import re
@@ -105,7 +119,9 @@ def get_rubygems_version(module):
 
     return tuple(int(x) for x in match.groups())
 
-def get_installed_versions(module, remote=False):
+def get_gem_index(module, names, remote=False):
+    """ Returns a dict of gem name to versions for all the given names,
+    from a single gem query """
 
     cmd = get_rubygems_path(module)
     cmd.append('query')
@@ -114,16 +130,24 @@ def get_installed_versions(module, remote=False):
         if module.params['repository']:
             cmd.extend([ '--source', module.params['repository'] ])
     cmd.append('-n')
-    cmd.append('^%s$' % module.params['name'])
+    cmd.append('^(%s)$' % '|'.join([ re.escape(name) for name in names ]))
     (rc, out, err) = module.run_command(cmd, check_rc=True)
-    installed_versions = []
+    index = {}
     for line in out.splitlines():
-        match = re.match(r"\S+\s+\((.+)\)", line)
+        match = re.match(r"(\S+)\s+\((.+)\)", line)
         if match:
-            versions = match.group(1)
-            for version in versions.split(', '):
-                installed_versions.append(version.split()[0])
-    return installed_versions
+            versions = index.setdefault(match.group(1), [])
+            for version in match.group(2).split(', '):
+                # default gems are listed as "default: 1.0"
+                if version.startswith('default: '):
+                    version = version[len('default: '):]
+                versions.append(version.split()[0])
+    return index
+
+def get_installed_versions(module, remote=False):
+
+    index = get_gem_index(module, [ module.params['name'] ], remote=remote)
+    return index.get(module.params['name'], [])
 
 def exists(module):
 
@@ -154,21 +178,10 @@ def uninstall(module):
     cmd.append(module.params['name'])
     module.run_command(cmd, check_rc=True)
 
-def install(module):
-
-    if module.check_mode:
-        return
-
-    ver = get_rubygems_version(module)
-    if ver:
-        major = ver[0]
-    else:
-        major = None
+def install_command(module, major):
 
     cmd = get_rubygems_path(module)
     cmd.append('install')
-    if module.params['version']:
-        cmd.extend([ '--version', module.params['version'] ])
     if module.params['repository']:
         cmd.extend([ '--source', module.params['repository'] ])
     if not module.params['include_dependencies']:
@@ -184,9 +197,117 @@ def install(module):
         cmd.append('--pre')
     cmd.append('--no-rdoc')
     cmd.append('--no-ri')
+    return cmd
+
+def install(module):
+
+    if module.check_mode:
+        return
+
+    ver = get_rubygems_version(module)
+    if ver:
+        major = ver[0]
+    else:
+        major = None
+
+    cmd = install_command(module, major)
+    if module.params['version']:
+        cmd.extend([ '--version', module.params['version'] ])
     cmd.append(module.params['gem_source'])
     module.run_command(cmd, check_rc=True)
 
+def manage_gems(module, gems):
+    """ Brings all gems to their state, reading the installed and remote
+    versions once and installing everything missing with one gem install.
+
+    Returns the per gem results """
+
+    items = []
+    for gem in gems:
+        if isinstance(gem, dict):
+            if 'name' not in gem:
+                module.fail_json(msg="name entries need a name: %s" % gem)
+            item = dict(name=gem['name'], version=gem.get('version', module.params['version']),
+                        state=gem.get('state', module.params['state']))
+        else:
+            item = dict(name=gem, version=module.params['version'], state=module.params['state'])
+        if item['state'] not in ('present', 'absent', 'latest'):
+            module.fail_json(msg="invalid state %s for gem %s" % (item['state'], item['name']))
+        if item['version'] and item['state'] == 'latest':
+            module.fail_json(msg="Cannot specify version when state=latest", name=item['name'])
+        if item['version'] is not None:
+            item['version'] = str(item['version'])
+        items.append(item)
+
+    installed = get_gem_index(module, [ item['name'] for item in items ])
+    latest = [ item['name'] for item in items if item['state'] == 'latest' ]
+    if latest:
+        remote = get_gem_index(module, latest, remote=True)
+        for item in items:
+            if item['state'] == 'latest' and remote.get(item['name']):
+                item['version'] = remote[item['name']][0]
+
+    results = []
+    to_install = []
+    to_uninstall = []
+    for item in items:
+        versions = installed.get(item['name'], [])
+        if item['version']:
+            present = item['version'] in versions
+        else:
+            present = bool(versions)
+        if item['state'] == 'absent':
+            changed = present
+            if changed:
+                to_uninstall.append(item)
+        else:
+            changed = not present
+            if changed:
+                to_install.append(item)
+        result = dict(name=item['name'], state=item['state'], changed=changed)
+        if item['version']:
+            result['version'] = item['version']
+        results.append(result)
+
+    if module.check_mode:
+        return results
+
+    if to_install:
+        ver = get_rubygems_version(module)
+        if ver:
+            major = ver[0]
+        else:
+            major = None
+        cmd = install_command(module, major)
+        if major and major >= 2:
+            # name:version pins one gem of many, since rubygems 2.0
+            for item in to_install:
+                if item['version']:
+                    cmd.append('%s:%s' % (item['name'], item['version']))
+                else:
+                    cmd.append(item['name'])
+            module.run_command(cmd, check_rc=True)
+        else:
+            unpinned = [ item['name'] for item in to_install if not item['version'] ]
+            if unpinned:
+                module.run_command(cmd + unpinned, check_rc=True)
+            for item in to_install:
+                if item['version']:
+                    module.run_command(cmd + [ '--version', item['version'], item['name'] ], check_rc=True)
+
+    unpinned = [ item['name'] for item in to_uninstall if not item['version'] ]
+    if unpinned:
+        cmd = get_rubygems_path(module)
+        cmd.extend([ 'uninstall', '--all', '--executable' ])
+        module.run_command(cmd + unpinned, check_rc=True)
+    for item in to_uninstall:
+        if item['version']:
+            cmd = get_rubygems_path(module)
+            cmd.extend([ 'uninstall', '--version', item['version'], item['name'] ])
+            module.run_command(cmd, check_rc=True)
+
+    return results
+
 def main():
 
     module = AnsibleModule(
@@ -194,7 +315,7 @@ def main():
             executable           = dict(required=False, type='str'),
             gem_source           = dict(required=False, type='str'),
             include_dependencies = dict(required=False, default=True, type='bool'),
-            name                 = dict(required=True, type='str'),
+            name                 = dict(required=True, type='list'),
             repository           = dict(required=False, aliases=['source'], type='str'),
             state                = dict(required=False, default='present', choices=['present','absent','latest'], type='str'),
             user_install         = dict(required=False, default=True, type='bool'),
@@ -205,6 +326,14 @@ def main():
         mutually_exclusive = [ ['gem_source','repository'], ['gem_source','version'] ],
     )
 
+    names = module.params['name']
+    if len(names) > 1 or isinstance(names[0], dict):
+        if module.params['gem_source']:
+            module.fail_json(msg="gem_source can only be used with a single gem")
+        results = manage_gems(module, names)
+        module.exit_json(changed=True in [ result['changed'] for result in results ], results=results)
+    module.params['name'] = names[0]
+
     if module.params['version'] and module.params['state'] == 'latest':
         module.fail_json(msg="Cannot specify version when state=latest")
     if module.params['gem_source'] and module.params['state'] == 'latest':
@@ -19,9 +19,18 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import fcntl
+import glob
+import hashlib
+import pipes
 import tempfile
 import os
 
+try:
+    import pkg_resources
+except ImportError:
+    pkg_resources = None
+
 DOCUMENTATION = '''
 ---
 module: pip
@@ -97,8 +106,21 @@ options:
     version_added: "1.3"
     required: false
     default: null
+  wheelhouse:
+    description:
+      - A directory on the remote host to keep built wheels in. Packages are
+        installed from it with C(--no-index), and any missing wheels are
+        first built into it with C(pip wheel), so further virtualenvs on the
+        host install without downloading or compiling again. extra_args are
+        passed to both C(pip wheel) and C(pip install). Needs the I(wheel)
+        package next to pip.
+    version_added: "1.9"
+    required: false
+    default: null
 notes:
    - Please note that virtualenv (U(http://www.virtualenv.org/)) must be installed on the remote host if the virtualenv parameter is specified.
+   - When pkg_resources (setuptools) is available, the installed distributions are read from their metadata first and pip is only run for the requirements not already satisfied. This is skipped for C(state=latest) and for extra_args such as C(--upgrade) or C(--target).
+   - After a requirements file has been installed into a virtualenv, a fingerprint of the file (with its includes), the python version and extra_args is kept in C(.ansible_pip_fingerprints) in the virtualenv. Later runs with the same fingerprint skip pip as long as the installed distributions did not change.
 requirements: [ "virtualenv", "pip" ]
 author: Matt Wright
 '''
@@ -133,6 +155,10 @@ EXAMPLES = '''
 
 # Install (Bottle) for Python 3.3 specifically,using the 'pip-3.3' executable.
 - pip: name=bottle executable=pip-3.3
+
+# Install specified python requirements in indicated (virtualenv), building
+# wheels once for all virtualenvs on the host.
+- pip: requirements=/my_app/requirements.txt virtualenv=/my_app/venv wheelhouse=/var/cache/wheelhouse
 '''
 
 def _get_cmd_options(module, cmd):
@@ -166,6 +192,219 @@ def _is_present(name, version, installed_pkgs):
     return False
 
 
+# pip options which make it act on requirements that are already satisfied, or
+# install somewhere else than the interpreter's own site-packages
+_REINSTALL_ARGS = frozenset([
+    '-U', '--upgrade', '-I', '--ignore-installed', '--force-reinstall',
+    '-e', '--editable', '-t', '--target', '--user', '--root', '--prefix',
+    '--install-option', '--global-option', '--egg',
+])
+
+
+def _can_precheck(state, extra_args):
+    if pkg_resources is None or state == 'latest':
+        return False
+    if extra_args:
+        for arg in extra_args.split():
+            if arg.split('=', 1)[0] in _REINSTALL_ARGS:
+                return False
+    return True
+
+
+def _get_interpreter(module, pip):
+    """ python interpreter pip runs with, taken from its #! line """
+    try:
+        f = open(pip)
+        try:
+            line = f.readline()
+        finally:
+            f.close()
+    except IOError:
+        return None
+    if not line.startswith('#!'):
+        return None
+    words = line[2:].split()
+    if words and os.path.basename(words[0]) == 'env' and len(words) > 1:
+        return module.get_bin_path(words[1], False)
+    if not words or not os.path.basename(words[0]).startswith('python'):
+        # e.g. the /bin/sh trampoline virtualenv writes for very long paths
+        return None
+    return words[0]
+
+
+def _get_installed(module, pip, cwd):
+    """ Distributions installed for pip's interpreter, read from the
+    *.dist-info and *.egg-info metadata on its sys.path.
+
+    Returns a pkg_resources.WorkingSet, or None if it cannot be found out """
+    python = _get_interpreter(module, pip)
+    if python is None:
+        return None
+    rc, out, err = module.run_command([python, '-c', 'import sys; print("\\n".join(sys.path))'], cwd=cwd)
+    if rc != 0:
+        return None
+    paths = [p for p in out.splitlines() if p and os.path.isdir(p)]
+    return pkg_resources.WorkingSet(paths)
+
+
+def _parse_requirement(line):
+    """ Returns a pkg_resources.Requirement for lines naming a project, None
+    for urls, paths, editables and anything else only pip can judge """
+    if line.startswith('-') or line.startswith('.') or '/' in line or '\\' in line:
+        return None
+    try:
+        req = pkg_resources.Requirement.parse(line)
+    except ValueError:
+        return None
+    if req.extras:
+        # the extras' own requirements are not recorded with the distribution
+        return None
+    return req
+
+
+def _is_satisfied(line, installed, state):
+    req = _parse_requirement(line)
+    if req is None:
+        return False
+    if state == 'absent':
+        return installed.find(pkg_resources.Requirement.parse(req.project_name)) is None
+    try:
+        installed.resolve([req])
+    except pkg_resources.ResolutionError:
+        return False
+    return True
+
+
+def _read_requirements(path, options, lines, seen=None):
+    """ Flattens a requirements file into its option lines and requirement
+    lines, following -r includes the way pip does """
+    if seen is None:
+        seen = set()
+    path = os.path.abspath(path)
+    if path in seen:
+        return
+    seen.add(path)
+    basedir = os.path.dirname(path)
+    f = open(path)
+    try:
+        content = f.read()
+    finally:
+        f.close()
+    for line in content.replace('\\\n', ' ').splitlines():
+        if line.lstrip().startswith('#'):
+            continue
+        line = line.split(' #', 1)[0].strip()
+        if not line:
+            continue
+        words = line.split(None, 1)
+        option = words[0].split('=', 1)
+        if option[0] in ('-r', '--requirement', '-c', '--constraint'):
+            if len(option) == 2:
+                include = option[1]
+            elif len(words) == 2:
+                include = words[1]
+            else:
+                include = ''
+            if '://' not in include:
+                include = os.path.join(basedir, include)
+            if option[0] in ('-r', '--requirement') and '://' not in include:
+                _read_requirements(include, options, lines, seen)
+            else:
+                options.append('%s %s' % (option[0], include))
+        elif line.startswith('-') and option[0] not in ('-e', '--editable'):
+            options.append(line)
+        else:
+            lines.append(line)
+
+
+def _get_fingerprint(module, pip, lines, extra_args, cwd):
+    """ sha256 of the requirements, the interpreter's version and extra_args """
+    python = _get_interpreter(module, pip)
+    if python is None:
+        return None
+    rc, out, err = module.run_command([python, '-c', 'import sys; print(sys.version)'], cwd=cwd)
+    if rc != 0:
+        return None
+    digest = hashlib.sha256()
+    for part in ['\n'.join(lines), out.strip(), extra_args or '']:
+        digest.update(part)
+        digest.update('\0')
+    return digest.hexdigest()
+
+
+def _env_state(env):
+    """ digest of the distributions installed in the virtualenv """
+    entries = []
+    for site in set(map(os.path.realpath, glob.glob(os.path.join(env, 'lib*', 'python*', 'site-packages')))):
+        for entry in os.listdir(site):
+            if entry.endswith(('.dist-info', '.egg-info', '.egg', '.egg-link', '.pth')):
+                entries.append(entry)
+    return hashlib.sha256('\n'.join(sorted(entries))).hexdigest()
+
+
+def _read_fingerprints(env):
+    try:
+        f = open(os.path.join(env, '.ansible_pip_fingerprints'))
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return {}
+
+
+def _read_fingerprint(env, requirements):
+    entry = _read_fingerprints(env).get(os.path.abspath(requirements))
+    if not entry:
+        return None
+    return (entry.get('fingerprint'), entry.get('environment'))
+
+
+def _write_fingerprint(module, env, requirements, fingerprint):
+    fingerprints = _read_fingerprints(env)
+    fingerprints[os.path.abspath(requirements)] = dict(fingerprint=fingerprint, environment=_env_state(env))
+    fd, tmp = tempfile.mkstemp(dir=env, prefix='.ansible_pip_fingerprints.')
+    f = os.fdopen(fd, 'w')
+    try:
+        json.dump(fingerprints, f)
+    finally:
+        f.close()
+    module.atomic_move(tmp, os.path.join(env, '.ansible_pip_fingerprints'))
+
+
+def _install_from_wheelhouse(module, pip, wheelhouse, action, extra_args, target, path_prefix, cwd):
+    """ Installs target from the wheels in wheelhouse only, building the
+    missing ones into it first.
+
+    Returns (cmd, rc, out, err) """
+    if not os.path.isdir(wheelhouse):
+        os.makedirs(wheelhouse)
+    args = '--find-links %s' % pipes.quote(wheelhouse)
+    if extra_args:
+        args += ' %s' % extra_args
+    install_cmd = '%s %s --no-index %s %s' % (pip, action, args, target)
+
+    out = ''
+    err = ''
+    if action == 'install':
+        rc, out, err = module.run_command(install_cmd, path_prefix=path_prefix, cwd=cwd)
+        if rc == 0:
+            return install_cmd, rc, out, err
+
+    # one pip wheel at a time per wheelhouse, concurrent installs only read it
+    wheel_cmd = '%s wheel --wheel-dir %s %s %s' % (pip, pipes.quote(wheelhouse), args, target)
+    lock = open(os.path.join(wheelhouse, '.lock'), 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        rc, out_wheel, err_wheel = module.run_command(wheel_cmd, path_prefix=path_prefix, cwd=cwd)
+    finally:
+        lock.close()
+    if rc != 0:
+        return wheel_cmd, rc, out_wheel, err_wheel
+
+    rc, out, err = module.run_command(install_cmd, path_prefix=path_prefix, cwd=cwd)
+    return install_cmd, rc, out_wheel + out, err_wheel + err
+
 
 def _get_pip(module, env=None, executable=None):
     # On Debian and Ubuntu, pip is pip.
@@ -228,6 +467,7 @@ def main():
             extra_args=dict(default=None, required=False),
             chdir=dict(default=None, required=False),
             executable=dict(default=None, required=False),
+            wheelhouse=dict(default=None, required=False),
         ),
         required_one_of=[['name', 'requirements']],
         mutually_exclusive=[['name', 'requirements']],
@@ -240,6 +480,9 @@ def main():
     requirements = module.params['requirements']
     extra_args = module.params['extra_args']
     chdir = module.params['chdir']
+    wheelhouse = module.params['wheelhouse']
+    if wheelhouse:
+        wheelhouse = os.path.abspath(os.path.expanduser(wheelhouse))
 
     if state == 'latest' and version is not None:
         module.fail_json(msg='version is incompatible with state=latest')
@@ -250,6 +493,7 @@ def main():
     env = module.params['virtualenv']
     virtualenv_command = module.params['virtualenv_command']
 
+    venv_created = False
     if env:
         env = os.path.expanduser(env)
         virtualenv = os.path.expanduser(virtualenv_command)
@@ -274,6 +518,7 @@ def main():
             err += err_venv
             if rc != 0:
                 _fail(module, cmd, out, err)
+            venv_created = True
 
     pip = _get_pip(module, env, module.params['executable'])
 
@@ -302,18 +547,75 @@ def main():
                 # Ok, we will reconstruct the option string
                 extra_args = ' '.join(args_list)
 
-    if extra_args:
-        cmd += ' %s' % extra_args
-    if name:
-        cmd += ' %s' % _get_full_name(name, version)
-    elif requirements:
-        cmd += ' -r %s' % requirements
-    
     this_dir = tempfile.gettempdir()
     if chdir:
         this_dir = os.path.join(this_dir, chdir)
 
+    req_options = []
+    req_lines = None
+    req_path = None
+    if name:
+        req_lines = [_get_full_name(name, version)]
+    elif '://' not in requirements:
+        req_lines = []
+        req_path = os.path.join(this_dir, requirements)
+        try:
+            _read_requirements(req_path, req_options, req_lines)
+        except IOError:
+            # leave the error to pip
+            req_lines = None
+
+    # A requirements file which was fully installed in this virtualenv before
+    # needs no further look as long as neither changed since
+    fingerprint = None
+    if env and requirements and state == 'present' and req_lines is not None and not venv_created:
+        fingerprint = _get_fingerprint(module, pip, req_options + req_lines, extra_args, this_dir)
+        if fingerprint is not None and _read_fingerprint(env, req_path) == (fingerprint, _env_state(env)):
+            module.exit_json(changed=False, name=name, version=version, state=state,
+                             requirements=requirements, virtualenv=env, stdout=out, stderr=err)
+
+    # Find out from the installed distributions' metadata what pip would
+    # have to do, so it is only run for the requirements not yet satisfied
+    pending = None
+    req_file = None
+    if req_lines is not None and _can_precheck(state, extra_args):
+        installed = _get_installed(module, pip, this_dir)
+        if installed is not None:
+            pending = [line for line in req_lines if not _is_satisfied(line, installed, state)]
+
+    if pending == []:
+        if fingerprint is not None and not module.check_mode:
+            _write_fingerprint(module, env, req_path, fingerprint)
+        module.exit_json(changed=False, name=name, version=version, state=state,
+                         requirements=requirements, virtualenv=env, stdout=out, stderr=err)
+
+    if name:
+        target = _get_full_name(name, version)
+    else:
+        target = '-r %s' % requirements
+        if pending is not None and len(pending) < len(req_lines) and not module.check_mode:
+            # hand pip only what is left to do, from the directory of the
+            # original file so relative paths in it still resolve
+            try:
+                fd, req_file = tempfile.mkstemp(prefix='.ansible-pip-', suffix='.txt',
+                                                dir=os.path.dirname(req_path))
+            except OSError:
+                pass
+            else:
+                f = os.fdopen(fd, 'w')
+                try:
+                    f.write('\n'.join(req_options + pending) + '\n')
+                finally:
+                    f.close()
+                target = '-r %s' % req_file
+
+    if extra_args:
+        cmd += ' %s' % extra_args
+    cmd += ' %s' % target
+
     if module.check_mode:
+        if pending is not None:
+            module.exit_json(changed=True, pending=pending)
         if env or extra_args or requirements or state == 'latest' or not name:
             module.exit_json(changed=True)
         elif name.startswith('svn+') or name.startswith('git+') or \
@@ -334,7 +636,15 @@ def main():
         changed = (state == 'present' and not is_present) or (state == 'absent' and is_present)
         module.exit_json(changed=changed, cmd=freeze_cmd, stdout=out, stderr=err)
 
-    rc, out_pip, err_pip = module.run_command(cmd, path_prefix=path_prefix, cwd=this_dir)
+    try:
+        if wheelhouse and state != 'absent' and not (extra_args and '-e' in extra_args.split()):
+            cmd, rc, out_pip, err_pip = _install_from_wheelhouse(module, pip, wheelhouse, state_map[state],
+                                                                 extra_args, target, path_prefix, this_dir)
+        else:
+            rc, out_pip, err_pip = module.run_command(cmd, path_prefix=path_prefix, cwd=this_dir)
+    finally:
+        if req_file:
+            os.unlink(req_file)
     out += out_pip
     err += err_pip
     if rc == 1 and state == 'absent' and 'not installed' in out_pip:
@@ -346,6 +656,8 @@ def main():
         changed = 'Successfully uninstalled' in out_pip
     else:
         changed = 'Successfully installed' in out_pip
+        if fingerprint is not None:
+            _write_fingerprint(module, env, req_path, fingerprint)
 
     module.exit_json(changed=changed, cmd=cmd, name=name, version=version,
                      state=state, requirements=requirements, virtualenv=env, stdout=out, stderr=err)
@@ -49,6 +49,23 @@ options:
       - If C(update_cache) is specified and the last run is less or equal than I(cache_valid_time) seconds ago, the C(update_cache) gets skipped.
     required: false
     default: no
+  update_sources:
+    description:
+      - Which sources C(update_cache) refreshes. With C(all) every source is refreshed, unless the last
+        update is younger than I(cache_valid_time). With C(stale) only the sources which were never
+        fetched (for example just added), whose Release file is past its Valid-Until date, or which
+        were last refreshed more than I(cache_valid_time) seconds ago are refreshed.
+    required: false
+    default: all
+    choices: [ "all", "stale" ]
+    version_added: "1.9"
+  update_concurrency:
+    description:
+      - Maximum number of hosts C(update_cache) downloads from at the same time. Defaults to apt's
+        own setting.
+    required: false
+    default: null
+    version_added: "1.9"
   purge:
     description:
      - Will force purging of configuration files if the module state is set to I(absent).
@@ -98,6 +115,11 @@ author: Matthew Williams
 notes:
    - Three of the upgrade modes (C(full), C(safe) and its alias C(yes)) require C(aptitude), otherwise
      C(apt-get) suffices.
+   - Packages are installed and removed through python-apt in a single transaction. The planned
+     transaction (packages to install, upgrade, downgrade, reinstall and remove, with the download size
+     and disk space change in bytes) is returned as I(transaction), in check mode as well.
+   - When C(update_cache) refreshed sources, each one is returned in I(sources) with its fetch time
+     in seconds, the bytes downloaded and whether it was fetched, not modified (C(hit)) or failed.
 '''
 
 EXAMPLES = '''
@@ -128,6 +150,10 @@ EXAMPLES = '''
 # Only run "update_cache=yes" if the last one is more than 3600 seconds ago
 - apt: update_cache=yes cache_valid_time=3600
 
+# Only refresh the sources not refreshed within the last hour, or just added,
+# fetching from up to 8 mirrors at the same time
+- apt: update_cache=yes update_sources=stale cache_valid_time=3600 update_concurrency=8
+
 # Pass options to dpkg on run
 - apt: upgrade=dist update_cache=yes dpkg_options='force-confold,force-confdef'
 
@@ -142,8 +168,12 @@ import warnings
 warnings.filterwarnings('ignore', "apt API not stable yet", FutureWarning)
 
 import os
+import re
+import sys
+import time
 import datetime
 import fnmatch
+import tempfile
 
 # APT related constants
 APT_ENV_VARS = dict(
@@ -157,11 +187,13 @@ APT_GET_ZERO = "0 upgraded, 0 newly installed"
 APTITUDE_ZERO = "0 packages upgraded, 0 newly installed"
 APT_LISTS_PATH = "/var/lib/apt/lists"
 APT_UPDATE_SUCCESS_STAMP_PATH = "/var/lib/apt/periodic/update-success-stamp"
+APT_SOURCES_STAMP_PATH = "/var/lib/apt/periodic/ansible-sources-stamp"
 
 HAS_PYTHON_APT = True
 try:
     import apt
     import apt.debfile
+    import apt.progress.base
     import apt_pkg
 except ImportError:
     HAS_PYTHON_APT = False
@@ -242,83 +274,226 @@ def expand_dpkg_options(dpkg_options_compressed):
                        % (dpkg_options, dpkg_option)
     return dpkg_options.strip()
 
-def expand_pkgspec_from_fnmatches(m, pkgspec, cache):
-    new_pkgspec = []
-    for pkgspec_pattern in pkgspec:
-        pkgname_pattern, version = package_split(pkgspec_pattern)
-
-        # note that none of these chars is allowed in a (debian) pkgname
-        if frozenset('*?[]!').intersection(pkgname_pattern):
-            # handle multiarch pkgnames, the idea is that "apt*" should
-            # only select native packages. But "apt*:i386" should still work
-            if not ":" in pkgname_pattern:
-                try:
-                    pkg_name_cache = _non_multiarch
-                except NameError:
-                    pkg_name_cache = _non_multiarch = [pkg.name for pkg in cache if not ':' in pkg.name]
+class PackageIndex(object):
+    """ Resolves package specs against the names of an apt.Cache, built once
+    for all specs of a task """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._all_names = None
+        self._native_names = None
+
+    def names(self, multiarch):
+        if self._all_names is None:
+            self._all_names = list(self.cache.keys())
+            self._native_names = [name for name in self._all_names if not ':' in name]
+        if multiarch:
+            return self._all_names
+        return self._native_names
+
+    def expand(self, m, pkgspec):
+        """ Replaces the fnmatch patterns in pkgspec by the matching package
+        names, scanning the names once for all patterns """
+        patterns = dict()
+        for pkgspec_pattern in pkgspec:
+            pkgname_pattern, version = package_split(pkgspec_pattern)
+            # note that none of these chars is allowed in a (debian) pkgname
+            if frozenset('*?[]!').intersection(pkgname_pattern):
+                patterns[pkgname_pattern] = []
+        if not patterns:
+            return pkgspec
+
+        # handle multiarch pkgnames, the idea is that "apt*" should
+        # only select native packages. But "apt*:i386" should still work
+        for multiarch in (False, True):
+            group = [(pattern, re.compile(fnmatch.translate(pattern)))
+                     for pattern in patterns if (':' in pattern) == multiarch]
+            if not group:
+                continue
+            anyof = re.compile('|'.join('(?:%s)' % regex.pattern for (pattern, regex) in group))
+            for name in self.names(multiarch):
+                if anyof.match(name):
+                    for (pattern, regex) in group:
+                        if regex.match(name):
+                            patterns[pattern].append(name)
+
+        new_pkgspec = []
+        for pkgspec_pattern in pkgspec:
+            pkgname_pattern, version = package_split(pkgspec_pattern)
+            if pkgname_pattern in patterns:
+                if len(patterns[pkgname_pattern]) == 0:
+                    m.fail_json(msg="No package(s) matching '%s' available" % str(pkgname_pattern))
+                new_pkgspec.extend(patterns[pkgname_pattern])
             else:
-                try:
-                    pkg_name_cache = _all_pkg_names
-                except NameError:
-                    pkg_name_cache = _all_pkg_names = [pkg.name for pkg in cache]
-            matches = fnmatch.filter(pkg_name_cache, pkgname_pattern)
+                # No wildcards in name
+                new_pkgspec.append(pkgspec_pattern)
+        return new_pkgspec
 
-            if len(matches) == 0:
-                m.fail_json(msg="No package(s) matching '%s' available" % str(pkgname_pattern))
-            else:
-                new_pkgspec.extend(matches)
-        else:
-            # No wildcards in name
-            new_pkgspec.append(pkgspec_pattern)
-    return new_pkgspec
+    def providers(self, pkgname):
+        """ Names of the packages providing the virtual package pkgname """
+        try:
+            ll_pkg = self.cache._cache[pkgname]
+        except KeyError:
+            return []
+        providers = []
+        for (name, provided_version, version) in ll_pkg.provides_list:
+            provider = version.parent_pkg
+            try:
+                provider_name = provider.get_fullname(True)
+            except AttributeError:
+                provider_name = provider.name
+            if provider_name not in providers:
+                providers.append(provider_name)
+        return providers
+
+def set_install_config(install_recommends, force, dpkg_options):
+    apt_pkg.config.set('APT::Install-Recommends', install_recommends and 'true' or 'false')
+    if force:
+        apt_pkg.config.set('APT::Get::AllowUnauthenticated', 'true')
+    apt_pkg.config.clear('DPkg::Options')
+    for dpkg_option in dpkg_options.split(','):
+        apt_pkg.config.set('DPkg::Options::', '--%s' % dpkg_option)
+
+def mark_version(m, pkg, version):
+    # the newest available version matching the (wildcard) version
+    matching = [v for v in pkg.versions if fnmatch.fnmatch(v.version, version)]
+    if not matching:
+        m.fail_json(msg="Version '%s' for '%s' was not found" % (version, pkg.name))
+    pkg.candidate = max(matching)
+
+def untrusted_packages(cache):
+    """ Packages to be installed from no trusted (signed) source. Unlike
+    apt-get, cache.commit() does not refuse them by itself """
+    untrusted = []
+    for pkg in cache.get_changes():
+        if pkg.marked_delete:
+            continue
+        if not [origin for origin in pkg.candidate.origins if origin.trusted]:
+            untrusted.append(pkg.name)
+    return untrusted
+
+def resolve_marks(m, cache, requested):
+    """ Fixes what the marks broke in a single run of the problem resolver """
+    if cache.broken_count == 0:
+        return
+    resolver = apt_pkg.ProblemResolver(cache._depcache)
+    for pkg in requested:
+        resolver.clear(pkg._pkg)
+        resolver.protect(pkg._pkg)
+        if pkg.marked_delete:
+            resolver.remove(pkg._pkg)
+    try:
+        resolver.resolve(True)
+    except SystemError, e:
+        broken = [pkg.name for pkg in cache if pkg.is_inst_broken]
+        m.fail_json(msg="Unable to resolve dependencies: %s" % e, broken=broken)
+
+def transaction_summary(cache):
+    """ The planned transaction, as marked on the cache """
+    summary = dict(install=[], upgrade=[], downgrade=[], reinstall=[], remove=[])
+    for pkg in cache.get_changes():
+        if pkg.marked_delete:
+            summary['remove'].append(pkg.name)
+        elif pkg.marked_install:
+            summary['install'].append(pkg.name)
+        elif pkg.marked_upgrade:
+            summary['upgrade'].append(pkg.name)
+        elif pkg.marked_downgrade:
+            summary['downgrade'].append(pkg.name)
+        elif pkg.marked_reinstall:
+            summary['reinstall'].append(pkg.name)
+    summary['download_size'] = cache.required_download
+    summary['disk_space'] = cache.required_space
+    return summary
+
+def commit(m, cache):
+    """ Applies the marked changes with one cache.commit(), the output of
+    dpkg and the maintainer scripts is collected instead of going to our
+    stdout.
+
+    Returns (error, output) """
+    for (k,v) in APT_ENV_VARS.iteritems():
+        os.environ[k] = v
+
+    output = tempfile.TemporaryFile()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = [os.dup(1), os.dup(2)]
+    os.dup2(output.fileno(), 1)
+    os.dup2(output.fileno(), 2)
+    try:
+        try:
+            cache.commit(apt.progress.base.AcquireProgress(), apt.progress.base.InstallProgress())
+            error = None
+        except (apt.cache.FetchFailedException, SystemError), e:
+            error = str(e)
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+    output.seek(0)
+    out = output.read()
+    output.close()
+    return error, out
 
 def install(m, pkgspec, cache, upgrade=False, default_release=None,
             install_recommends=True, force=False,
-            dpkg_options=expand_dpkg_options(DPKG_OPTIONS)):
-    pkg_list = []
-    packages = ""
-    pkgspec = expand_pkgspec_from_fnmatches(m, pkgspec, cache)
-    for package in pkgspec:
-        name, version = package_split(package)
-        installed, upgradable, has_files = package_status(m, name, version, cache, state='install')
-        if not installed or (upgrade and upgradable):
-            pkg_list.append("'%s'" % package)
-        if installed and upgradable and version:
-            # This happens when the package is installed, a newer version is
-            # available, and the version is a wildcard that matches both
-            #
-            # We do not apply the upgrade flag because we cannot specify both
-            # a version and state=latest.  (This behaviour mirrors how apt
-            # treats a version with wildcard in the package)
-            pkg_list.append("'%s'" % package)
-    packages = ' '.join(pkg_list)
-
-    if len(packages) != 0:
-        if force:
-            force_yes = '--force-yes'
-        else:
-            force_yes = ''
-
+            dpkg_options=DPKG_OPTIONS, index=None):
+    if index is None:
+        index = PackageIndex(cache)
+    set_install_config(install_recommends, force, dpkg_options)
+    pkgspec = index.expand(m, pkgspec)
+    requested = []
+    actiongroup = cache.actiongroup()
+    try:
+        for package in pkgspec:
+            name, version = package_split(package)
+            if name not in cache:
+                providers = index.providers(name)
+                if not providers:
+                    m.fail_json(msg="No package matching '%s' is available" % name)
+                if [p for p in providers if p in cache and cache[p].is_installed]:
+                    continue
+                if len(providers) > 1:
+                    m.fail_json(msg="Package '%s' is a virtual package provided by: %s, select one to install"
+                                % (name, ', '.join(providers)))
+                name = providers[0]
+            installed, upgradable, has_files = package_status(m, name, version, cache, state='install')
+            if not installed or (upgrade and upgradable) or (installed and upgradable and version):
+                # The last case happens when the package is installed, a
+                # newer version is available, and the version is a wildcard
+                # that matches both
+                #
+                # We do not apply the upgrade flag because we cannot specify
+                # both a version and state=latest.  (This behaviour mirrors
+                # how apt treats a version with wildcard in the package)
+                pkg = cache[name]
+                if version:
+                    mark_version(m, pkg, version)
+                pkg.mark_install(auto_fix=False, auto_inst=True, from_user=True)
+                requested.append(pkg)
+        resolve_marks(m, cache, requested)
+    finally:
+        actiongroup.release()
+
+    if cache.get_changes():
+        transaction = transaction_summary(cache)
         if m.check_mode:
-            check_arg = '--simulate'
-        else:
-            check_arg = ''
-
-        for (k,v) in APT_ENV_VARS.iteritems():
-            os.environ[k] = v
-
-        cmd = "%s -y %s %s %s install %s" % (APT_GET_CMD, dpkg_options, force_yes, check_arg, packages)
+            return (True, dict(changed=True, transaction=transaction))
 
-        if default_release:
-            cmd += " -t '%s'" % (default_release,)
-        if not install_recommends:
-            cmd += " --no-install-recommends"
+        untrusted = untrusted_packages(cache)
+        if untrusted and not force:
+            return (False, dict(msg="The following packages cannot be authenticated: %s; use force=yes to install them anyway"
+                                % ' '.join(untrusted), transaction=transaction))
 
-        rc, out, err = m.run_command(cmd)
-        if rc:
-            return (False, dict(msg="'apt-get install %s' failed: %s" % (packages, err), stdout=out, stderr=err))
+        error, out = commit(m, cache)
+        if error:
+            return (False, dict(msg="Installing %s failed: %s" % (' '.join(pkgspec), error), stdout=out, transaction=transaction))
         else:
-            return (True, dict(changed=True, stdout=out, stderr=err))
+            return (True, dict(changed=True, stdout=out, stderr='', transaction=transaction))
     else:
         return (True, dict(changed=False))
 
@@ -348,7 +523,7 @@ def install_deb(m, debs, cache, force, install_recommends, dpkg_options):
     if len(deps_to_install) > 0:
         (success, retvals) = install(m=m, pkgspec=deps_to_install, cache=cache,
                                      install_recommends=install_recommends,
-                                     dpkg_options=expand_dpkg_options(dpkg_options))
+                                     dpkg_options=dpkg_options)
         if not success:
             m.fail_json(**retvals)
         changed = retvals.get('changed', False)
@@ -379,36 +554,273 @@ def install_deb(m, debs, cache, force, install_recommends, dpkg_options):
         m.exit_json(changed=changed, stdout=retvals.get('stdout',''), stderr=retvals.get('stderr',''))
 
 def remove(m, pkgspec, cache, purge=False,
-           dpkg_options=expand_dpkg_options(DPKG_OPTIONS)):
-    pkg_list = []
-    pkgspec = expand_pkgspec_from_fnmatches(m, pkgspec, cache)
-    for package in pkgspec:
-        name, version = package_split(package)
-        installed, upgradable, has_files = package_status(m, name, version, cache, state='remove')
-        if installed or (has_files and purge):
-            pkg_list.append("'%s'" % package)
-    packages = ' '.join(pkg_list)
-
-    if len(packages) == 0:
+           dpkg_options=DPKG_OPTIONS, index=None):
+    if index is None:
+        index = PackageIndex(cache)
+    set_install_config(True, False, dpkg_options)
+    pkgspec = index.expand(m, pkgspec)
+    requested = []
+    actiongroup = cache.actiongroup()
+    try:
+        for package in pkgspec:
+            name, version = package_split(package)
+            installed, upgradable, has_files = package_status(m, name, version, cache, state='remove')
+            if installed or (has_files and purge):
+                pkg = cache[name]
+                pkg.mark_delete(auto_fix=False, purge=purge)
+                requested.append(pkg)
+        resolve_marks(m, cache, requested)
+    finally:
+        actiongroup.release()
+
+    if not cache.get_changes():
         m.exit_json(changed=False)
-    else:
-        if purge:
-            purge = '--purge'
-        else:
-            purge = ''
-
-        for (k,v) in APT_ENV_VARS.iteritems():
-            os.environ[k] = v
 
-        cmd = "%s -q -y %s %s remove %s" % (APT_GET_CMD, dpkg_options, purge, packages)
-
-        if m.check_mode:
-            m.exit_json(changed=True)
+    transaction = transaction_summary(cache)
+    if m.check_mode:
+        m.exit_json(changed=True, transaction=transaction)
+
+    error, out = commit(m, cache)
+    if error:
+        m.fail_json(msg="Removing %s failed: %s" % (' '.join(pkgspec), error), stdout=out, transaction=transaction)
+    m.exit_json(changed=True, stdout=out, stderr='', transaction=transaction)
+
+class Source(object):
+    """ A source as apt sees it: one uri and suite, with its index files """
+
+    def __init__(self, meta_index, lists_dir):
+        self.uri = meta_index.uri
+        self.dist = meta_index.dist
+        self.key = '%s %s' % (self.uri, self.dist)
+        if self.dist.endswith('/'):
+            # flat repository
+            self.base = self.uri + self.dist
+        else:
+            self.base = '%s/dists/%s/' % (self.uri.rstrip('/'), self.dist)
+        self.release_files = [os.path.join(lists_dir, apt_pkg.uri_to_filename(self.base + name))
+                              for name in ('InRelease', 'Release')]
+        self.index_files = meta_index.index_files
+
+    def release_file(self):
+        for path in self.release_files:
+            if os.path.exists(path):
+                return path
+        return None
+
+    def valid_until(self):
+        """ Valid-Until of the Release file, or None """
+        path = self.release_file()
+        if path is None:
+            return None
+        f = open(path)
+        try:
+            for line in f:
+                if line.startswith('Valid-Until:'):
+                    return apt_pkg.str_to_time(line.split(':', 1)[1].strip()) or None
+                if line.startswith(' '):
+                    # the checksums follow the header fields
+                    break
+        finally:
+            f.close()
+        return None
+
+    def is_stale(self, stamps, cache_valid_time, now):
+        if [f for f in self.index_files if not f.exists]:
+            # never fetched, e.g. just added
+            return True
+        valid_until = self.valid_until()
+        if valid_until and valid_until < now:
+            return True
+        if not cache_valid_time:
+            return False
+        last_update = stamps.get(self.key)
+        if last_update is None:
+            path = self.release_file()
+            if path is None:
+                return True
+            last_update = os.stat(path).st_mtime
+        return last_update + cache_valid_time < now
+
+class SourceTimingProgress(object):
+    """ Acquire progress collecting when each downloaded file started and
+    finished, and how. apt_pkg only looks up the callbacks by name, so this
+    does not need python-apt at import time """
+
+    def __init__(self):
+        self.files = dict()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def pulse(self, owner):
+        return True
+
+    def media_change(self, medium, drive):
+        return False
+
+    def _file(self, item):
+        return self.files.setdefault(item.uri, dict(start=time.time(), end=None, size=0, status='fetched'))
+
+    def fetch(self, item):
+        self._file(item)
+
+    def ims_hit(self, item):
+        record = self._file(item)
+        record.update(end=time.time(), status='hit')
+
+    def done(self, item):
+        record = self._file(item)
+        record.update(end=time.time(), size=item.owner.filesize)
+
+    def fail(self, item):
+        record = self._file(item)
+        if item.owner.status == item.owner.STAT_ERROR:
+            record.update(end=time.time(), status='failed')
+        else:
+            # optional file or one of several compressions tried, e.g. a
+            # missing InRelease or Packages.xz
+            record.update(end=time.time(), status='ignored')
+
+    def source_results(self, sources):
+        results = []
+        for source in sources:
+            files = [record for (uri, record) in self.files.items() if uri.startswith(source.base)]
+            result = dict(uri=source.uri, suite=source.dist, status='hit', elapsed=0.0, bytes=0)
+            if files:
+                start = min([record['start'] for record in files])
+                end = max([record['end'] or record['start'] for record in files])
+                result['elapsed'] = round(end - start, 3)
+                result['bytes'] = sum([record['size'] for record in files])
+                statuses = [record['status'] for record in files]
+                if 'failed' in statuses:
+                    result['status'] = 'failed'
+                elif 'fetched' in statuses:
+                    result['status'] = 'fetched'
+                elif 'hit' not in statuses:
+                    # nothing but transient errors
+                    result['status'] = 'failed'
+            results.append(result)
+        return results
+
+def get_sources():
+    lists_dir = apt_pkg.config.find_dir('Dir::State::Lists')
+    source_list = apt_pkg.SourceList()
+    source_list.read_main_list()
+    return [Source(meta_index, lists_dir) for meta_index in source_list.list]
+
+def source_lines(sources):
+    """ The one-line format sources.list entries of sources, or None if
+    some are only in deb822 .sources files """
+    files = [apt_pkg.config.find_file('Dir::Etc::sourcelist')]
+    parts = apt_pkg.config.find_dir('Dir::Etc::sourceparts')
+    if os.path.isdir(parts):
+        files.extend([os.path.join(parts, name) for name in sorted(os.listdir(parts)) if name.endswith('.list')])
+    wanted = dict([(source.key, []) for source in sources])
+    for path in files:
+        if not os.path.isfile(path):
+            continue
+        f = open(path)
+        try:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if not line.startswith('deb'):
+                    continue
+                # drop the [ options ], which may contain spaces
+                words = re.sub(r'\[[^\]]*\]', ' ', line).split()
+                if len(words) < 3:
+                    continue
+                uri = words[1].rstrip('/') + '/'
+                dist = words[2]
+                key = '%s %s' % (uri, dist)
+                if key in wanted:
+                    wanted[key].append(line)
+        finally:
+            f.close()
+    lines = []
+    for source in sources:
+        if not wanted[source.key]:
+            return None
+        lines.extend(wanted[source.key])
+    return lines
+
+def read_source_stamps():
+    try:
+        f = open(APT_SOURCES_STAMP_PATH)
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return dict()
+
+def write_source_stamps(stamps):
+    stamp_dir = os.path.dirname(APT_SOURCES_STAMP_PATH)
+    if not os.path.isdir(stamp_dir):
+        os.makedirs(stamp_dir)
+    fd, tmp = tempfile.mkstemp(dir=stamp_dir)
+    f = os.fdopen(fd, 'w')
+    try:
+        json.dump(stamps, f)
+    finally:
+        f.close()
+    os.rename(tmp, APT_SOURCES_STAMP_PATH)
+
+def update_sources(m, cache, stale_only, cache_valid_time, concurrency):
+    """ Refreshes all sources, or just the stale ones, in one acquire run
+    which fetches from several hosts at the same time.
+
+    Returns the per source results """
+    if concurrency:
+        if concurrency == 1:
+            apt_pkg.config.set('Acquire::Queue-Mode', 'access')
+        else:
+            apt_pkg.config.set('Acquire::Queue-Mode', 'host')
+            apt_pkg.config.set('Acquire::QueueHost::Limit', str(concurrency))
+
+    sources = get_sources()
+    stamps = read_source_stamps()
+    now = time.time()
+    sources_list = None
+    if stale_only:
+        sources = [source for source in sources if source.is_stale(stamps, cache_valid_time, now)]
+        if not sources:
+            return []
+        lines = source_lines(sources)
+        if lines is None:
+            # deb822 sources cannot be refreshed selectively, do them all
+            sources = get_sources()
+        else:
+            fd, sources_list = tempfile.mkstemp(suffix='.list')
+            f = os.fdopen(fd, 'w')
+            try:
+                f.write('\n'.join(lines) + '\n')
+            finally:
+                f.close()
 
-        rc, out, err = m.run_command(cmd)
-        if rc:
-            m.fail_json(msg="'apt-get remove %s' failed: %s" % (packages, err), stdout=out, stderr=err)
-        m.exit_json(changed=True, stdout=out, stderr=err)
+    progress = SourceTimingProgress()
+    try:
+        try:
+            if sources_list:
+                cache.update(progress, sources_list=sources_list)
+            else:
+                cache.update(progress)
+        except apt.cache.FetchFailedException, e:
+            results = progress.source_results(sources)
+            failed = ['%s %s' % (r['uri'], r['suite']) for r in results if r['status'] == 'failed']
+            m.fail_json(msg="Failed to update apt cache: %s" % (str(e) or ', '.join(failed)), sources=results)
+    finally:
+        if sources_list:
+            os.unlink(sources_list)
+
+    results = progress.source_results(sources)
+    for result in results:
+        if result['status'] != 'failed':
+            stamps['%s %s' % (result['uri'], result['suite'])] = now
+    write_source_stamps(stamps)
+    return results
 
 def upgrade(m, mode="yes", force=False, default_release=None,
             dpkg_options=expand_dpkg_options(DPKG_OPTIONS)):
@@ -465,6 +877,8 @@ def main():
             state = dict(default='present', choices=['installed', 'latest', 'removed', 'absent', 'present']),
             update_cache = dict(default=False, aliases=['update-cache'], type='bool'),
             cache_valid_time = dict(type='int'),
+            update_sources = dict(default='all', choices=['all', 'stale']),
+            update_concurrency = dict(default=None, type='int'),
             purge = dict(default=False, type='bool'),
             package = dict(default=None, aliases=['pkg', 'name'], type='list'),
             deb = dict(default=None),
@@ -484,6 +898,8 @@ def main():
             module.run_command('apt-get update && apt-get install python-apt -y -q', use_unsafe_shell=True, check_rc=True)
             global apt, apt_pkg
             import apt
+            import apt.debfile
+            import apt.progress.base
             import apt_pkg
         except ImportError:
             module.fail_json(msg="Could not import python modules: apt, apt_pkg. Please install python-apt package.")
@@ -516,10 +932,11 @@ def main():
             # reopen cache w/ modified config
             cache.open(progress=None)
 
+        sources = None
         if p['update_cache']:
             # Default is: always update the cache
             cache_valid = False
-            if p['cache_valid_time']:
+            if p['cache_valid_time'] and p['update_sources'] == 'all':
                 tdelta = datetime.timedelta(seconds=p['cache_valid_time'])
                 try:
                     mtime = os.stat(APT_UPDATE_SUCCESS_STAMP_PATH).st_mtime
@@ -543,11 +960,15 @@ def main():
                         # the old cache is less than cache_valid_time seconds old - so still valid
                         cache_valid = True
 
-            if cache_valid is not True:
-                cache.update()
+            if p['update_sources'] == 'stale':
+                sources = update_sources(module, cache, True, p['cache_valid_time'], p['update_concurrency'])
+                if sources:
+                    cache.open(progress=None)
+            elif cache_valid is not True:
+                sources = update_sources(module, cache, False, None, p['update_concurrency'])
                 cache.open(progress=None)
             if not p['package'] and not p['upgrade'] and not p['deb']:
-                module.exit_json(changed=False)
+                module.exit_json(changed=False, sources=sources)
 
         force_yes = p['force']
 
@@ -574,8 +995,10 @@ def main():
             result = install(module, packages, cache, upgrade=True,
                     default_release=p['default_release'],
                     install_recommends=install_recommends,
-                    force=force_yes, dpkg_options=dpkg_options)
+                    force=force_yes, dpkg_options=p['dpkg_options'])
             (success, retvals) = result
+            if sources is not None:
+                retvals['sources'] = sources
             if success:
                 module.exit_json(**retvals)
             else:
@@ -583,14 +1006,16 @@ def main():
         elif p['state'] ==  'present':
             result = install(module, packages, cache, default_release=p['default_release'],
                       install_recommends=install_recommends,force=force_yes,
-                      dpkg_options=dpkg_options)
+                      dpkg_options=p['dpkg_options'])
             (success, retvals) = result
+            if sources is not None:
+                retvals['sources'] = sources
             if success:
                 module.exit_json(**retvals)
             else:
                 module.fail_json(**retvals)
         elif p['state'] == 'absent':
-            remove(module, packages, cache, p['purge'], dpkg_options)
+            remove(module, packages, cache, p['purge'], p['dpkg_options'])
 
     except apt.cache.LockFailedException:
         module.fail_json(msg="Failed to lock apt for exclusive operation")
@@ -77,6 +77,16 @@ options:
         required: false
         default: 'yes'
         choices: ['yes', 'no']
+    keys:
+        required: false
+        default: none
+        version_added: "1.9"
+        description:
+            - A list of keys to manage in one run, each a dict with the same C(id), C(url), C(data), C(file),
+              C(keyserver) and C(state) fields as the single key options (C(keyring) and C(state) apply to all
+              of them). The keyring is listed once, the urls are downloaded through a cache in
+              C(/var/cache/ansible/apt_key) using conditional requests (only read in check mode), and only the missing keys are
+              imported, with one C(apt-key) call. The result has a C(changed) flag per key in I(results).
 
 '''
 
@@ -101,6 +111,15 @@ EXAMPLES = '''
 
 # Add an Apt signing key to a specific keyring file
 - apt_key: id=473041FA url=https://ftp-master.debian.org/keys/archive-key-6.0.asc keyring=/etc/apt/trusted.gpg.d/debian.gpg state=present
+
+# Make sure several keys are present, downloading only what is not imported yet
+- apt_key:
+    keys:
+      - id: 473041FA
+        url: https://ftp-master.debian.org/keys/archive-key-6.0.asc
+      - url: https://ftp-master.debian.org/keys/archive-key-7.0.asc
+      - id: 36A1D7869245C8950F966E92D8576A8BA88D21E9
+        keyserver: keyserver.ubuntu.com
 '''
 
 
@@ -111,12 +130,17 @@ from re import compile as re_compile
 from distutils.spawn import find_executable
 from os import environ
 from sys import exc_info
+import hashlib
+import os
+import tempfile
 import traceback
 
 match_key = re_compile("^gpg:.*key ([0-9a-fA-F]+):.*$")
 
 REQUIRED_EXECUTABLES=['gpg', 'grep', 'apt-key']
 
+KEY_CACHE_DIR = '/var/cache/ansible/apt_key'
+
 
 def check_missing_binaries(module):
     missing = [e for e in REQUIRED_EXECUTABLES if not find_executable(e)]
@@ -195,6 +219,245 @@ def remove_key(module, key_id, keyring):
     (rc, out, err) = module.run_command(cmd, check_rc=True)
     return True
 
+class KeyFetchError(Exception):
+    pass
+
+def keyring_fingerprints(module, keyring):
+    """ Fingerprints of all keys and subkeys in the keyring, from one listing """
+    if keyring:
+        cmd = "apt-key --keyring %s adv --list-public-keys --with-fingerprint --with-colons" % keyring
+    else:
+        cmd = "apt-key adv --list-public-keys --with-fingerprint --with-colons"
+    (rc, out, err) = module.run_command(cmd, check_rc=True)
+    return data_fingerprints(out)
+
+def data_fingerprints(colons):
+    fingerprints = []
+    for line in colons.splitlines():
+        fields = line.split(':')
+        if fields[0] == 'fpr' and len(fields) > 9 and fields[9]:
+            fingerprints.append(fields[9].upper())
+    return fingerprints
+
+def find_key(key_id, fingerprints):
+    """ The fingerprint matching key_id (a fingerprint or long or short key id), or None """
+    for fingerprint in fingerprints:
+        if fingerprint.endswith(key_id):
+            return fingerprint
+    return None
+
+def key_file_fingerprints(module, path):
+    """ Fingerprints of the keys in a key file, without importing them """
+    gpg = module.get_bin_path('gpg', True)
+    (rc, out, err) = module.run_command([gpg, '--batch', '--no-tty', '--with-colons', '--with-fingerprint', path])
+    if rc != 0:
+        raise KeyFetchError("%s does not contain a valid key: %s" % (path, err))
+    return data_fingerprints(out)
+
+def read_json(path):
+    try:
+        f = open(path)
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return {}
+
+def write_file(path, content):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    f = os.fdopen(fd, 'wb')
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    os.rename(tmp, path)
+
+def cache_meta_path(url):
+    return os.path.join(KEY_CACHE_DIR, '%s.json' % hashlib.sha256(url).hexdigest())
+
+def save_cache_meta(module, url, meta):
+    if not module.check_mode:
+        write_file(cache_meta_path(url), json.dumps(meta))
+
+def cached_download(module, url):
+    """ Downloads url through the key cache. The content is kept under its
+    sha256, and revalidated with If-None-Match/If-Modified-Since. In check
+    mode the cache is only read and new content goes to a temporary file.
+
+    Returns the path of the content, its metadata and whether the path is
+    a temporary file to remove """
+    meta = read_json(cache_meta_path(url))
+    headers = {}
+    if meta.get('sha256') and os.path.exists(os.path.join(KEY_CACHE_DIR, meta['sha256'])):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    else:
+        meta = {}
+
+    rsp, info = fetch_url(module, url, headers=headers)
+    if info['status'] == 304 and meta:
+        return os.path.join(KEY_CACHE_DIR, meta['sha256']), meta, False
+    if info['status'] != 200:
+        raise KeyFetchError("Failed to download key at %s: %s" % (url, info['msg']))
+    content = rsp.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if meta.get('sha256') != digest:
+        meta = dict(url=url, sha256=digest)
+    meta['etag'] = info.get('etag')
+    meta['last_modified'] = info.get('last-modified')
+
+    if module.check_mode:
+        fd, path = tempfile.mkstemp()
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        return path, meta, True
+
+    if not os.path.isdir(KEY_CACHE_DIR):
+        os.makedirs(KEY_CACHE_DIR, 0700)
+    path = os.path.join(KEY_CACHE_DIR, digest)
+    if not os.path.exists(path):
+        write_file(path, content)
+    save_cache_meta(module, url, meta)
+    return path, meta, False
+
+def normalize_key_id(module, key_id):
+    try:
+        _ = int(key_id, 16)
+        if key_id.startswith('0x'):
+            key_id = key_id[2:]
+        return key_id.upper()
+    except ValueError:
+        module.fail_json(msg="Invalid key_id", id=key_id)
+
+def manage_keys(module, keys, keyring):
+    """ Brings all keys to their state with at most one apt-key call for
+    the imports, one per keyserver and one for the removals """
+    items = []
+    for key in keys:
+        if not isinstance(key, dict):
+            key = dict(id=key)
+        item = dict(id=key.get('id'), url=key.get('url'), data=key.get('data'),
+                    file=key.get('file'), keyserver=key.get('keyserver'),
+                    state=key.get('state', module.params['state']))
+        if item['id']:
+            item['id'] = normalize_key_id(module, str(item['id']))
+        if item['state'] not in ('present', 'absent'):
+            module.fail_json(msg="invalid state %s" % item['state'], key=key)
+        if item['state'] == 'absent' and not item['id']:
+            module.fail_json(msg="key is required", key=key)
+        items.append(item)
+
+    fingerprints = keyring_fingerprints(module, keyring)
+    pending = [item for item in items if item['state'] == 'present'
+               and not (item['id'] and find_key(item['id'], fingerprints))]
+
+    # get the keys of the pending items which come from urls
+    downloads = []
+    for item in pending:
+        if item['url'] and not item['file'] and not item['data'] and not item['keyserver']:
+            if item['url'] not in downloads:
+                downloads.append(item['url'])
+
+    tmp_files = []
+    imports = []  # key files
+    recv = {}  # keyserver -> ids
+    try:
+        downloaded = {}
+        for url in downloads:
+            try:
+                path, meta, temporary = cached_download(module, url)
+            except KeyFetchError, e:
+                module.fail_json(msg=str(e))
+            if temporary:
+                tmp_files.append(path)
+            downloaded[url] = (path, meta)
+
+        for item in pending:
+            if item['keyserver']:
+                if not item['id']:
+                    module.fail_json(msg="a keyserver needs an id", keyserver=item['keyserver'])
+                recv.setdefault(item['keyserver'], []).append(item['id'])
+                continue
+            if item['file']:
+                path = item['file']
+                meta = None
+            elif item['data']:
+                fd, path = tempfile.mkstemp()
+                f = os.fdopen(fd, 'wb')
+                try:
+                    f.write(item['data'])
+                finally:
+                    f.close()
+                tmp_files.append(path)
+                meta = None
+            elif item['url']:
+                path, meta = downloaded[item['url']]
+            else:
+                module.fail_json(msg="needed a URL but was not specified", id=item['id'])
+
+            if meta is not None and 'fingerprints' in meta:
+                key_fingerprints = meta['fingerprints']
+            else:
+                try:
+                    key_fingerprints = key_file_fingerprints(module, path)
+                except KeyFetchError, e:
+                    module.fail_json(msg=str(e))
+                if meta is not None:
+                    meta['fingerprints'] = key_fingerprints
+                    save_cache_meta(module, item['url'], meta)
+            if item['id'] and not find_key(item['id'], key_fingerprints):
+                module.fail_json(msg="key %s is not in %s" % (item['id'], item['url'] or item['file'] or 'data'))
+            item['fingerprints'] = key_fingerprints
+            if [fp for fp in key_fingerprints if fp not in fingerprints] and path not in imports:
+                imports.append(path)
+
+        removals = []
+        for item in items:
+            if item['state'] == 'absent':
+                fingerprint = find_key(item['id'], fingerprints)
+                if fingerprint and fingerprint not in removals:
+                    removals.append(fingerprint)
+
+        if not module.check_mode:
+            if keyring:
+                apt_key = "apt-key --keyring %s" % keyring
+            else:
+                apt_key = "apt-key"
+            if imports:
+                module.run_command("%s adv --batch --import %s" % (apt_key, ' '.join(imports)), check_rc=True)
+            for (keyserver, ids) in recv.items():
+                module.run_command("%s adv --keyserver %s --recv %s" % (apt_key, keyserver, ' '.join(ids)), check_rc=True)
+            if removals:
+                module.run_command("%s adv --batch --yes --delete-keys %s" % (apt_key, ' '.join(removals)), check_rc=True)
+    finally:
+        for path in tmp_files:
+            os.remove(path)
+
+    if module.check_mode:
+        after = None
+    else:
+        after = keyring_fingerprints(module, keyring)
+    results = []
+    for item in items:
+        result = dict(id=item['id'], url=item['url'], state=item['state'])
+        if item['state'] == 'absent':
+            result['changed'] = bool(find_key(item['id'], fingerprints))
+        elif item in pending:
+            new = item.get('fingerprints') or [item['id']]
+            result['changed'] = bool([fp for fp in new if not find_key(fp, fingerprints)])
+            if after is not None and item['id'] and not find_key(item['id'], after):
+                module.fail_json(msg="key does not seem to have been added", id=item['id'], results=results)
+        else:
+            result['changed'] = False
+        results.append(result)
+    return results
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -206,8 +469,10 @@ def main():
             keyring=dict(required=False),
             validate_certs=dict(default='yes', type='bool'),
             keyserver=dict(required=False),
-            state=dict(required=False, choices=['present', 'absent'], default='present')
+            state=dict(required=False, choices=['present', 'absent'], default='present'),
+            keys=dict(required=False, type='list'),
         ),
+        mutually_exclusive=[['keys', 'id'], ['keys', 'url'], ['keys', 'data'], ['keys', 'file'], ['keys', 'keyserver']],
         supports_check_mode=True
     )
 
@@ -232,6 +497,10 @@ def main():
     # FIXME: I think we have a common facility for this, if not, want
     check_missing_binaries(module)
 
+    if module.params['keys'] is not None:
+        results = manage_keys(module, module.params['keys'], keyring)
+        module.exit_json(changed=True in [result['changed'] for result in results], results=results)
+
     short_format = (key_id is not None and len(key_id) == 8)
     keys = all_keys(module, keyring, short_format)
     return_values = {}
@@ -33,10 +33,20 @@ notes:
     - This module treats Debian and Ubuntu distributions separately. So PPA could be installed only on Ubuntu machines.
 options:
     repo:
-        required: true
+        required: false
         default: none
         description:
-            - A source string for the repository.
+            - A source string for the repository. B(One of repo and repos is required.)
+    repos:
+        required: false
+        default: none
+        version_added: "1.9"
+        description:
+            - A list of source strings, or of dicts with C(repo) and optionally C(state), to manage in one
+              run. The sources are parsed once, the Launchpad information of every PPA is fetched
+              once, all missing PPA signing keys are imported with one C(apt-key) call, the
+              changed files are saved once and the cache is updated at most once. The result has a
+              C(changed) flag per repository in I(results).
     state:
         required: false
         choices: [ "absent", "present" ]
@@ -81,6 +91,14 @@ apt_repository: repo='deb http://archive.canonical.com/ubuntu hardy partner' sta
 # On Ubuntu target: add nginx stable repository from PPA and install its signing key.
 # On Debian target: adding PPA is not available, so it will fail immediately.
 apt_repository: repo='ppa:nginx/stable'
+
+# Add several repositories with a single cache update.
+apt_repository:
+  repos:
+    - 'ppa:nginx/stable'
+    - 'deb http://archive.canonical.com/ubuntu hardy partner'
+    - repo: 'deb http://example.com/ubuntu hardy main'
+      state: absent
 '''
 
 import glob
@@ -126,6 +144,7 @@ class InvalidSource(Exception):
 class SourcesList(object):
     def __init__(self):
         self.files = {}  # group sources by file
+        self.loaded = {}  # sources as read from each file
         self.default_file = self._apt_cfg_file('Dir::Etc::sourcelist')
 
         # read sources.list if it exists
@@ -231,9 +250,13 @@ class SourcesList(object):
             valid, enabled, source, comment = self._parse(line)
             group.append((n, valid, enabled, source, comment))
         self.files[file] = group
+        self.loaded[file] = list(group)
 
     def save(self, module):
         for filename, sources in self.files.items():
+            if sources == self.loaded.get(filename):
+                # unchanged, leave the file alone
+                continue
             if sources:
                 d, fn = os.path.split(filename)
                 fd, tmp_path = tempfile.mkstemp(prefix=".%s-" % fn, dir=d)
@@ -259,8 +282,10 @@ class SourcesList(object):
                     except IOError, err:
                         module.fail_json(msg="Failed to write to file %s: %s" % (tmp_path, unicode(err)))
                 module.atomic_move(tmp_path, filename)
+                self.loaded[filename] = list(sources)
             else:
                 del self.files[filename]
+                self.loaded.pop(filename, None)
                 if os.path.exists(filename):
                     os.remove(filename)
 
@@ -321,16 +346,27 @@ class UbuntuSourcesList(SourcesList):
     def __init__(self, module, add_ppa_signing_keys_callback=None):
         self.module = module
         self.add_ppa_signing_keys_callback = add_ppa_signing_keys_callback
+        self.ppa_info = {}  # (owner, name) -> Launchpad information
+        self.ppa_keys_checked = set()
         super(UbuntuSourcesList, self).__init__()
 
-    def _get_ppa_info(self, owner_name, ppa_name):
+    def _fetch_ppa_info(self, ppa):
+        (owner_name, ppa_name) = ppa
         lp_api = self.LP_API % (owner_name, ppa_name)
 
         headers = dict(Accept='application/json')
         response, info = fetch_url(self.module, lp_api, headers=headers)
         if info['status'] != 200:
-            self.module.fail_json(msg="failed to fetch PPA information, error was: %s" % info['msg'])
-        return json.load(response)
+            raise InvalidSource("failed to fetch PPA information, error was: %s" % info['msg'])
+        self.ppa_info[ppa] = json.load(response)
+
+    def _get_ppa_info(self, owner_name, ppa_name):
+        if (owner_name, ppa_name) not in self.ppa_info:
+            try:
+                self._fetch_ppa_info((owner_name, ppa_name))
+            except InvalidSource, err:
+                self.module.fail_json(msg=unicode(err))
+        return self.ppa_info[(owner_name, ppa_name)]
 
     def _expand_ppa(self, path):
         ppa = path.split(':')[1]
@@ -343,19 +379,52 @@ class UbuntuSourcesList(SourcesList):
         line = 'deb http://ppa.launchpad.net/%s/%s/ubuntu %s main' % (ppa_owner, ppa_name, distro.codename)
         return line, ppa_owner, ppa_name
 
-    def _key_already_exists(self, key_fingerprint):
-        rc, out, err = self.module.run_command('apt-key export %s' % key_fingerprint, check_rc=True)
-        return len(err) == 0
+    def _key_fingerprints(self):
+        '''Fingerprints of all keys in apt's keyrings, from one apt-key call'''
+        rc, out, err = self.module.run_command(['apt-key', 'adv', '--list-public-keys', '--with-fingerprint', '--with-colons'], check_rc=True)
+        fingerprints = set()
+        for line in out.splitlines():
+            fields = line.split(':')
+            if fields[0] == 'fpr' and len(fields) > 9:
+                fingerprints.add(fields[9].upper())
+        return fingerprints
+
+    def add_ppa_signing_keys(self, lines):
+        '''
+        Makes sure the signing keys of the PPAs in lines are present, looking
+        every PPA up on Launchpad once and importing all missing keys with
+        one apt-key call.
+        '''
+        if self.add_ppa_signing_keys_callback is None:
+            return
+        ppas = []
+        for line in lines:
+            if line.startswith('ppa:') and line not in self.ppa_keys_checked:
+                ppa = self._expand_ppa(line)[1:]
+                if ppa not in ppas:
+                    ppas.append(ppa)
+                self.ppa_keys_checked.add(line)
+        if not ppas:
+            return
+
+        for ppa in ppas:
+            self._get_ppa_info(*ppa)
+
+        existing = self._key_fingerprints()
+        missing = []
+        for ppa in ppas:
+            fingerprint = self.ppa_info[ppa]['signing_key_fingerprint']
+            if fingerprint.upper() not in existing and fingerprint not in missing:
+                missing.append(fingerprint)
+        if missing:
+            command = ['apt-key', 'adv', '--recv-keys', '--keyserver', 'hkp://keyserver.ubuntu.com:80'] + missing
+            self.add_ppa_signing_keys_callback(command)
 
     def add_source(self, line, comment='', file=None):
         if line.startswith('ppa:'):
             source, ppa_owner, ppa_name = self._expand_ppa(line)
 
-            if self.add_ppa_signing_keys_callback is not None:
-                info = self._get_ppa_info(ppa_owner, ppa_name)
-                if not self._key_already_exists(info['signing_key_fingerprint']):
-                    command = ['apt-key', 'adv', '--recv-keys', '--keyserver', 'hkp://keyserver.ubuntu.com:80', info['signing_key_fingerprint']]
-                    self.add_ppa_signing_keys_callback(command)
+            self.add_ppa_signing_keys([line])
 
             file = file or self._suggest_filename('%s_%s' % (line, distro.codename))
         else:
@@ -371,6 +440,39 @@ class UbuntuSourcesList(SourcesList):
         self._remove_valid_source(source)
 
 
+def manage_repos(module, sourceslist, repos):
+    """ Applies all repos to sourceslist in memory.
+
+    Returns the per repository results """
+    items = []
+    for item in repos:
+        if isinstance(item, dict):
+            if 'repo' not in item:
+                module.fail_json(msg="repos entries need a repo: %s" % item)
+            items.append((item['repo'], item.get('state', module.params['state'])))
+        else:
+            items.append((item, module.params['state']))
+    for (repo, state) in items:
+        if state not in ('present', 'absent'):
+            module.fail_json(msg="invalid state %s for %s" % (state, repo))
+
+    if isinstance(sourceslist, UbuntuSourcesList):
+        sourceslist.add_ppa_signing_keys([repo for (repo, state) in items if state == 'present'])
+
+    results = []
+    for (repo, state) in items:
+        sources_before = sourceslist.dump()
+        try:
+            if state == 'present':
+                sourceslist.add_source(repo)
+            else:
+                sourceslist.remove_source(repo)
+        except InvalidSource, err:
+            module.fail_json(msg='Invalid repository string: %s' % unicode(err), results=results)
+        results.append(dict(repo=repo, state=state, changed=sources_before != sourceslist.dump()))
+    return results
+
+
 def get_add_ppa_signing_key_callback(module):
     def _run_command(command):
         module.run_command(command, check_rc=True)
@@ -384,7 +486,8 @@ def get_add_ppa_signing_key_callback(module):
 def main():
     module = AnsibleModule(
         argument_spec=dict(
-            repo=dict(required=True),
+            repo=dict(required=False),
+            repos=dict(required=False, type='list'),
             state=dict(choices=['present', 'absent'], default='present'),
             mode=dict(required=False, default=0644),
             update_cache = dict(aliases=['update-cache'], type='bool', default='yes'),
@@ -392,6 +495,8 @@ def main():
             install_python_apt=dict(required=False, default="yes", type='bool'),
             validate_certs = dict(default='yes', type='bool'),
         ),
+        required_one_of=[['repo', 'repos']],
+        mutually_exclusive=[['repo', 'repos']],
         supports_check_mode=True,
     )
 
@@ -417,13 +522,17 @@ def main():
 
     sources_before = sourceslist.dump()
 
-    try:
-        if state == 'present':
-            sourceslist.add_source(repo)
-        elif state == 'absent':
-            sourceslist.remove_source(repo)
-    except InvalidSource, err:
-        module.fail_json(msg='Invalid repository string: %s' % unicode(err))
+    results = None
+    if module.params['repos'] is not None:
+        results = manage_repos(module, sourceslist, module.params['repos'])
+    else:
+        try:
+            if state == 'present':
+                sourceslist.add_source(repo)
+            elif state == 'absent':
+                sourceslist.remove_source(repo)
+        except InvalidSource, err:
+            module.fail_json(msg='Invalid repository string: %s' % unicode(err))
 
     sources_after = sourceslist.dump()
     changed = sources_before != sources_after
@@ -437,6 +546,8 @@ def main():
         except OSError, err:
             module.fail_json(msg=unicode(err))
 
+    if results is not None:
+        module.exit_json(changed=changed, results=results, state=state)
     module.exit_json(changed=changed, repo=repo, state=state)
 
 # import module snippets
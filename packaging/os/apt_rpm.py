@@ -72,20 +72,17 @@ import sys
 APT_PATH="/usr/bin/apt-get"
 RPM_PATH="/usr/bin/rpm"
 
-def query_package(module, name):
-    # rpm -q returns 0 if the package is installed,
-    # 1 if it is not installed
-    rc = os.system("%s -q %s" % (RPM_PATH,name))
+def query_packages(module, names):
+    # a single rpm -q over all names; rpm reports every package that
+    # is not installed (in English, see main) and exits with their count
+    rc, out, err = module.run_command([RPM_PATH, '-q', '--queryformat', '%{NAME}\n'] + names)
     if rc == 0:
-        return True
-    else:
-        return False
-
-def query_package_provides(module, name):
-    # rpm -q returns 0 if the package is installed,
-    # 1 if it is not installed
-    rc = os.system("%s -q --provides %s >/dev/null" % (RPM_PATH,name))
-    return rc == 0
+        return list(names)
+    missing = set()
+    for line in out.splitlines():
+        if line.startswith('package ') and line.endswith(' is not installed'):
+            missing.add(line[len('package '):-len(' is not installed')])
+    return [name for name in names if name not in missing]
 
 def update_package_db(module):
     rc = os.system("%s update" % APT_PATH)
@@ -94,50 +91,42 @@ def update_package_db(module):
         module.fail_json(msg="could not update package db")
 
 def remove_packages(module, packages):
-    
-    remove_c = 0
-    # Using a for loop incase of error, we can report the package that failed
-    for package in packages:
-        # Query the package first, to see if we even need to remove
-        if not query_package(module, package):
-            continue
 
-        rc = os.system("%s -y remove %s > /dev/null" % (APT_PATH,package))
+    # Query all packages first, to see if we even need to remove
+    packages = query_packages(module, packages)
+    if not packages:
+        module.exit_json(changed=False, msg="package(s) already absent")
+    if module.check_mode:
+        module.exit_json(changed=True, msg="would remove %s package(s)" % len(packages), packages=packages)
 
-        if rc != 0:
-            module.fail_json(msg="failed to remove %s" % (package))
-    
-        remove_c += 1
+    rc, out, err = module.run_command([APT_PATH, '-y', 'remove'] + packages)
 
-    if remove_c > 0:
-        module.exit_json(changed=True, msg="removed %s package(s)" % remove_c)
+    remaining = query_packages(module, packages)
+    if rc != 0 or remaining:
+        module.fail_json(msg="failed to remove %s" % " ".join(remaining or packages), stdout=out, stderr=err)
 
-    module.exit_json(changed=False, msg="package(s) already absent")
+    module.exit_json(changed=True, msg="removed %s package(s)" % len(packages), packages=packages)
 
 
 def install_packages(module, pkgspec):
 
-    packages = ""
-    for package in pkgspec:
-        if not query_package_provides(module, package):
-            packages += "'%s' " % package
-
-    if len(packages) != 0:
+    installed = query_packages(module, pkgspec)
+    packages = [package for package in pkgspec if package not in installed]
 
-        cmd = ("%s -y install %s > /dev/null" % (APT_PATH, packages))
+    if packages:
+        if module.check_mode:
+            module.exit_json(changed=True, msg="%s would be installed" % " ".join(packages), packages=packages)
 
-        rc, out, err = module.run_command(cmd)
+        rc, out, err = module.run_command([APT_PATH, '-y', 'install'] + packages)
 
-        installed = True
-        for packages in pkgspec:
-            if not query_package_provides(module, package):
-                installed = False
+        installed = query_packages(module, packages)
+        missing = [package for package in packages if package not in installed]
 
         # apt-rpm always have 0 for exit code if --force is used
-        if rc or not installed:
-            module.fail_json(msg="'apt-get -y install %s' failed: %s" % (packages, err))
+        if rc or missing:
+            module.fail_json(msg="'apt-get -y install %s' failed: %s" % (" ".join(packages), err), missing=missing)
         else:
-            module.exit_json(changed=True, msg="%s present(s)" % packages)
+            module.exit_json(changed=True, msg="%s present(s)" % " ".join(packages), packages=packages)
     else:
         module.exit_json(changed=False)
 
@@ -147,15 +136,20 @@ def main():
             argument_spec    = dict(
                 state        = dict(default='installed', choices=['installed', 'removed', 'absent', 'present']),
                 update_cache = dict(default=False, aliases=['update-cache'], type='bool'),
-                package      = dict(aliases=['pkg', 'name'], required=True)))
+                package      = dict(aliases=['pkg', 'name'], required=True)),
+            supports_check_mode = True)
                 
 
     if not os.path.exists(APT_PATH) or not os.path.exists(RPM_PATH):
         module.fail_json(msg="cannot find /usr/bin/apt-get and/or /usr/bin/rpm")
 
+    # query_packages() parses the messages of rpm
+    os.environ['LANG'] = 'C'
+    os.environ['LC_ALL'] = 'C'
+
     p = module.params
 
-    if p['update_cache']:
+    if p['update_cache'] and not module.check_mode:
         update_package_db(module)
 
     packages = p['package'].split(',')
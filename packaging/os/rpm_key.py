@@ -29,11 +29,21 @@ description:
 version_added: "1.3"
 options:
     key:
-      required: true
+      required: false
       default: null
       aliases: []
       description:
           - Key that will be modified. Can be a url, a file, or a keyid if the key already exists in the database.
+            B(One of key and keys is required.)
+    keys:
+      required: false
+      default: null
+      version_added: "1.9"
+      description:
+          - A list of keys (as for C(key)), or of dicts with C(key) and optionally C(state), to manage in one
+            run. The rpm database is queried once, the urls are downloaded through a cache in
+            C(/var/cache/ansible/rpm_key) using conditional requests (only read in check mode), and only the missing keys are imported,
+            with one C(rpm --import). The result has a C(changed) flag per key in I(results).
     state:
       required: false
       default: "present"
@@ -59,17 +69,108 @@ EXAMPLES = '''
 
 # Example action to ensure a key is not present in the db
 - rpm_key: state=absent key=DEADB33F
+
+# Example action to import several keys, downloading only what changed
+- rpm_key:
+    keys:
+      - http://apt.sw.be/RPM-GPG-KEY.dag.txt
+      - /path/to/key.gpg
+      - key: DEADB33F
+        state: absent
 '''
 import syslog
 import os.path
 import re
 import tempfile
 
+try:
+    import hashlib
+    HAS_HASHLIB=True
+except ImportError:
+    HAS_HASHLIB=False
+
+KEY_CACHE_DIR = '/var/cache/ansible/rpm_key'
+
 def is_pubkey(string):
     """Verifies if string is a pubkey"""
     pgp_regex = ".*?(-----BEGIN PGP PUBLIC KEY BLOCK-----.*?-----END PGP PUBLIC KEY BLOCK-----).*"
     return re.match(pgp_regex, string, re.DOTALL)
 
+class KeyFetchError(Exception):
+    pass
+
+def read_json(path):
+    try:
+        f = open(path)
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return {}
+
+def write_file(path, content):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    f = os.fdopen(fd, 'wb')
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    os.rename(tmp, path)
+
+def cache_meta_path(url):
+    return os.path.join(KEY_CACHE_DIR, '%s.json' % hashlib.sha256(url).hexdigest())
+
+def save_cache_meta(module, url, meta):
+    if not module.check_mode:
+        write_file(cache_meta_path(url), json.dumps(meta))
+
+def cached_download(module, url):
+    """ Downloads url through the key cache. The content is kept under its
+    sha256, and revalidated with If-None-Match/If-Modified-Since. In check
+    mode the cache is only read and new content goes to a temporary file.
+
+    Returns the path of the content, its metadata and whether the path is
+    a temporary file to remove """
+    meta = read_json(cache_meta_path(url))
+    headers = {}
+    if meta.get('sha256') and os.path.exists(os.path.join(KEY_CACHE_DIR, meta['sha256'])):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    else:
+        meta = {}
+
+    rsp, info = fetch_url(module, url, headers=headers)
+    if info['status'] == 304 and meta:
+        return os.path.join(KEY_CACHE_DIR, meta['sha256']), meta, False
+    if info['status'] != 200:
+        raise KeyFetchError("Failed to download key at %s: %s" % (url, info['msg']))
+    content = rsp.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if meta.get('sha256') != digest:
+        meta = dict(url=url, sha256=digest)
+    meta['etag'] = info.get('etag')
+    meta['last_modified'] = info.get('last-modified')
+
+    if module.check_mode:
+        fd, path = tempfile.mkstemp()
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        return path, meta, True
+
+    if not os.path.isdir(KEY_CACHE_DIR):
+        os.makedirs(KEY_CACHE_DIR, 0700)
+    path = os.path.join(KEY_CACHE_DIR, digest)
+    if not os.path.exists(path):
+        write_file(path, content)
+    save_cache_meta(module, url, meta)
+    return path, meta, False
+
 class RpmKey:
 
     def __init__(self, module):
@@ -83,6 +184,12 @@ class RpmKey:
         state = module.params['state']
         key = module.params['key']
 
+        if module.params['keys'] is not None:
+            if not HAS_HASHLIB:
+                module.fail_json(msg="The keys parameter requires hashlib, which is available in Python 2.5 and higher")
+            results = self.manage_keys(module.params['keys'])
+            module.exit_json(changed=True in [result['changed'] for result in results], results=results)
+
         if '://' in key:
             keyfile = self.fetch_key(key)
             keyid = self.getkeyid(keyfile)
@@ -163,7 +270,9 @@ class RpmKey:
             self.module.fail_json(msg=stderr)
         return stdout, stderr
 
-    def is_key_imported(self, keyid):
+    def imported_keyids(self):
+        """Ids of all keys in the rpm db, from one query"""
+        keyids = set()
         stdout, stderr = self.execute_command([self.rpm, '-qa', 'gpg-pubkey'])
         for line in stdout.splitlines():
             line = line.strip()
@@ -173,9 +282,93 @@ class RpmKey:
             if not match:
                 self.module.fail_json(msg="rpm returned unexpected output [%s]" % line)
             else:
-                if keyid == match.group(1):
-                    return True
-        return False
+                keyids.add(match.group(1))
+        return keyids
+
+    def is_key_imported(self, keyid):
+        return keyid in self.imported_keyids()
+
+    def manage_keys(self, keys):
+        """Brings all keys to their state with at most one rpm --import and
+        one rpm --erase.
+
+        Returns the per key results"""
+        items = []
+        for key in keys:
+            if isinstance(key, dict):
+                if 'key' not in key:
+                    self.module.fail_json(msg="keys entries need a key: %s" % key)
+                items.append(dict(key=key['key'], state=key.get('state', self.module.params['state'])))
+            else:
+                items.append(dict(key=key, state=self.module.params['state']))
+        for item in items:
+            if item['state'] not in ('present', 'absent'):
+                self.module.fail_json(msg="invalid state %s for %s" % (item['state'], item['key']))
+
+        urls = []
+        for item in items:
+            if '://' in item['key'] and item['key'] not in urls:
+                urls.append(item['key'])
+        tmp_files = []
+        try:
+            return self._manage_keys(items, urls, tmp_files)
+        finally:
+            for path in tmp_files:
+                os.remove(path)
+
+    def _manage_keys(self, items, urls, tmp_files):
+        downloaded = {}
+        for url in urls:
+            try:
+                path, meta, temporary = cached_download(self.module, url)
+            except (KeyFetchError, urllib2.URLError), e:
+                self.module.fail_json(msg=str(e))
+            if temporary:
+                tmp_files.append(path)
+            if not is_pubkey(open(path).read()):
+                self.module.fail_json(msg="Not a public key: %s" % url)
+            downloaded[url] = (path, meta)
+
+        imported = self.imported_keyids()
+        imports = []
+        drops = []
+        results = []
+        for item in items:
+            key = item['key']
+            keyfile = None
+            if '://' in key:
+                keyfile, meta = downloaded[key]
+                if 'keyid' not in meta:
+                    meta['keyid'] = self.getkeyid(keyfile)
+                    save_cache_meta(self.module, key, meta)
+                keyid = meta['keyid']
+            elif self.is_keyid(key):
+                keyid = key
+            elif os.path.isfile(key):
+                keyfile = key
+                keyid = self.getkeyid(keyfile)
+            else:
+                self.module.fail_json(msg="Not a valid key %s" % key, results=results)
+            keyid = self.normalize_keyid(keyid)
+
+            if item['state'] == 'present':
+                changed = keyid not in imported and keyid not in [k for (k, f) in imports]
+                if changed:
+                    if not keyfile:
+                        self.module.fail_json(msg="When importing a key, a valid file must be given", key=key, results=results)
+                    imports.append((keyid, keyfile))
+            else:
+                changed = keyid in imported and keyid not in drops
+                if changed:
+                    drops.append(keyid)
+            results.append(dict(key=key, keyid=keyid, state=item['state'], changed=changed))
+
+        if not self.module.check_mode:
+            if imports:
+                self.execute_command([self.rpm, '--import'] + [keyfile for (keyid, keyfile) in imports])
+            if drops:
+                self.execute_command([self.rpm, '--erase', '--allmatches'] + ["gpg-pubkey-%s" % keyid for keyid in drops])
+        return results
 
     def import_key(self, keyfile, dryrun=False):
         if not dryrun:
@@ -190,9 +383,12 @@ def main():
     module = AnsibleModule(
             argument_spec = dict(
                 state=dict(default='present', choices=['present', 'absent'], type='str'),
-                key=dict(required=True, type='str'),
+                key=dict(required=False, type='str'),
+                keys=dict(required=False, type='list'),
                 validate_certs=dict(default='yes', type='bool'),
                 ),
+            required_one_of=[['key', 'keys']],
+            mutually_exclusive=[['key', 'keys']],
             supports_check_mode=True
             )
 
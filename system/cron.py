@@ -44,9 +44,28 @@ version_added: "0.9"
 options:
   name:
     description:
-      - Description of a crontab entry.
+      - Description of a crontab entry. B(One of name and jobs is required.)
     default: null
-    required: true
+    required: false
+  jobs:
+    description:
+      - List of crontab entries to manage in one run, each a dict with C(name)
+        and any of C(job), C(state), C(minute), C(hour), C(day), C(month),
+        C(weekday), C(reboot) and C(special_time), which default to the values
+        given to the module itself. Any other key is an error. The crontab is
+        read once, all entries are added, updated or removed in one pass and
+        the crontab is written at most once.
+    version_added: "1.9"
+    required: false
+    default: null
+  exclusive:
+    description:
+      - With I(jobs), also remove every entry marked C("#Ansible: <name>")
+        whose name is not in the list.
+    version_added: "1.9"
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
   user:
     description:
       - The specific user whose crontab should be modified.
@@ -140,6 +159,15 @@ EXAMPLES = '''
 
 # Removes a cron file from under /etc/cron.d
 - cron: cron_file=ansible_yum-autoupdate state=absent
+
+# Manages several entries of the crontab of user 'backup' at once, and
+# removes any other entry an earlier play has added there
+- cron: user=backup exclusive=yes
+  args:
+    jobs:
+      - { name: "nightly dump", hour: 2, minute: 0, job: "/usr/local/bin/dump.sh" }
+      - { name: "weekly prune", special_time: weekly, job: "/usr/local/bin/prune.sh" }
+      - { name: "old sync", state: absent }
 '''
 
 import os
@@ -150,6 +178,11 @@ import pipes
 
 CRONCMD = "/usr/bin/crontab"
 
+# options an item of jobs may set, and the aliases they accept
+JOB_OPTIONS = ['name', 'job', 'state', 'minute', 'hour', 'day', 'month', 'weekday',
+               'reboot', 'special_time']
+JOB_ALIASES = dict(dom='day', dow='weekday')
+
 class CronTabError(Exception):
     pass
 
@@ -276,6 +309,54 @@ class CronTab(object):
         except:
             raise CronTabError("Unexpected error:", sys.exc_info()[0])
 
+    def apply_jobs(self, jobs, exclusive=False):
+        """
+        Add, update and remove many jobs in one pass over the crontab.
+
+        jobs is a list of (name, job) pairs, job being None for jobs to
+        remove. With exclusive, jobs with an Ansible comment that are not
+        in the list are removed as well. Returns the names of the jobs
+        that changed.
+        """
+        wanted = dict(jobs)
+        newlines = []
+        changed = []
+        seen = {}
+        lines = self.lines
+        i = 0
+        while i < len(lines):
+            l = lines[i]
+            if l.startswith(self.ansible) and i + 1 < len(lines):
+                name = l[len(self.ansible):]
+                if name in wanted:
+                    seen[name] = True
+                    if wanted[name] is None:
+                        changed.append(name)
+                    else:
+                        newlines.append(l)
+                        newlines.append(wanted[name])
+                        if lines[i + 1] != wanted[name]:
+                            changed.append(name)
+                elif exclusive:
+                    changed.append(name)
+                else:
+                    newlines.append(l)
+                    newlines.append(lines[i + 1])
+                i += 2
+                continue
+            newlines.append(l)
+            i += 1
+
+        for (name, job) in jobs:
+            if job is not None and name not in seen:
+                seen[name] = True
+                newlines.append("%s%s" % (self.ansible, name))
+                newlines.append(job)
+                changed.append(name)
+
+        self.lines = newlines
+        return changed
+
     def find_job(self, name):
         comment = None
         for l in self.lines:
@@ -378,6 +459,83 @@ class CronTab(object):
 
 #==================================================
 
+def check_job(module, name, job, do_install, minute, hour, day, month, weekday, reboot, special_time):
+    """
+    Validate the options of one job, returns the special time to use.
+    """
+    if (special_time or reboot) and \
+       (True in [(x != '*') for x in [minute, hour, day, month, weekday]]):
+        module.fail_json(msg="You must specify time and date fields or special time.")
+
+    if reboot and special_time:
+        module.fail_json(msg="reboot and special_time are mutually exclusive")
+
+    if name is None and do_install:
+        module.fail_json(msg="You must specify 'name' to install a new cron job")
+
+    if job is None and do_install:
+        module.fail_json(msg="You must specify 'job' to install a new cron job")
+
+    if job and name is None and not do_install:
+        module.fail_json(msg="You must specify 'name' to remove a cron job")
+
+    if reboot:
+        special_time = "reboot"
+
+    return special_time
+
+def manage_jobs(module, crontab):
+    jobs = []
+    for item in module.params['jobs']:
+        if not isinstance(item, dict):
+            module.fail_json(msg="every item of jobs must be a dict with at least a name")
+        params = dict(module.params)
+        for (key, value) in item.items():
+            key = JOB_ALIASES.get(key, key)
+            if key not in JOB_OPTIONS:
+                module.fail_json(msg="unsupported option %s for job %s" % (key, item.get('name')))
+            params[key] = value
+        if params['state'] not in ('present', 'absent'):
+            module.fail_json(msg="state of job %s must be present or absent" % params['name'])
+        for key in ('minute', 'hour', 'day', 'month', 'weekday'):
+            params[key] = str(params[key])
+        reboot = module.boolean(params['reboot'])
+        do_install = params['state'] == 'present'
+        special_time = check_job(module, params['name'], params['job'], do_install,
+                                 params['minute'], params['hour'], params['day'], params['month'],
+                                 params['weekday'], reboot, params['special_time'])
+        if params['name'] is None:
+            module.fail_json(msg="You must specify 'name' for every item of jobs")
+        job = None
+        if do_install:
+            job = crontab.get_cron_job(params['minute'], params['hour'], params['day'], params['month'],
+                                       params['weekday'], params['job'], special_time)
+        jobs.append((params['name'], job))
+
+    old_lines = list(crontab.lines)
+    changed = crontab.apply_jobs(jobs, module.params['exclusive'])
+
+    res_args = dict(jobs=crontab.get_jobnames(), changed=bool(changed))
+    res_args['results'] = [dict(name=name, state=job is not None and 'present' or 'absent', changed=name in changed)
+                           for (name, job) in jobs]
+    managed = dict(jobs)
+    res_args['removed'] = [name for name in changed if name not in managed]
+
+    if changed:
+        if module.params['backup']:
+            new_lines = crontab.lines
+            crontab.lines = old_lines
+            (backuph, backup_file) = tempfile.mkstemp(prefix='crontab')
+            crontab.write(backup_file)
+            crontab.lines = new_lines
+            res_args['backup_file'] = backup_file
+        crontab.write()
+
+    if module.params['cron_file']:
+        res_args['cron_file'] = module.params['cron_file']
+
+    module.exit_json(**res_args)
+
 def main():
     # The following example playbooks:
     #
@@ -397,7 +555,9 @@ def main():
 
     module = AnsibleModule(
         argument_spec = dict(
-            name=dict(required=True),
+            name=dict(required=False),
+            jobs=dict(required=False, type='list'),
+            exclusive=dict(default=False, type='bool'),
             user=dict(required=False),
             job=dict(required=False),
             cron_file=dict(required=False),
@@ -414,6 +574,8 @@ def main():
                               choices=["reboot", "yearly", "annually", "monthly", "weekly", "daily", "hourly"],
                               type='str')
         ),
+        mutually_exclusive = [['name', 'jobs']],
+        required_one_of = [['name', 'jobs']],
         supports_check_mode = False,
     )
 
@@ -430,6 +592,7 @@ def main():
     weekday      = module.params['weekday']
     reboot       = module.params['reboot']
     special_time = module.params['special_time']
+    jobs         = module.params['jobs']
     do_install   = state == 'present'
 
     changed      = False
@@ -445,31 +608,15 @@ def main():
 
     # --- user input validation ---
 
-    if (special_time or reboot) and \
-       (True in [(x != '*') for x in [minute, hour, day, month, weekday]]):
-        module.fail_json(msg="You must specify time and date fields or special time.")
-
-    if cron_file and do_install:
+    if cron_file and (do_install or jobs is not None):
         if not user:
             module.fail_json(msg="To use cron_file=... parameter you must specify user=... as well")
 
-    if reboot and special_time:
-        module.fail_json(msg="reboot and special_time are mutually exclusive")
-
-    if name is None and do_install:
-        module.fail_json(msg="You must specify 'name' to install a new cron job")
+    if jobs is not None:
+        manage_jobs(module, crontab)
 
-    if job is None and do_install:
-        module.fail_json(msg="You must specify 'job' to install a new cron job")
-
-    if job and name is None and not do_install:
-        module.fail_json(msg="You must specify 'name' to remove a cron job")
-
-    if reboot:
-        if special_time:
-            module.fail_json(msg="reboot and special_time are mutually exclusive")
-        else:
-            special_time = "reboot"
+    special_time = check_job(module, name, job, do_install, minute, hour, day, month, weekday,
+                             reboot, special_time)
 
     # if requested make a backup before making a change
     if backup:
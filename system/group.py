@@ -29,9 +29,19 @@ description:
     - Manage presence of groups on a host.
 options:
     name:
-        required: true
+        required: false
+        description:
+            - Name of the group to manage. B(One of name and groups is required.)
+    groups:
+        required: false
+        version_added: "1.9"
         description:
-            - Name of the group to manage.
+            - List of groups to manage in one run. Each item is either a group
+              name or a dict with C(name) and optionally C(gid), C(state) and
+              C(system), which default to the values given to the module
+              itself. The group file is read once to find out which groups
+              need changing, so only those run C(groupadd), C(groupdel) or
+              C(groupmod).
     gid:
         required: false
         description:
@@ -54,12 +64,105 @@ options:
 EXAMPLES = '''
 # Example group command from Ansible Playbooks
 - group: name=somegroup state=present
+
+# Make sure a set of project groups exists and an old one is gone
+- group: state=present
+  args:
+    groups:
+      - project1
+      - { name: project2, gid: 2002 }
+      - { name: oldproject, state: absent }
 '''
 
 import grp
 import syslog
 import platform
 
+# options that may be given per group in groups mode
+GROUP_OPTIONS = ['name', 'gid', 'state', 'system']
+
+
+class GroupFailed(Exception):
+    pass
+
+
+class GroupExited(Exception):
+    pass
+
+
+class BatchModule(object):
+    """
+    Stands in for the AnsibleModule when several groups are handled in one
+    run. It carries the options of a single group, and fail_json() and
+    exit_json() end the work on that group instead of the whole module.
+    """
+
+    def __init__(self, module, item):
+        self.module = module
+        self.params = dict(module.params)
+        if not isinstance(item, dict):
+            item = dict(name=item)
+        for (key, value) in item.items():
+            if key not in GROUP_OPTIONS:
+                module.fail_json(msg="unsupported option %s for group %s" % (key, item.get('name')))
+            if key == 'system':
+                value = module.boolean(value)
+            elif isinstance(value, (int, long)):
+                value = str(value)
+            self.params[key] = value
+        if self.params['state'] not in ('present', 'absent'):
+            module.fail_json(msg="state of group %s must be present or absent" % self.params['name'])
+
+    def __getattr__(self, attr):
+        return getattr(self.module, attr)
+
+    def fail_json(self, **kwargs):
+        raise GroupFailed(kwargs)
+
+    def exit_json(self, **kwargs):
+        raise GroupExited(kwargs)
+
+
+class GroupDatabase(object):
+    """
+    The group file read once and indexed by name, so that handling many
+    groups costs neither a NSS lookup nor a file scan per question. Names
+    that are not in the file (LDAP, NIS...) are still looked up through NSS.
+    """
+
+    def __init__(self, group_file):
+        self.group_file = group_file
+        self.load()
+
+    def load(self):
+        self.groups = {}
+        if not os.path.exists(self.group_file):
+            return
+        f = open(self.group_file)
+        try:
+            lines = f.read().splitlines()
+        finally:
+            f.close()
+        for line in lines:
+            fields = line.split(':')
+            # skip comments and NIS compat entries
+            if len(fields) < 4 or not line or line[0] in '#+-':
+                continue
+            try:
+                entry = [fields[0], fields[1], int(fields[2]), filter(None, fields[3].split(','))]
+            except ValueError:
+                continue
+            self.groups[entry[0]] = entry
+
+    def getgrnam(self, name):
+        if name in self.groups:
+            return list(self.groups[name])
+        try:
+            return list(grp.getgrnam(name))
+        except KeyError:
+            return None
+
+
 class Group(object):
     """
     This is a generic Group manipulation class that is subclassed
@@ -87,6 +190,8 @@ class Group(object):
         self.gid        = module.params['gid']
         self.system     = module.params['system']
         self.syslogging = False
+        # set in groups mode, the group file read once for all groups
+        self.db         = None
 
     def execute_command(self, cmd):
         if self.syslogging:
@@ -126,6 +231,8 @@ class Group(object):
         return self.execute_command(cmd)
 
     def group_exists(self):
+        if self.db is not None:
+            return self.db.getgrnam(self.name) is not None
         try:
             if grp.getgrnam(self.name):
                 return True
@@ -135,6 +242,8 @@ class Group(object):
     def group_info(self):
         if not self.group_exists():
             return False
+        if self.db is not None:
+            return self.db.getgrnam(self.name)
         try:
             info = list(grp.getgrnam(self.name))
         except KeyError:
@@ -335,17 +444,84 @@ class NetBsdGroup(Group):
 
 # ===========================================
 
+def manage_groups(module):
+    groups = []
+    results = []
+    commands = []
+    for item in module.params['groups']:
+        group = Group(BatchModule(module, item))
+        groups.append(group)
+        results.append(dict(name=group.name, state=group.state, changed=False))
+
+    db = GroupDatabase(groups[0].GROUPFILE)
+
+    def run(group, result, func, *args):
+        try:
+            (rc, out, err) = func(*args)
+            if rc is not None and rc != 0:
+                group.module.fail_json(msg=err)
+            result['changed'] = rc is not None
+        except GroupExited, e:
+            result['changed'] = e.args[0].get('changed', False)
+        except GroupFailed, e:
+            result.update(e.args[0])
+            result['failed'] = True
+
+    # Work out from the group file what needs doing, then leave the
+    # changes to groupadd/groupdel/groupmod, which lock the files, pick
+    # GIDs unique across NSS and keep /etc/gshadow in step.
+    for (group, result) in zip(groups, results):
+        group.db = db
+        if group.state == 'absent':
+            if not group.group_exists():
+                continue
+            if module.check_mode:
+                result['changed'] = True
+            else:
+                commands.append((group, result, group.group_del))
+        elif not group.group_exists():
+            if module.check_mode:
+                result['changed'] = True
+            else:
+                commands.append((group, result, lambda group=group: group.group_add(gid=group.gid, system=group.system)))
+        else:
+            # group_mod is check mode aware
+            commands.append((group, result, lambda group=group: group.group_mod(gid=group.gid)))
+
+    for (group, result, func) in commands:
+        run(group, result, func)
+    if [result for (group, result, func) in commands if result['changed']]:
+        db.load()
+
+    for (group, result) in zip(groups, results):
+        if group.state == 'present' and not result.get('failed') and group.group_exists():
+            result['system'] = group.system
+            result['gid'] = group.group_info()[2]
+
+    failed = [result for result in results if result.get('failed')]
+    changed = bool([result for result in results if result['changed']])
+    if failed:
+        module.fail_json(msg="failed to manage group(s): %s" % ', '.join([r['name'] for r in failed]),
+            changed=changed, results=results)
+    module.exit_json(changed=changed, results=results)
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
             state=dict(default='present', choices=['present', 'absent'], type='str'),
-            name=dict(required=True, type='str'),
+            name=dict(required=False, type='str'),
+            groups=dict(required=False, type='list'),
             gid=dict(default=None, type='str'),
             system=dict(default=False, type='bool'),
         ),
+        required_one_of=[['name', 'groups']],
+        mutually_exclusive=[['name', 'groups']],
         supports_check_mode=True
     )
 
+    if module.params['groups']:
+        manage_groups(module)
+
     group = Group(module)
 
     if group.syslogging:
@@ -34,6 +34,26 @@ options:
     required: true
     default: null
     aliases: []
+  mounts:
+    description:
+      - List of mount points to manage in one run instead of I(name). Each item
+        is a dict with C(name) and any of C(src), C(fstype), C(opts), C(dump),
+        C(passno) and C(state), which default to the values given to the
+        module itself. I(fstab) is parsed once and written at most once, the
+        mount state is taken from C(/proc/self/mountinfo) once, and only the
+        mount, umount and remount operations that are needed are run, in
+        parallel for mount points that are not nested in each other. A
+        remount only happens when the options in use lack some of the new
+        options, a changed C(src) or C(fstype) unmounts and mounts again.
+    required: false
+    default: null
+    version_added: "1.9"
+  concurrency:
+    description:
+      - With I(mounts), the maximum number of mount operations run at the same time.
+    required: false
+    default: 4
+    version_added: "1.9"
   src:
     description:
       - device to be mounted on I(name).
@@ -90,19 +110,217 @@ EXAMPLES = '''
 
 # Mount up device by UUID
 - mount: name=/home src='UUID=b3e48f45-f933-4c8e-a700-22a159ec9077' fstype=xfs opts=noatime state=present
-'''
 
+# Mount a set of NFS exports, and make sure an old one is gone
+- mount: fstype=nfs opts=ro,hard state=mounted
+  args:
+    mounts:
+      - { name: /srv/data, src: "nas:/export/data" }
+      - { name: /srv/data/archive, src: "nas:/export/archive" }
+      - { name: /srv/tools, src: "nas:/export/tools", opts: "ro,soft" }
+      - { name: /srv/old, src: "nas:/export/old", state: absent }
+'''
 
-def write_fstab(lines, dest):
-
-    fs_w = open(dest, 'w')
-    for l in lines:
-        fs_w.write(l)
+import re
+import tempfile
+import threading
+import Queue
+
+# mount options that are not visible in the options of a mounted file system
+FSTAB_ONLY_OPTS = ('defaults', 'auto', 'noauto', 'nofail', '_netdev', 'user', 'users',
+                   'nouser', 'owner', 'group', 'bg', 'fg')
+
+# mount flags with their opposite, the one in effect by default first
+OPPOSITE_OPTS = (('rw', 'ro'), ('exec', 'noexec'), ('suid', 'nosuid'), ('dev', 'nodev'),
+                 ('async', 'sync'))
+
+# flags implied by the options that let users mount a file system
+IMPLIED_OPTS = {
+    'user': ('noexec', 'nosuid', 'nodev'),
+    'users': ('noexec', 'nosuid', 'nodev'),
+    'owner': ('nosuid', 'nodev'),
+    'group': ('nosuid', 'nodev'),
+}
+
+def write_fstab(module, lines, dest):
+    """ replace dest by a file with lines, atomically """
+
+    # a symlinked fstab is replaced where the link points to
+    dest = os.path.realpath(dest)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), prefix='.%s.' % os.path.basename(dest))
+    try:
+        fs_w = os.fdopen(fd, 'w')
+        for l in lines:
+            fs_w.write(l)
+        fs_w.flush()
+        os.fsync(fs_w.fileno())
+        fs_w.close()
+        if not os.path.exists(dest):
+            os.chmod(tmp, 0644)
+    except:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    # takes over owner, mode and SELinux context of dest
+    module.atomic_move(tmp, dest)
+
+def parse_fstab_line(line):
+    """ fields of an fstab line as a dict, None for lines we leave alone """
+    if not line.strip() or line.strip().startswith('#'):
+        return None
+    if len(line.split()) != 6:
+        # not sure what this is or why it is here
+        # but it is not our fault so leave it be
+        return None
+    ld = {}
+    ld['src'], ld['name'], ld['fstype'], ld['opts'], ld['dump'], ld['passno'] = line.split()
+    return ld
+
+class Fstab(object):
+    """
+    fstab parsed once, with its entries indexed by mount point, for handling
+    many mount points with a single read and write.
+    """
 
-    fs_w.flush()
-    fs_w.close()
+    new_line = '%(src)s %(name)s %(fstype)s %(opts)s %(dump)s %(passno)s\n'
 
-def set_mount(**kwargs):
+    def __init__(self, module, path):
+        self.module = module
+        self.path = path
+        self.lines = open(path, 'r').readlines()
+        self.index = {}
+        for (i, line) in enumerate(self.lines):
+            ld = parse_fstab_line(line)
+            if ld is not None:
+                self.index.setdefault(ld['name'], []).append(i)
+        self.dirty = False
+
+    def set(self, args):
+        """ Same as set_mount(), returns the names of the fields that changed. """
+        changed = []
+        if args['name'] not in self.index:
+            if self.lines and not self.lines[-1].endswith('\n'):
+                self.lines[-1] += '\n'
+            self.index[args['name']] = [len(self.lines)]
+            self.lines.append(self.new_line % args)
+            self.dirty = True
+            return ['name']
+        for i in self.index[args['name']]:
+            ld = parse_fstab_line(self.lines[i])
+            fields = [t for t in ('src', 'fstype', 'opts', 'dump', 'passno') if ld[t] != args[t]]
+            if fields:
+                for t in fields:
+                    ld[t] = args[t]
+                self.lines[i] = self.new_line % ld
+                self.dirty = True
+                changed.extend([t for t in fields if t not in changed])
+        return changed
+
+    def unset(self, name):
+        """ Same as unset_mount(), returns whether the mount point was there. """
+        if name not in self.index:
+            return False
+        for i in self.index.pop(name):
+            self.lines[i] = None
+        self.dirty = True
+        return True
+
+    def write(self):
+        if self.dirty:
+            write_fstab(self.module, [line for line in self.lines if line is not None], self.path)
+            self.dirty = False
+
+def read_mountinfo():
+    """
+    The mounted file systems from /proc/self/mountinfo, keyed by mount point,
+    with their source, type and options. None where there is no mountinfo.
+    """
+    try:
+        f = open('/proc/self/mountinfo', 'r')
+    except IOError:
+        return None
+    unescape = lambda value: re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), value)
+    mounts = {}
+    try:
+        for line in f:
+            fields = line.split()
+            try:
+                sep = fields.index('-', 6)
+            except ValueError:
+                continue
+            mounts[unescape(fields[4])] = dict(
+                fstype=fields[sep + 1],
+                src=unescape(fields[sep + 2]),
+                opts=fields[5].split(',') + fields[sep + 3].split(','),
+            )
+    finally:
+        f.close()
+    return mounts
+
+def needs_remount(opts, live_opts):
+    """
+    whether a mounted file system lacks some of the options in opts, or has
+    one of the OPPOSITE_OPTS flags set otherwise than opts (or the default)
+    """
+    opts = opts.split(',')
+    flags = []
+    for pair in OPPOSITE_OPTS:
+        flags.extend(pair)
+    for opt in opts:
+        if opt in FSTAB_ONLY_OPTS or opt in flags or opt.startswith('x-') or opt.startswith('comment='):
+            continue
+        if opt not in live_opts:
+            return True
+    for (default, other) in OPPOSITE_OPTS:
+        # later options override earlier ones, like mount does
+        wanted = default
+        for opt in opts:
+            if opt == 'defaults':
+                wanted = default
+            elif opt in (default, other):
+                wanted = opt
+            elif other in IMPLIED_OPTS.get(opt, ()):
+                wanted = other
+        live = default
+        if other in live_opts:
+            live = other
+        if wanted != live:
+            return True
+    return False
+
+def run_parallel(func, items, concurrency):
+    """ Call func for every item from up to concurrency threads.
+
+    The first exception raised by a worker is re-raised once all workers
+    have stopped."""
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for i in range(max(1, min(concurrency, len(items)))):
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
+def set_mount(module, **kwargs):
     """ set/change a mount point location in fstab """
 
     # kwargs: name, src, fstype, opts, dump, passno, state, fstab=/etc/fstab
@@ -156,12 +374,12 @@ def set_mount(**kwargs):
         changed = True
 
     if changed:
-        write_fstab(to_write, args['fstab'])
+        write_fstab(module, to_write, args['fstab'])
 
     return (args['name'], changed)
 
 
-def unset_mount(**kwargs):
+def unset_mount(module, **kwargs):
     """ remove a mount point from fstab """
 
     # kwargs: name, src, fstype, opts, dump, passno, state, fstab=/etc/fstab
@@ -199,7 +417,7 @@ def unset_mount(**kwargs):
         changed = True
 
     if changed:
-        write_fstab(to_write, args['fstab'])
+        write_fstab(module, to_write, args['fstab'])
 
     return (args['name'], changed)
 
@@ -233,21 +451,168 @@ def umount(module, **kwargs):
     else:
         return rc, out+err
 
+def manage_mounts(module):
+    fstab_path = module.params['fstab']
+    items = []
+    for item in module.params['mounts']:
+        if not isinstance(item, dict):
+            module.fail_json(msg="every item of mounts must be a dict with at least a name")
+        params = dict(module.params)
+        params.update(item)
+        for key in ('state', 'name', 'src', 'fstype'):
+            if params.get(key) is None:
+                module.fail_json(msg="missing %s for mount point %s" % (key, params.get('name')))
+        if params['state'] not in ('present', 'absent', 'mounted', 'unmounted'):
+            module.fail_json(msg="state of mount point %s must be one of present, absent, mounted or unmounted" % params['name'])
+        args = dict(opts='defaults', dump='0', passno='0', fstab=fstab_path)
+        for key in ('name', 'src', 'fstype', 'opts', 'dump', 'passno'):
+            if params.get(key) is not None:
+                args[key] = str(params[key])
+        if ' ' in args['opts']:
+            module.fail_json(msg="unexpected space in 'opts' parameter of mount point %s" % args['name'])
+        items.append((params['state'], args, dict(name=args['name'], state=params['state'], changed=False)))
+
+    if not os.path.exists(fstab_path):
+        if not os.path.exists(os.path.dirname(fstab_path)):
+            os.makedirs(os.path.dirname(fstab_path))
+        open(fstab_path, 'a').close()
+
+    fstab = Fstab(module, fstab_path)
+    live = read_mountinfo()
+
+    def mounted(name):
+        if live is None:
+            return os.path.ismount(name)
+        return os.path.realpath(name) in live
+
+    # Work out what has to change in fstab and which mount operations that
+    # needs, without touching anything yet
+    unmounts = []
+    mounts = []
+    rmdirs = []
+    for (state, args, result) in items:
+        name = args['name']
+        if state == 'absent':
+            if fstab.unset(name):
+                result['changed'] = True
+                if mounted(name):
+                    unmounts.append((args, result))
+                if os.path.exists(name):
+                    rmdirs.append((args, result))
+        elif state == 'unmounted':
+            if mounted(name):
+                result['changed'] = True
+                unmounts.append((args, result))
+        else:
+            fields = fstab.set(args)
+            result['changed'] = bool(fields)
+            if state != 'mounted':
+                continue
+            if not mounted(name):
+                result['changed'] = True
+                mounts.append((args, result, 'mount'))
+            elif 'src' in fields or 'fstype' in fields:
+                unmounts.append((args, result))
+                mounts.append((args, result, 'mount'))
+            elif 'opts' in fields or 'name' in fields:
+                live_opts = None
+                if live is not None:
+                    live_opts = live[os.path.realpath(name)]['opts']
+                if live_opts is None or needs_remount(args['opts'], live_opts):
+                    mounts.append((args, result, 'remount'))
+
+    # mount reads fstab, so it has to be written first
+    try:
+        fstab.write()
+    except (IOError, OSError), e:
+        module.fail_json(msg="Error writing %s: %s" % (fstab_path, str(e)))
+
+    def depth(name):
+        return len([part for part in os.path.normpath(name).split('/') if part])
+
+    def by_depth(ops, reverse=False):
+        # mount points at the same depth cannot be nested in each other
+        levels = {}
+        for op in ops:
+            levels.setdefault(depth(op[0]['name']), []).append(op)
+        return [levels[key] for key in sorted(levels.keys(), reverse=reverse)]
+
+    def do_umount(op):
+        (args, result) = op
+        res, msg = umount(module, **args)
+        if res:
+            result['failed'] = True
+            result['msg'] = "Error unmounting %s: %s" % (args['name'], msg)
+
+    def do_mount(op):
+        (args, result, action) = op
+        if result.get('failed'):
+            return
+        # made only now, as it may be inside another mount point of the list
+        if not os.path.exists(args['name']):
+            try:
+                os.makedirs(args['name'])
+            except (OSError, IOError), e:
+                result['failed'] = True
+                result['msg'] = "Error making dir %s: %s" % (args['name'], str(e))
+                return
+        if action == 'remount':
+            res, msg = mount(module, **args)
+        else:
+            rc, out, err = module.run_command([module.get_bin_path('mount'), args['name']])
+            res, msg = rc, out + err
+        if res:
+            result['failed'] = True
+            result['msg'] = "Error mounting %s: %s" % (args['name'], msg)
+
+    # nested mount points are unmounted innermost first and mounted outermost first
+    for level in by_depth(unmounts, reverse=True):
+        run_parallel(do_umount, level, module.params['concurrency'])
+    for level in by_depth(mounts):
+        run_parallel(do_mount, level, module.params['concurrency'])
+
+    rmdirs.sort(key=lambda op: depth(op[0]['name']), reverse=True)
+    for (args, result) in rmdirs:
+        if not result.get('failed') and os.path.exists(args['name']):
+            try:
+                os.rmdir(args['name'])
+            except (OSError, IOError), e:
+                result['failed'] = True
+                result['msg'] = "Error rmdir %s: %s" % (args['name'], str(e))
+
+    results = [result for (state, args, result) in items]
+    failed = [result for result in results if result.get('failed')]
+    changed = bool([result for result in results if result['changed']])
+    if failed:
+        module.fail_json(msg="failed to manage mount point(s): %s" % ', '.join([r['name'] for r in failed]),
+            changed=changed, results=results)
+    module.exit_json(changed=changed, results=results)
+
 def main():
 
     module = AnsibleModule(
         argument_spec = dict(
-            state  = dict(required=True, choices=['present', 'absent', 'mounted', 'unmounted']),
-            name   = dict(required=True),
+            state  = dict(required=False, choices=['present', 'absent', 'mounted', 'unmounted']),
+            name   = dict(required=False),
+            mounts = dict(required=False, type='list'),
             opts   = dict(default=None),
             passno = dict(default=None),
             dump   = dict(default=None),
-            src    = dict(required=True),
-            fstype = dict(required=True),
-            fstab  = dict(default='/etc/fstab')
-        )
+            src    = dict(required=False),
+            fstype = dict(required=False),
+            fstab  = dict(default='/etc/fstab'),
+            concurrency = dict(default=4, type='int'),
+        ),
+        mutually_exclusive = [['name', 'mounts']],
     )
 
+    if module.params['mounts']:
+        manage_mounts(module)
+
+    missing = [key for key in ('state', 'name', 'src', 'fstype') if module.params[key] is None]
+    if missing:
+        module.fail_json(msg="missing required arguments: %s" % ','.join(missing))
+
 
     changed = False
     rc = 0
@@ -282,7 +647,7 @@ def main():
     state = module.params['state']
     name  = module.params['name']
     if state == 'absent':
-        name, changed = unset_mount(**args)
+        name, changed = unset_mount(module, **args)
         if changed:
             if os.path.ismount(name):
                 res,msg  = umount(module, **args)
@@ -314,7 +679,7 @@ def main():
                 except (OSError, IOError), e:
                     module.fail_json(msg="Error making dir %s: %s" % (name, str(e)))
 
-        name, changed = set_mount(**args)
+        name, changed = set_mount(module, **args)
         if state == 'mounted':
             res = 0
             if os.path.ismount(name):
@@ -29,9 +29,28 @@ description:
       OpenRC, SysV, systemd, upstart.
 options:
     name:
-        required: true
+        required: false
+        description:
+        - Name of the service. B(One of name and names is required.)
+    names:
+        required: false
+        version_added: "1.9"
+        description:
+        - List of services to manage in one run. Each item is either a service
+          name or a dict with C(name) and optionally C(pattern) and
+          C(arguments). The status of all services is collected in one pass
+          (a single C(systemctl show) for systemd units and a single process
+          table snapshot for I(pattern) checks), and state changes are made in
+          parallel groups ordered by the dependencies the init system declares
+          (systemd After/Before, LSB and rcorder init script headers).
+          Stopping walks the groups in reverse order.
+    concurrency:
+        required: false
+        default: 4
+        version_added: "1.9"
         description:
-        - Name of the service.
+        - With I(names), the maximum number of services changed at the same time
+          within one dependency group.
     state:
         required: false
         choices: [ started, stopped, restarted, reloaded ]
@@ -95,19 +114,298 @@ EXAMPLES = '''
 
 # Example action to restart network service for interface eth0
 - service: name=network state=restarted args=eth0
+
+# Example action to restart several services, dependencies first
+- service: names=nginx,php-fpm,memcached state=restarted
+
+# Example action to start several services, one of them by process pattern
+- service: state=started
+  args:
+    names:
+      - ntpd
+      - { name: foo, pattern: /usr/bin/foo }
 '''
 
 import platform
 import os
+import errno
+import fcntl
+import signal
+import sys
 import re
 import tempfile
 import shlex
 import select
 import time
 import string
+import threading
+import Queue
 
 from distutils.version import LooseVersion
 
+# output kept of every stream of a daemonized command
+DAEMON_OUTPUT_LIMIT = 64 * 1024
+
+class OutputBuffer(object):
+    """
+    Collects the output of a command, keeping only the last limit bytes.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.size > 2 * self.limit:
+            self.chunks = [''.join(self.chunks)[-self.limit:]]
+            self.size = self.limit
+
+    def getvalue(self):
+        return ''.join(self.chunks)[-self.limit:]
+
+def spawn_in_session(args, stdin, stdout, stderr):
+    """
+    Start args in a new session with stdin, stdout and stderr on the given
+    file descriptors and / as working directory. Every other descriptor is
+    closed, so a daemon the command leaves behind cannot hold on to ours.
+    Returns a function that waits for the command and returns its exit code.
+    """
+    def preexec():
+        # python ignores SIGPIPE, the command should not inherit that
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        os.setsid()
+    p = subprocess.Popen(args, stdin=stdin, stdout=stdout, stderr=stderr,
+        close_fds=True, cwd='/', preexec_fn=preexec)
+    return p.wait
+
+# output of systemctl list-unit-files, shared by every service handled in a run
+SYSTEMD_UNIT_FILES = {}
+
+class ServiceFailed(Exception):
+    pass
+
+class ServiceExited(Exception):
+    pass
+
+class BatchModule(object):
+    """
+    Stands in for the AnsibleModule when several services are handled in one
+    run, so that fail_json() and exit_json() called for one service end the
+    work on that service instead of the whole module.
+    """
+
+    def __init__(self, module, item):
+        self.module = module
+        self.params = dict(module.params)
+        if isinstance(item, dict):
+            for key in ('name', 'pattern', 'arguments'):
+                if key in item:
+                    self.params[key] = item[key]
+        else:
+            self.params['name'] = item
+            self.params['pattern'] = None
+
+    def __getattr__(self, attr):
+        return getattr(self.module, attr)
+
+    def fail_json(self, **kwargs):
+        raise ServiceFailed(kwargs)
+
+    def exit_json(self, **kwargs):
+        raise ServiceExited(kwargs)
+
+def parse_systemctl_show(out):
+    """
+    Split the output of 'systemctl show unit1 unit2 ...' into one dict of
+    properties per unit, in the order the units were given.
+    """
+    units = []
+    status_dict = {}
+    key = None
+    value_buffer = []
+    for line in out.splitlines():
+        if key is None:
+            if not line.strip():
+                # a blank line separates the properties of two units
+                if status_dict:
+                    units.append(status_dict)
+                    status_dict = {}
+                continue
+            if '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            # systemd fields that are shell commands can be multi-line
+            # We take a value that begins with a "{" as the start of
+            # a shell command and a line that ends with "}" as the end of
+            # the command
+            if value.lstrip().startswith('{') and not value.rstrip().endswith('}'):
+                value_buffer = [value]
+            else:
+                status_dict[key] = value
+                key = None
+        else:
+            value_buffer.append(line)
+            if line.rstrip().endswith('}'):
+                status_dict[key] = '\n'.join(value_buffer)
+                key = None
+    if status_dict:
+        units.append(status_dict)
+    return units
+
+def process_snapshot(module):
+    """
+    Take one snapshot of the process table, as a dict mapping every distinct
+    command line to the pids running it. Read from /proc where it is
+    available, from ps otherwise. Returns None if neither works.
+    """
+    table = {}
+    if os.path.exists('/proc/self/cmdline'):
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                f = open('/proc/%s/cmdline' % entry, 'rb')
+                try:
+                    cmdline = f.read().rstrip('\0').replace('\0', ' ')
+                finally:
+                    f.close()
+                if not cmdline:
+                    # kernel threads have no command line, ps shows [comm]
+                    f = open('/proc/%s/comm' % entry, 'rb')
+                    try:
+                        cmdline = '[%s]' % f.read().strip()
+                    finally:
+                        f.close()
+            except (IOError, OSError):
+                # the process went away while we were looking
+                continue
+            table.setdefault(cmdline, []).append(int(entry))
+        return table
+
+    if platform.system() == 'SunOS':
+        psflags = '-ef'
+    else:
+        psflags = 'auxww'
+    psbin = module.get_bin_path('ps', True)
+    (rc, psout, pserr) = module.run_command('%s %s' % (psbin, psflags))
+    if rc != 0:
+        return None
+    for line in psout.splitlines()[1:]:
+        table.setdefault(line, [])
+    return table
+
+def parse_init_ordering(path):
+    """
+    Read the start ordering an init script declares in its header, either as
+    LSB Required-Start/Should-Start/X-Start-Before lines or as rcorder
+    REQUIRE/BEFORE lines. Returns the lists of names the script starts after
+    and before; LSB facilities ($network and friends) are left out.
+    """
+    after = []
+    before = []
+    try:
+        f = open(path, 'r')
+    except IOError:
+        return after, before
+    try:
+        for (count, line) in enumerate(f):
+            if count > 100 or line.startswith('### END INIT INFO'):
+                break
+            if not line.startswith('#') or ':' not in line:
+                continue
+            (key, value) = line[1:].split(':', 1)
+            key = key.strip()
+            names = [n for n in value.split() if not n.startswith('$')]
+            if key in ('Required-Start', 'Should-Start', 'REQUIRE'):
+                after.extend(names)
+            elif key in ('X-Start-Before', 'BEFORE'):
+                before.extend(names)
+    finally:
+        f.close()
+    return after, before
+
+def service_groups(services, reverse=False):
+    """
+    Split services into groups that can be handled in parallel, each group
+    only depending on services in earlier groups. With reverse the order is
+    turned around, so that dependants are stopped before their dependencies.
+    """
+    keys = {}
+    for (i, service) in enumerate(services):
+        keys[service.name] = i
+        unit = service.get_systemd_unit()
+        if unit:
+            keys[unit] = i
+            if unit.endswith('.service'):
+                keys[unit[:-len('.service')]] = i
+
+    after = [set() for service in services]
+    for (i, service) in enumerate(services):
+        (start_after, start_before) = service.get_start_order()
+        for key in start_after:
+            j = keys.get(key)
+            if j is not None and j != i:
+                after[i].add(j)
+        for key in start_before:
+            j = keys.get(key)
+            if j is not None and j != i:
+                after[j].add(i)
+
+    if reverse:
+        before = [set() for service in services]
+        for (i, deps) in enumerate(after):
+            for j in deps:
+                before[j].add(i)
+        after = before
+
+    groups = []
+    done = set()
+    pending = range(len(services))
+    while pending:
+        group = [i for i in pending if after[i] <= done]
+        if not group:
+            # dependency loop, leave the rest to the init system
+            group = pending
+        groups.append([services[i] for i in group])
+        done.update(group)
+        pending = [i for i in pending if i not in done]
+    return groups
+
+def run_parallel(func, items, concurrency):
+    """ Call func for every item from up to concurrency threads.
+
+    The first exception raised by a worker is re-raised once all workers
+    have stopped."""
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while not errors:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                func(item)
+            except Exception:
+                errors.append(sys.exc_info())
+
+    threads = []
+    for i in range(max(1, min(concurrency, len(items)))):
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0][0], errors[0][1], errors[0][2]
+
 class Service(object):
     """
     This is the generic Service manipulation class that is subclassed
@@ -149,6 +447,7 @@ class Service(object):
         self.rcconf_key     = None
         self.rcconf_value   = None
         self.svc_change     = False
+        self.systemd_status = None
 
         # select whether we dump additional debug info through syslog
         self.syslogging = False
@@ -180,79 +479,97 @@ class Service(object):
         if not daemonize:
             return self.module.run_command(cmd)
 
-        # This is complex because daemonization is hard for people.
-        # What we do is daemonize a part of this module, the daemon runs the
-        # command, picks up the return code and output, and returns it to the
-        # main process.
-        pipe = os.pipe()
-        pid = os.fork()
-        if pid == 0:
-            os.close(pipe[0])
-            # Set stdin/stdout/stderr to /dev/null
-            fd = os.open(os.devnull, os.O_RDWR)
-            if fd != 0:
-                os.dup2(fd, 0)
-            if fd != 1:
-                os.dup2(fd, 1)
-            if fd != 2:
-                os.dup2(fd, 2)
-            if fd not in (0, 1, 2):
+        # Daemonized commands run in a session of their own, detached from
+        # ours, with stdin on /dev/null and / as working directory, so that
+        # whatever they start outlives this module. Their output is streamed
+        # into bounded buffers until the command itself exits; a daemon it
+        # left behind may keep the pipes open, so we don't wait for EOF.
+        if isinstance(cmd, basestring):
+            cmd = shlex.split(cmd)
+        (out_r, out_w) = os.pipe()
+        (err_r, err_w) = os.pipe()
+        (exit_r, exit_w) = os.pipe()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (out_r, out_w, err_r, err_w, exit_r, exit_w, devnull):
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        try:
+            try:
+                wait = spawn_in_session(cmd, devnull, out_w, err_w)
+            except OSError, e:
+                for fd in (out_r, err_r, exit_r, exit_w):
+                    os.close(fd)
+                self.module.fail_json(msg="unable to run %s: %s" % (cmd[0], e))
+        finally:
+            for fd in (devnull, out_w, err_w):
                 os.close(fd)
 
-            # Make us a daemon. Yes, that's all it takes.
-            pid = os.fork()
-            if pid > 0:
-                os._exit(0)
-            os.setsid()
-            os.chdir("/")
-            pid = os.fork()
-            if pid > 0:
-                os._exit(0)
-
-            # Start the command
-            if isinstance(cmd, basestring):
-                cmd = shlex.split(cmd)
-            p = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=lambda: os.close(pipe[1]))
-            stdout = ""
-            stderr = ""
-            fds = [p.stdout, p.stderr]
-            # Wait for all output, or until the main process is dead and its output is done.
-            while fds:
-                rfd, wfd, efd = select.select(fds, [], fds, 1)
-                if not (rfd + wfd + efd) and p.poll() is not None:
+        # Reaping happens in a thread (signal handlers would only work in the
+        # main thread), which wakes up the select below through exit_r.
+        status = []
+        def waiter():
+            status.append(wait())
+            os.write(exit_w, 'x')
+        thread = threading.Thread(target=waiter)
+        thread.setDaemon(True)
+        thread.start()
+
+        buffers = { out_r: OutputBuffer(DAEMON_OUTPUT_LIMIT), err_r: OutputBuffer(DAEMON_OUTPUT_LIMIT) }
+        fds = [out_r, err_r, exit_r]
+        deadline = None
+        while out_r in fds or err_r in fds:
+            timeout = None
+            if deadline is not None:
+                # the command is gone, only collect what it already wrote
+                timeout = max(0, deadline - time.time())
+            try:
+                rfds = select.select(fds, [], [], timeout)[0]
+            except select.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if not rfds:
+                break
+            for fd in rfds:
+                if fd == exit_r:
+                    fds.remove(exit_r)
+                    deadline = time.time() + 0.1
+                    continue
+                data = os.read(fd, 65536)
+                if data:
+                    buffers[fd].write(data)
+                else:
+                    fds.remove(fd)
+        thread.join()
+        for fd in (out_r, err_r, exit_r, exit_w):
+            os.close(fd)
+        return (status[0], buffers[out_r].getvalue(), buffers[err_r].getvalue())
+
+    def get_systemd_unit(self):
+        # only LinuxService knows about systemd
+        return None
+
+    def get_start_order(self):
+        # Returns the names of services this one starts after and before
+        for path in (self.svc_initscript, '/etc/init.d/%s' % self.name,
+                     '/etc/rc.d/%s' % self.name, '/usr/local/etc/rc.d/%s' % self.name):
+            if path and os.path.isfile(path):
+                return parse_init_ordering(path)
+        return [], []
+
+    def check_ps(self, snapshot=None):
+        # Use the process table snapshot shared by several services if we have one
+        if snapshot is not None:
+            pattern = self.pattern
+            if isinstance(pattern, unicode):
+                # the snapshot holds raw command lines
+                pattern = pattern.encode('utf-8')
+            self.running = False
+            for cmdline in snapshot:
+                if pattern in cmdline and not "pattern=" in cmdline:
+                    self.running = True
                     break
-                if p.stdout in rfd:
-                    dat = os.read(p.stdout.fileno(), 4096)
-                    if not dat:
-                        fds.remove(p.stdout)
-                    stdout += dat
-                if p.stderr in rfd:
-                    dat = os.read(p.stderr.fileno(), 4096)
-                    if not dat:
-                        fds.remove(p.stderr)
-                    stderr += dat
-            p.wait()
-            # Return a JSON blob to parent
-            os.write(pipe[1], json.dumps([p.returncode, stdout, stderr]))
-            os.close(pipe[1])
-            os._exit(0)
-        elif pid == -1:
-            self.module.fail_json(msg="unable to fork")
-        else:
-            os.close(pipe[1])
-            os.waitpid(pid, 0)
-            # Wait for data from daemon process and process it.
-            data = ""
-            while True:
-                rfd, wfd, efd = select.select([pipe[0]], [], [pipe[0]])
-                if pipe[0] in rfd:
-                    dat = os.read(pipe[0], 4096)
-                    if not dat:
-                        break
-                    data += dat
-            return json.loads(data)
+            return
 
-    def check_ps(self):
         # Set ps flags
         if platform.system() == 'SunOS':
             psflags = '-ef'
@@ -424,7 +741,10 @@ class LinuxService(Service):
             else:
                 name = "%s.service" % name
 
-            rc, out, err = self.execute_command("%s list-unit-files" % (location['systemctl']))
+            out = SYSTEMD_UNIT_FILES.get(location['systemctl'])
+            if out is None:
+                rc, out, err = self.execute_command("%s list-unit-files" % (location['systemctl']))
+                SYSTEMD_UNIT_FILES[location['systemctl']] = out
 
             # adjust the service name to account for template service unit files
             index = name.find('@')
@@ -514,37 +834,31 @@ class LinuxService(Service):
         if location.get('initctl', None):
             self.svc_initctl = location['initctl']
 
+    def get_systemd_unit(self):
+        if not (self.svc_cmd and self.svc_cmd.endswith('systemctl')):
+            return None
+        try:
+            return self.__systemd_unit
+        except AttributeError:
+            return None
+
+    def get_start_order(self):
+        if self.systemd_status is not None:
+            return (self.systemd_status.get('After', '').split(),
+                    self.systemd_status.get('Before', '').split())
+        return Service.get_start_order(self)
+
     def get_systemd_status_dict(self):
+        # status collected for several units at once by main()
+        if self.systemd_status is not None:
+            return self.systemd_status
         (rc, out, err) = self.execute_command("%s show %s" % (self.enable_cmd, self.__systemd_unit,))
         if rc != 0:
             self.module.fail_json(msg='failure %d running systemctl show for %r: %s' % (rc, self.__systemd_unit, err))
-        key = None
-        value_buffer = []
-        status_dict = {}
-        for line in out.splitlines():
-            if not key:
-                key, value = line.split('=', 1)
-                # systemd fields that are shell commands can be multi-line
-                # We take a value that begins with a "{" as the start of
-                # a shell command and a line that ends with "}" as the end of
-                # the command
-                if value.lstrip().startswith('{'):
-                    if value.rstrip().endswith('}'):
-                        status_dict[key] = value
-                        key = None
-                    else:
-                        value_buffer.append(value)
-                else:
-                    status_dict[key] = value
-                    key = None
-            else:
-                if line.rstrip().endswith('}'):
-                    status_dict[key] = '\n'.join(value_buffer)
-                    key = None
-                else:
-                    value_buffer.append(value)
-
-        return status_dict
+        units = parse_systemctl_show(out)
+        if not units:
+            return {}
+        return units[0]
 
     def get_systemd_service_status(self):
         d = self.get_systemd_status_dict()
@@ -1274,10 +1588,115 @@ class AIX(Service):
 # ===========================================
 # Main control flow
 
+def manage_services(module):
+    concurrency = module.params['concurrency']
+    state = module.params['state']
+    results = []
+    services = []
+    all_services = []
+    times = {}
+
+    def timed(service, func, *args):
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            times[id(service)] = times.get(id(service), 0) + time.time() - start
+
+    def record(service, result, e):
+        if isinstance(e, ServiceExited):
+            # only check mode exits early
+            result['changed'] = e.args[0].get('changed', False)
+        else:
+            result['failed'] = True
+            result['msg'] = e.args[0].get('msg')
+
+    # Find service management tools, and enable/disable startup at boot if
+    # requested. Enabling is done one service at a time as some platforms
+    # keep it all in one file (rc.conf).
+    for item in module.params['names']:
+        service = Service(BatchModule(module, item))
+        result = dict(name=service.name, changed=False)
+        results.append(result)
+        all_services.append(service)
+        try:
+            timed(service, service.get_service_tools)
+            if service.enable is not None:
+                timed(service, service.service_enable)
+                result['enabled'] = service.enable
+                result['changed'] = bool(service.changed)
+        except (ServiceFailed, ServiceExited), e:
+            record(service, result, e)
+            continue
+        if state is not None:
+            services.append((service, result))
+
+    # Collect the status of all services in one go: a single systemctl show
+    # for the systemd units and a single process table snapshot for patterns
+    units = {}
+    for (service, result) in services:
+        unit = service.get_systemd_unit()
+        if unit and not service.pattern:
+            units.setdefault(service.svc_cmd, []).append(service)
+    for (systemctl, unit_services) in units.items():
+        (rc, out, err) = module.run_command("%s show %s" % (systemctl,
+            ' '.join([s.get_systemd_unit() for s in unit_services])))
+        status = parse_systemctl_show(out)
+        if rc == 0 and len(status) == len(unit_services):
+            for (service, status_dict) in zip(unit_services, status):
+                service.systemd_status = status_dict
+
+    snapshot = None
+    if [service for (service, result) in services if service.pattern]:
+        snapshot = process_snapshot(module)
+
+    def change_state(item):
+        (service, result) = item
+        start = time.time()
+        try:
+            try:
+                if service.pattern:
+                    service.check_ps(snapshot)
+                else:
+                    service.get_service_status()
+                service.check_service_changed()
+                (rc, out, err) = service.modify_service_state()
+                if rc != 0 and not (err and "Job is already running" in err):
+                    raise ServiceFailed(dict(msg=err or out))
+                result['changed'] = result['changed'] or service.svc_change
+                if state in ['started','restarted','running','reloaded']:
+                    result['state'] = 'started'
+                else:
+                    result['state'] = 'stopped'
+            except (ServiceFailed, ServiceExited), e:
+                record(service, result, e)
+        finally:
+            times[id(service)] = times.get(id(service), 0) + time.time() - start
+
+    # Change the state group by group, dependencies first (last when stopping)
+    groups = service_groups([service for (service, result) in services], reverse=(state == 'stopped'))
+    by_service = dict([(id(service), result) for (service, result) in services])
+    for (i, group) in enumerate(groups):
+        for service in group:
+            by_service[id(service)]['group'] = i
+        run_parallel(change_state, [(service, by_service[id(service)]) for service in group], concurrency)
+
+    for (service, result) in zip(all_services, results):
+        result['elapsed'] = round(times.get(id(service), 0), 3)
+    failed = [result for result in results if result.get('failed')]
+    changed = bool([result for result in results if result['changed']])
+    if failed:
+        module.fail_json(msg="failed to manage service(s): %s" % ', '.join([r['name'] for r in failed]),
+            changed=changed, results=results)
+    module.exit_json(changed=changed, results=results,
+        groups=[[service.name for service in group] for group in groups])
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
-            name = dict(required=True),
+            name = dict(required=False),
+            names = dict(required=False, type='list'),
+            concurrency = dict(required=False, type='int', default=4),
             state = dict(choices=['running', 'started', 'stopped', 'restarted', 'reloaded']),
             sleep = dict(required=False, type='int', default=None),
             pattern = dict(required=False, default=None),
@@ -1285,11 +1704,16 @@ def main():
             runlevel = dict(required=False, default='default'),
             arguments = dict(aliases=['args'], default=''),
         ),
+        required_one_of=[['name', 'names']],
+        mutually_exclusive=[['name', 'names']],
         supports_check_mode=True
     )
     if module.params['state'] is None and module.params['enabled'] is None:
         module.fail_json(msg="Neither 'state' nor 'enabled' set")
 
+    if module.params['names']:
+        manage_services(module)
+
     service = Service(module)
 
     if service.syslogging:
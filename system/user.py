@@ -29,10 +29,22 @@ description:
     - Manage user accounts and user attributes.
 options:
     name:
-        required: true
+        required: false
         aliases: [ "user" ]
         description:
-            - Name of the user to create, remove or modify.
+            - Name of the user to create, remove or modify. B(One of name and
+              users is required.)
+    users:
+        required: false
+        version_added: "1.9"
+        description:
+            - List of users to manage in one run. Each item is either a user
+              name or a dict with C(name) and any of the other options of this
+              module, which default to the values given to the module itself.
+              The passwd, shadow and group files are read once for all of
+              them, C(useradd)/C(usermod) only run for users that need a
+              change, and on Linux all password changes are made with a single
+              C(chpasswd -e).
     comment:
         required: false
         description:
@@ -191,6 +203,15 @@ EXAMPLES = '''
 
 # Create a 2048-bit SSH key for user jsmith
 - user: name=jsmith generate_ssh_key=yes ssh_key_bits=2048
+
+# Make sure a set of users exists, all with a bash shell, and remove 'olduser'
+- user: shell=/bin/bash
+  args:
+    users:
+      - alice
+      - { name: bob, groups: "admins,developers", append: yes }
+      - { name: carol, uid: 1050, password: "$6$..." }
+      - { name: olduser, state: absent, remove: yes }
 '''
 
 import os
@@ -206,6 +227,150 @@ except:
     HAVE_SPWD=False
 
 
+# result of 'usermod --help' telling whether it knows --append, per binary
+USERMOD_HAS_APPEND = {}
+
+# options that may be given per user in users mode, and which of them are booleans
+USER_OPTIONS = ['state', 'name', 'uid', 'non_unique', 'group', 'groups', 'comment', 'home',
+                'shell', 'password', 'login_class', 'force', 'remove', 'createhome', 'system',
+                'move_home', 'append', 'generate_ssh_key', 'ssh_key_bits', 'ssh_key_type',
+                'ssh_key_file', 'ssh_key_comment', 'ssh_key_passphrase', 'update_password']
+USER_BOOLEANS = ['non_unique', 'force', 'remove', 'createhome', 'system', 'move_home',
+                 'append', 'generate_ssh_key']
+
+
+class UserFailed(Exception):
+    pass
+
+
+class UserExited(Exception):
+    pass
+
+
+class BatchModule(object):
+    """
+    Stands in for the AnsibleModule when several users are handled in one
+    run. It carries the options of a single user, and fail_json() and
+    exit_json() end the work on that user instead of the whole module.
+    """
+
+    def __init__(self, module, item):
+        self.module = module
+        self.params = dict(module.params)
+        if not isinstance(item, dict):
+            item = dict(name=item)
+        for (key, value) in item.items():
+            if key == 'user':
+                key = 'name'
+            if key not in USER_OPTIONS:
+                module.fail_json(msg="unsupported option %s for user %s" % (key, item.get('name')))
+            if key in USER_BOOLEANS:
+                value = module.boolean(value)
+            elif isinstance(value, list):
+                value = ','.join(value)
+            elif isinstance(value, (int, long)):
+                value = str(value)
+            self.params[key] = value
+        if self.params['state'] not in ('present', 'absent'):
+            module.fail_json(msg="state of user %s must be present or absent" % self.params['name'])
+
+    def __getattr__(self, attr):
+        return getattr(self.module, attr)
+
+    def fail_json(self, **kwargs):
+        raise UserFailed(kwargs)
+
+    def exit_json(self, **kwargs):
+        raise UserExited(kwargs)
+
+
+class AccountDatabase(object):
+    """
+    The passwd, shadow and group files parsed once and indexed by name and
+    id, so that handling many users costs neither a NSS lookup nor a file
+    scan per question. Names that are not in the files (LDAP, NIS...) are
+    still looked up through NSS.
+    """
+
+    PASSWD_FILE = '/etc/passwd'
+    GROUP_FILE = '/etc/group'
+
+    def __init__(self, shadow_file):
+        self.shadow_file = shadow_file
+        self.load()
+
+    def _read(self, path, count):
+        entries = []
+        if not os.access(path, os.R_OK):
+            return entries
+        f = open(path)
+        try:
+            for line in f:
+                line = line.rstrip('\n')
+                # skip comments and NIS compat entries
+                if not line or line[0] in '#+-':
+                    continue
+                fields = line.split(':')
+                if len(fields) >= count:
+                    entries.append(fields)
+        finally:
+            f.close()
+        return entries
+
+    def load(self):
+        self.users = {}
+        self.groups = {}
+        self.gids = {}
+        self.members = {}
+        self.shadow = {}
+        for fields in self._read(self.PASSWD_FILE, 7):
+            try:
+                self.users[fields[0]] = fields[:2] + [int(fields[2]), int(fields[3])] + fields[4:7]
+            except ValueError:
+                continue
+        for fields in self._read(self.GROUP_FILE, 4):
+            try:
+                entry = [fields[0], fields[1], int(fields[2]), filter(None, fields[3].split(','))]
+            except ValueError:
+                continue
+            self.groups[entry[0]] = entry
+            self.gids.setdefault(entry[2], entry)
+            for member in entry[3]:
+                self.members.setdefault(member, []).append(entry)
+        for fields in self._read(self.shadow_file, 2):
+            self.shadow[fields[0]] = fields[1]
+
+    def getpwnam(self, name):
+        if name in self.users:
+            return list(self.users[name])
+        try:
+            return list(pwd.getpwnam(name))
+        except KeyError:
+            return None
+
+    def getspnam(self, name):
+        return self.shadow.get(name)
+
+    def getgrnam(self, name):
+        if name in self.groups:
+            return list(self.groups[name])
+        try:
+            return list(grp.getgrnam(name))
+        except KeyError:
+            return None
+
+    def getgrgid(self, gid):
+        if gid in self.gids:
+            return list(self.gids[gid])
+        try:
+            return list(grp.getgrgid(gid))
+        except KeyError:
+            return None
+
+    def group_membership(self, name):
+        return [entry[0] for entry in self.members.get(name, [])]
+
+
 class User(object):
     """
     This is a generic User manipulation class that is subclassed
@@ -259,6 +424,12 @@ class User(object):
         else:
             self.ssh_file = os.path.join('.ssh', 'id_%s' % self.ssh_type)
 
+        # set in users mode: the shared account database, and whether
+        # passwords are left to one chpasswd run for all users
+        self.db = None
+        self.batch_passwords = False
+        self.pending_password = None
+
         # select whether we dump additional debug info through syslog
         self.syslogging = False
 
@@ -327,8 +498,11 @@ class User(object):
             cmd.append(self.shell)
 
         if self.password is not None:
-            cmd.append('-p')
-            cmd.append(self.password)
+            if self.batch_passwords:
+                self.pending_password = self.password
+            else:
+                cmd.append('-p')
+                cmd.append(self.password)
 
         if self.createhome:
             cmd.append('-m')
@@ -351,18 +525,23 @@ class User(object):
         if not os.access(usermod_path, os.X_OK):
             return False
 
+        if usermod_path in USERMOD_HAS_APPEND:
+            return USERMOD_HAS_APPEND[usermod_path]
+
         cmd = [usermod_path]
         cmd.append('--help')
         rc, data1, data2 = self.execute_command(cmd)
         helpout = data1 + data2
 
         # check if --append exists
+        USERMOD_HAS_APPEND[usermod_path] = False
         lines = helpout.split('\n')
         for line in lines:
             if line.strip().startswith('-a, --append'):
-                return True
+                USERMOD_HAS_APPEND[usermod_path] = True
+                break
 
-        return False
+        return USERMOD_HAS_APPEND[usermod_path]
 
 
 
@@ -433,8 +612,11 @@ class User(object):
             cmd.append(self.shell)
 
         if self.update_password == 'always' and self.password is not None and info[1] != self.password:
-            cmd.append('-p')
-            cmd.append(self.password)
+            if self.batch_passwords:
+                self.pending_password = self.password
+            else:
+                cmd.append('-p')
+                cmd.append(self.password)
 
         # skip if no changes to be made
         if len(cmd) == 1:
@@ -446,6 +628,10 @@ class User(object):
         return self.execute_command(cmd)
 
     def group_exists(self,group):
+        if self.db is not None:
+            if group.isdigit():
+                return self.db.getgrgid(int(group)) is not None
+            return self.db.getgrnam(group) is not None
         try:
             if group.isdigit():
                 if grp.getgrgid(int(group)):
@@ -459,6 +645,10 @@ class User(object):
     def group_info(self,group):
         if not self.group_exists(group):
             return False
+        if self.db is not None:
+            if group.isdigit():
+                return self.db.getgrgid(int(group))
+            return self.db.getgrnam(group)
         if group.isdigit():
             return list(grp.getgrgid(group))
         else:
@@ -479,12 +669,19 @@ class User(object):
     def user_group_membership(self):
         groups = []
         info = self.get_pwd_info()
+        if self.db is not None:
+            for group in self.db.group_membership(self.name):
+                if not info[3] == self.db.getgrnam(group)[2]:
+                    groups.append(group)
+            return groups
         for group in grp.getgrall():
             if self.name in group.gr_mem and not info[3] == group.gr_gid:
                 groups.append(group[0])
         return groups
 
     def user_exists(self):
+        if self.db is not None:
+            return self.db.getpwnam(self.name) is not None
         try:
             if pwd.getpwnam(self.name):
                 return True
@@ -494,6 +691,8 @@ class User(object):
     def get_pwd_info(self):
         if not self.user_exists():
             return False
+        if self.db is not None:
+            return self.db.getpwnam(self.name)
         return list(pwd.getpwnam(self.name))
 
     def user_info(self):
@@ -505,6 +704,8 @@ class User(object):
         return info
 
     def user_password(self):
+        if self.db is not None and self.db.getspnam(self.name) is not None:
+            return self.db.getspnam(self.name)
         passwd = ''
         if HAVE_SPWD:
             try:
@@ -1456,6 +1657,120 @@ class AIX(User):
 
 # ===========================================
 
+def manage_users(module):
+    db = None
+    chpasswd = module.get_bin_path('chpasswd')
+    results = []
+    users = []
+    passwords = []
+
+    for item in module.params['users']:
+        user = User(BatchModule(module, item))
+        if db is None:
+            db = AccountDatabase(user.SHADOWFILE)
+        user.db = db
+        # usermod/useradd -p is the generic way to set passwords, the
+        # platform specific classes have their own
+        user.batch_passwords = chpasswd is not None and user.platform == 'Generic'
+        result = dict(name=user.name, state=user.state, changed=False)
+        results.append(result)
+        try:
+            rc = None
+            if user.state == 'absent':
+                if user.user_exists():
+                    if module.check_mode:
+                        user.module.exit_json(changed=True)
+                    (rc, out, err) = user.remove_user()
+            elif not user.user_exists():
+                if module.check_mode:
+                    user.module.exit_json(changed=True)
+                (rc, out, err) = user.create_user()
+            else:
+                # modify user (note: this function is check mode aware)
+                (rc, out, err) = user.modify_user()
+            if rc is not None and rc != 0:
+                user.module.fail_json(msg=err, rc=rc)
+            result['changed'] = rc is not None
+        except UserExited, e:
+            result['changed'] = e.args[0].get('changed', False)
+        except UserFailed, e:
+            result.update(e.args[0])
+            result['failed'] = True
+            continue
+        if user.pending_password is not None:
+            passwords.append((user, result))
+        if user.password is not None:
+            result['password'] = 'NOT_LOGGING_PASSWORD'
+        if user.state == 'present':
+            users.append((user, result))
+
+    # set all changed passwords in one go
+    if passwords:
+        for (user, result) in passwords:
+            result['changed'] = True
+        if not module.check_mode:
+            data = ''.join(['%s:%s\n' % (user.name, user.pending_password) for (user, result) in passwords])
+            (rc, out, err) = module.run_command([chpasswd, '-e'], data=data)
+            if rc != 0:
+                for (user, result) in passwords:
+                    result['failed'] = True
+                    result['msg'] = err
+                    result['rc'] = rc
+
+    # one more read of the account files shows the outcome for everybody
+    if db is not None and [result for result in results if result['changed']]:
+        db.load()
+
+    for (user, result) in users:
+        if result.get('failed') or not user.user_exists():
+            continue
+        info = user.user_info()
+        result['uid'] = info[2]
+        result['group'] = info[3]
+        result['comment'] = info[4]
+        result['home'] = info[5]
+        result['shell'] = info[6]
+        if user.groups is not None:
+            result['groups'] = user.groups
+
+        # deal with ssh key
+        if user.sshkeygen:
+            (rc, out, err) = user.ssh_key_gen()
+            if rc is not None and rc != 0:
+                result['failed'] = True
+                result['msg'] = err
+                result['rc'] = rc
+                continue
+            if rc == 0:
+                result['changed'] = True
+            (rc, out, err) = user.ssh_key_fingerprint()
+            if rc == 0:
+                result['ssh_fingerprint'] = out.strip()
+            else:
+                result['ssh_fingerprint'] = err.strip()
+            result['ssh_key_file'] = user.get_ssh_key_path()
+            result['ssh_public_key'] = user.get_ssh_public_key()
+
+        # handle missing homedirs
+        if user.home is None:
+            user.home = info[5]
+        if not os.path.exists(user.home) and user.createhome:
+            if not module.check_mode:
+                try:
+                    user.create_homedir(user.home)
+                    user.chown_homedir(info[2], info[3], user.home)
+                except UserExited, e:
+                    result.update(e.args[0])
+                    continue
+            result['changed'] = True
+
+    failed = [result for result in results if result.get('failed')]
+    changed = bool([result for result in results if result['changed']])
+    if failed:
+        module.fail_json(msg="failed to manage user(s): %s" % ', '.join([r['name'] for r in failed]),
+            changed=changed, results=results)
+    module.exit_json(changed=changed, results=results)
+
 def main():
     ssh_defaults = {
             'bits': '2048',
@@ -1466,7 +1781,8 @@ def main():
     module = AnsibleModule(
         argument_spec = dict(
             state=dict(default='present', choices=['present', 'absent'], type='str'),
-            name=dict(required=True, aliases=['user'], type='str'),
+            name=dict(required=False, aliases=['user'], type='str'),
+            users=dict(required=False, type='list'),
             uid=dict(default=None, type='str'),
             non_unique=dict(default='no', type='bool'),
             group=dict(default=None, type='str'),
@@ -1494,9 +1810,14 @@ def main():
             ssh_key_passphrase=dict(default=None, type='str'),
             update_password=dict(default='always',choices=['always','on_create'],type='str')
         ),
+        required_one_of=[['name', 'users']],
+        mutually_exclusive=[['name', 'users']],
         supports_check_mode=True
     )
 
+    if module.params['users']:
+        manage_users(module)
+
     user = User(module)
 
     if user.syslogging:
@@ -29,58 +29,143 @@ version_added: "0.5"
 options:
   jid:
     description:
-      - Job or task identifier
-    required: true
+      - Job or task identifier. Required except for C(list) and for cleaning
+        up all finished jobs with C(cleanup).
+    required: false
     default: null
     aliases: []
   mode:
     description:
-      - if C(status), obtain the status; if C(cleanup), clean up the async job cache
-        located in C(~/.ansible_async/) for the specified job I(jid).
+      - if C(status), obtain the status; if C(wait), block until the job
+        finishes (or I(timeout) expires) and return its status; if C(list),
+        return all jobs known on the host; if C(kill), send I(signal) to the
+        process group of a running job; if C(cleanup), clean up the async
+        job cache located in C(~/.ansible_async/) for the specified job I(jid),
+        or for all finished jobs when no I(jid) is given.
     required: false
-    choices: [ "status", "cleanup" ]
+    choices: [ "status", "wait", "list", "kill", "cleanup" ]
     default: "status"
+  signal:
+    description:
+      - Signal sent to the job in C(kill) mode, by name.
+    required: false
+    default: "TERM"
+    version_added: "1.9"
+  timeout:
+    description:
+      - Maximum number of seconds to wait in C(wait) mode, 0 waits until the
+        job finishes.
+    required: false
+    default: 0
+    version_added: "1.9"
+  max_age:
+    description:
+      - When cleaning up all jobs, only remove jobs that finished at least this
+        many seconds ago.
+    required: false
+    default: 0
+    version_added: "1.9"
 notes:
     - See also U(http://docs.ansible.com/playbooks_async.html)
+    - Jobs are indexed in C(~/.ansible_async/jobs.db) when the python sqlite3
+      module is available; C(list) and C(kill) require it.
+    - The status of a finished job includes the CPU time and maximum resident
+      set size of the module in C(rusage) when the job index is available.
 requirements: []
 author: Michael DeHaan
 '''
 
+EXAMPLES = '''
+# Block until a job finishes instead of polling it
+- async_status: jid={{ job.ansible_job_id }} mode=wait timeout=600
+
+# Stop a job that is no longer needed
+- async_status: jid={{ job.ansible_job_id }} mode=kill
+
+# Remove every job that finished more than a day ago
+- async_status: mode=cleanup max_age=86400
+'''
+
 import datetime
 import traceback
+import errno
+import glob
+import select
+import time
+import signal
+import shutil
 
-def main():
+try:
+    import sqlite3
+    HAS_SQLITE = True
+except ImportError:
+    HAS_SQLITE = False
 
-    module = AnsibleModule(argument_spec=dict(
-        jid=dict(required=True),
-        mode=dict(default='status', choices=['status','cleanup']),
-    ))
+JOB_COLUMNS = ['jid', 'pid', 'state', 'started', 'ended', 'rc', 'results_file', 'utime', 'stime', 'maxrss']
 
-    mode = module.params['mode']
-    jid  = module.params['jid']
+# upper bound for a single wait on the notification FIFO, after which the job
+# is checked again in case its supervisor died without telling anyone
+WAIT_RECHECK = 5
 
-    # setup logging directory
-    logdir = os.path.expanduser("~/.ansible_async")
-    log_path = os.path.join(logdir, jid)
+# how long kill mode waits for the process group of a job to go away
+KILL_WAIT = 5
 
-    if not os.path.exists(log_path):
-        module.fail_json(msg="could not find job", ansible_job_id=jid)
+def job_store(logdir):
+    """ Open the job index written by async_wrapper, if there is one """
+    if not HAS_SQLITE or not os.path.exists(os.path.join(logdir, 'jobs.db')):
+        return None
+    try:
+        return sqlite3.connect(os.path.join(logdir, 'jobs.db'), timeout=30)
+    except sqlite3.Error:
+        return None
 
-    if mode == 'cleanup':
-        os.unlink(log_path)
-        module.exit_json(ansible_job_id=jid, erased=log_path)
+def get_job(db, jid):
+    if db is None:
+        return None
+    row = db.execute("SELECT %s FROM jobs WHERE jid = ?" % ", ".join(JOB_COLUMNS), (jid,)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(JOB_COLUMNS, row))
 
-    # NOT in cleanup mode, assume regular status mode
-    # no remote kill mode currently exists, but probably should
-    # consider log_path + ".pid" file and also unlink that above
+def group_alive(pgid):
+    try:
+        os.killpg(pgid, 0)
+    except OSError, e:
+        return e.errno != errno.ESRCH
+    return True
+
+def reap_orphan(db, job):
+    """ Mark a job as failed when it is recorded as running but no process
+    of its process group is left, and return the up to date job """
+    if job['state'] != 'running' or not job['pid'] or group_alive(job['pid']):
+        return job
+    db.execute("UPDATE jobs SET state = 'orphaned', ended = ? WHERE jid = ? AND state = 'running'",
+               (time.time(), job['jid']))
+    db.commit()
+    return get_job(db, job['jid'])
+
+def job_status(module, db, jid, log_path):
+    """ Return the status of a job as reported to the controller """
+    job = get_job(db, jid)
+    if job is not None:
+        job = reap_orphan(db, job)
+        if job['state'] == 'running':
+            # no need to read the results file while the job is running
+            return dict(results_file=log_path, ansible_job_id=jid, started=1, finished=0)
+
+    if not os.path.exists(log_path):
+        module.fail_json(msg="could not find job", ansible_job_id=jid)
 
     data = file(log_path).read()
     try:
         data = json.loads(data)
     except Exception, e:
+        if job is not None and job['state'] != 'running':
+            module.fail_json(ansible_job_id=jid, results_file=log_path, state=job['state'],
+                msg="Job ended (%s) without valid output: %s" % (job['state'], data))
         if data == '':
             # file not written yet?  That means it is running
-            module.exit_json(results_file=log_path, ansible_job_id=jid, started=1, finished=0)
+            return dict(results_file=log_path, ansible_job_id=jid, started=1, finished=0)
         else:
             module.fail_json(ansible_job_id=jid, results_file=log_path,
                 msg="Could not parse job output: %s" % data)
@@ -88,11 +173,187 @@ def main():
     if not 'started' in data:
         data['finished'] = 1
         data['ansible_job_id'] = jid
+        if job is not None and job['utime'] is not None:
+            data['rusage'] = dict(utime=job['utime'], stime=job['stime'], maxrss=job['maxrss'])
 
     # Fix error: TypeError: exit_json() keywords must be strings
-    data = dict([(str(k), v) for k, v in data.iteritems()])
+    return dict([(str(k), v) for k, v in data.iteritems()])
+
+def wait_for_job(module, db, jid, log_path, timeout):
+    """ Block until the job finishes. async_wrapper writes to every
+    <results file>.<pid>.wait FIFO when the job ends, so this wakes up as
+    soon as that happens instead of polling. """
+    if timeout:
+        deadline = time.time() + timeout
+    fifo = '%s.%d.wait' % (log_path, os.getpid())
+    os.mkfifo(fifo)
+    try:
+        # keep a write end open ourselves so the read end never sees EOF
+        rfd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        wfd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            while True:
+                # (re)check after the FIFO exists so a job finishing in
+                # between cannot be missed
+                data = job_status(module, db, jid, log_path)
+                if data.get('finished'):
+                    return data
+                wait = WAIT_RECHECK
+                if timeout:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return data
+                    wait = min(wait, remaining)
+                if select.select([rfd], [], [], wait)[0]:
+                    os.read(rfd, 1024)
+        finally:
+            os.close(rfd)
+            os.close(wfd)
+    finally:
+        os.unlink(fifo)
+
+def notify_waiters(log_path):
+    for fifo in glob.glob(log_path + '.*.wait'):
+        try:
+            fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError:
+            continue
+        try:
+            try:
+                os.write(fd, '1')
+            except OSError:
+                pass
+        finally:
+            os.close(fd)
+
+def kill_job(module, db, jid, log_path, signame):
+    """ Signal the process group of a running job. async_wrapper runs every
+    job in its own process group, led by the process recorded in the index.
+    The job is only recorded as killed once the whole group has exited, a
+    job that survives the signal stays running. """
+    signum = getattr(signal, 'SIG' + signame.upper().replace('SIG', '', 1), None)
+    if not isinstance(signum, int):
+        module.fail_json(msg="unknown signal %s" % signame)
+    job = get_job(db, jid)
+    if job is None:
+        module.fail_json(msg="job %s is not in the job index" % jid, ansible_job_id=jid)
+    job = reap_orphan(db, job)
+    if job['state'] != 'running':
+        module.exit_json(changed=False, ansible_job_id=jid, state=job['state'])
+    try:
+        os.killpg(job['pid'], signum)
+    except OSError, e:
+        if e.errno != errno.ESRCH:
+            module.fail_json(msg="could not signal job %s: %s" % (jid, e), ansible_job_id=jid)
+    deadline = time.time() + KILL_WAIT
+    while group_alive(job['pid']):
+        if time.time() >= deadline:
+            module.exit_json(changed=True, ansible_job_id=jid, state='running',
+                msg="job %s is still running after SIG%s" % (jid, signame.upper().replace('SIG', '', 1)))
+        time.sleep(0.1)
+    db.execute("UPDATE jobs SET state = 'killed', ended = ? WHERE jid = ? AND state = 'running'",
+               (time.time(), jid))
+    db.commit()
+    # the job cannot remove its private copy of the module any more
+    shutil.rmtree(log_path + '.run', True)
+    notify_waiters(log_path)
+    module.exit_json(changed=True, ansible_job_id=jid, state=get_job(db, jid)['state'])
+
+def list_jobs(db):
+    jobs = []
+    rows = db.execute("SELECT %s FROM jobs ORDER BY started" % ", ".join(JOB_COLUMNS)).fetchall()
+    for row in rows:
+        jobs.append(reap_orphan(db, dict(zip(JOB_COLUMNS, row))))
+    return jobs
+
+def remove_job(db, jid, log_path):
+    if os.path.exists(log_path):
+        os.unlink(log_path)
+    shutil.rmtree(log_path + '.run', True)
+    if db is not None:
+        db.execute("DELETE FROM jobs WHERE jid = ?", (jid,))
+        db.commit()
+
+def cleanup_jobs(db, logdir, max_age):
+    """ Remove every finished job older than max_age seconds, including
+    results files of finished jobs that are not in the job index """
+    cutoff = time.time() - max_age
+    erased = []
+    indexed = set()
+    if db is not None:
+        for job in list_jobs(db):
+            indexed.add(job['jid'])
+            if job['state'] != 'running' and job['ended'] is not None and job['ended'] <= cutoff:
+                remove_job(db, job['jid'], job['results_file'] or os.path.join(logdir, job['jid']))
+                erased.append(job['jid'])
+
+    for name in os.listdir(logdir):
+        path = os.path.join(logdir, name)
+        if name in indexed or name.startswith('jobs.db') or name.endswith('.wait') or not os.path.isfile(path):
+            continue
+        if os.path.getmtime(path) > cutoff:
+            continue
+        try:
+            data = json.loads(file(path).read())
+        except Exception:
+            continue
+        if not 'started' in data:
+            os.unlink(path)
+            erased.append(name)
+    return erased
+
+def main():
+
+    module = AnsibleModule(argument_spec=dict(
+        jid=dict(default=None),
+        mode=dict(default='status', choices=['status', 'wait', 'list', 'kill', 'cleanup']),
+        signal=dict(default='TERM'),
+        timeout=dict(default=0, type='int'),
+        max_age=dict(default=0, type='int'),
+    ))
+
+    mode = module.params['mode']
+    jid  = module.params['jid']
+
+    # setup logging directory
+    logdir = os.path.expanduser("~/.ansible_async")
+    db = job_store(logdir)
+
+    if mode in ('list', 'kill') and not HAS_SQLITE:
+        module.fail_json(msg="%s mode requires the python sqlite3 module" % mode)
+
+    if mode == 'list':
+        if db is None:
+            module.exit_json(changed=False, jobs=[])
+        module.exit_json(changed=False, jobs=list_jobs(db))
+
+    if mode == 'cleanup' and not jid:
+        if not os.path.isdir(logdir):
+            module.exit_json(changed=False, erased=[])
+        erased = cleanup_jobs(db, logdir, module.params['max_age'])
+        module.exit_json(changed=bool(erased), erased=erased)
+
+    if not jid:
+        module.fail_json(msg="jid is required in %s mode" % mode)
+
+    log_path = os.path.join(logdir, jid)
+
+    if not os.path.exists(log_path) and get_job(db, jid) is None:
+        module.fail_json(msg="could not find job", ansible_job_id=jid)
+
+    if mode == 'cleanup':
+        remove_job(db, jid, log_path)
+        module.exit_json(ansible_job_id=jid, erased=log_path)
+
+    if mode == 'kill':
+        if db is None:
+            module.fail_json(msg="job %s is not in the job index" % jid, ansible_job_id=jid)
+        kill_job(module, db, jid, log_path, module.params['signal'])
+
+    if mode == 'wait':
+        module.exit_json(**wait_for_job(module, db, jid, log_path, module.params['timeout']))
 
-    module.exit_json(**data)
+    module.exit_json(**job_status(module, db, jid, log_path))
 
 # import module snippets
 from ansible.module_utils.basic import *
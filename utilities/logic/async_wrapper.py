@@ -32,6 +32,38 @@ import traceback
 import signal
 import time
 import syslog
+import glob
+import errno
+import fcntl
+import resource
+import select
+import shutil
+
+try:
+    import sqlite3
+    HAS_SQLITE = True
+except ImportError:
+    HAS_SQLITE = False
+
+# only this much of a job's output is kept in the job store, the complete
+# output stays in the results file
+OUTPUT_LIMIT = 64 * 1024
+
+JOB_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        jid TEXT PRIMARY KEY,
+        pid INTEGER,
+        state TEXT,
+        started REAL,
+        ended REAL,
+        rc INTEGER,
+        results_file TEXT,
+        output TEXT,
+        utime REAL,
+        stime REAL,
+        maxrss INTEGER)""",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, ended)",
+]
 
 def daemonize_self():
     # daemonizing code: http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/66012
@@ -94,20 +126,95 @@ if not os.path.exists(logdir):
             "msg" : "could not create: %s" % logdir
         })
 
+def _job_store(logdir):
+    """ Open the sqlite job index kept next to the results files, or return
+    None if it cannot be used; the results files alone are enough then """
+    if not HAS_SQLITE:
+        return None
+    try:
+        db = sqlite3.connect(os.path.join(logdir, 'jobs.db'), timeout=30)
+        for statement in JOB_SCHEMA:
+            db.execute(statement)
+        db.commit()
+    except sqlite3.Error:
+        return None
+    return db
+
+def _record_job(logdir, jid, **fields):
+    db = _job_store(logdir)
+    if db is None:
+        return
+    try:
+        try:
+            db.execute("INSERT OR IGNORE INTO jobs (jid) VALUES (?)", (jid,))
+            names = fields.keys()
+            db.execute("UPDATE jobs SET %s WHERE jid = ?" % ", ".join(["%s = ?" % name for name in names]),
+                       [fields[name] for name in names] + [jid])
+            db.commit()
+        except sqlite3.Error, e:
+            syslog.syslog(syslog.LOG_ERR, 'could not record job %s: %s' % (jid, e))
+    finally:
+        db.close()
+
+def _notify_waiters(log_path):
+    """ Wake up async_status calls waiting on this job; each one listens on
+    its own FIFO named <results file>.<pid>.wait """
+    for fifo in glob.glob(log_path + '.*.wait'):
+        try:
+            fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError:
+            # the waiter is gone
+            continue
+        try:
+            try:
+                os.write(fd, '1')
+            except OSError:
+                pass
+        finally:
+            os.close(fd)
+
+def _startup_done():
+    """ Tell the process that launched us that the job is running, so it
+    can return to the controller """
+    global startup_fd
+    if startup_fd is None:
+        return
+    try:
+        os.write(startup_fd, '1')
+    except OSError:
+        pass
+    os.close(startup_fd)
+    startup_fd = None
+
+def _private_copy(path, run_dir):
+    """ Copy path into run_dir so the job does not depend on the controller's
+    temporary directory, which is removed as soon as we report back """
+    if not os.path.isfile(path):
+        return path
+    copy = os.path.join(run_dir, os.path.basename(path))
+    shutil.copy2(path, copy)
+    return copy
+
 def _run_command(wrapped_cmd, jid, log_path):
 
     logfile = open(log_path, "w")
     logfile.write(json.dumps({ "started" : 1, "ansible_job_id" : jid }))
     logfile.close()
+    _record_job(logdir, jid, pid=os.getpid(), state='running', started=time.time(), results_file=log_path)
     logfile = open(log_path, "w")
     result = {}
+    rc = None
+    run_dir = log_path + '.run'
 
     outdata = ''
     try:
-        cmd = shlex.split(wrapped_cmd)
-        script = subprocess.Popen(cmd, shell=False,
+        os.mkdir(run_dir, 0700)
+        cmd = [_private_copy(arg, run_dir) for arg in shlex.split(wrapped_cmd)]
+        script = subprocess.Popen(cmd, shell=False, close_fds=True,
             stdin=None, stdout=logfile, stderr=logfile)
+        _startup_done()
         script.communicate()
+        rc = script.returncode
         outdata = file(log_path).read()
         result = json.loads(outdata)
 
@@ -129,6 +236,48 @@ def _run_command(wrapped_cmd, jid, log_path):
         result['ansible_job_id'] = jid
         logfile.write(json.dumps(result))
     logfile.close()
+    _startup_done()
+    shutil.rmtree(run_dir, True)
+
+    if result.get('failed'):
+        state = 'failed'
+    else:
+        state = 'finished'
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    _record_job(logdir, jid, state=state, ended=time.time(), rc=rc, output=outdata[:OUTPUT_LIMIT],
+                utime=usage.ru_utime, stime=usage.ru_stime, maxrss=usage.ru_maxrss)
+    _notify_waiters(log_path)
+
+def _wait_for_child(pid, timeout):
+    """ Wait until pid exits or timeout seconds have passed and return
+    whether it exited. SIGCHLD wakes the select() through a pipe, so the
+    time limit is enforced to well under a second without polling. """
+    rfd, wfd = os.pipe()
+    for fd in (rfd, wfd):
+        fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def wakeup(signum, frame):
+        try:
+            os.write(wfd, '1')
+        except OSError:
+            pass
+
+    signal.signal(signal.SIGCHLD, wakeup)
+    deadline = time.time() + timeout
+    while True:
+        # checked after installing the handler, so an exit that happened
+        # earlier is not missed
+        if os.waitpid(pid, os.WNOHANG) != (0, 0):
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        try:
+            if select.select([rfd], [], [], remaining)[0]:
+                os.read(rfd, 512)
+        except select.error, e:
+            if e.args[0] != errno.EINTR:
+                raise
 
 # immediately exit this process, leaving an orphaned process
 # running which immediately forks a supervisory timing process
@@ -143,22 +292,33 @@ def debug(msg):
     #logger.warning(msg)
     pass
 
+# the job writes to this pipe once it has copied the module and its
+# arguments out of the launch directory and started it
+startup_rfd, startup_fd = os.pipe()
+
+# upper bound for the startup handshake, in case something goes badly wrong
+STARTUP_TIMEOUT = 30
+
 try:
     pid = os.fork()
     if pid:
         # Notify the overlord that the async process started
 
-        # we need to not return immmediately such that the launched command has an attempt
-        # to initialize PRIOR to ansible trying to clean up the launch directory (and argsfile)
-        # this probably could be done with some IPC later.  Modules should always read
-        # the argsfile at the very first start of their execution anyway
-        time.sleep(1)
+        # we need to not return before the launched command is independent of the
+        # launch directory (and argsfile) that ansible cleans up once we return
+        os.close(startup_fd)
+        try:
+            select.select([startup_rfd], [], [], STARTUP_TIMEOUT)
+        except select.error:
+            pass
+        os.close(startup_rfd)
         debug("Return async_wrapper task started.")
         print json.dumps({ "started" : 1, "ansible_job_id" : jid, "results_file" : log_path })
         sys.stdout.flush()
         sys.exit(0)
     else:
         # The actual wrapper process
+        os.close(startup_rfd)
 
         # Daemonize, so we keep on running
         daemonize_self()
@@ -169,27 +329,30 @@ try:
         sub_pid = os.fork()
         if sub_pid:
             # the parent stops the process after the time limit
-            remaining = int(time_limit)
+            os.close(startup_fd)
 
             # set the child process group id to kill all children
-            os.setpgid(sub_pid, sub_pid)
-
-            debug("Start watching %s (%s)"%(sub_pid, remaining))
-            time.sleep(5)
-            while os.waitpid(sub_pid, os.WNOHANG) == (0, 0):
-                debug("%s still running (%s)"%(sub_pid, remaining))
-                time.sleep(5)
-                remaining = remaining - 5
-                if remaining <= 0:
-                    debug("Now killing %s"%(sub_pid))
-                    os.killpg(sub_pid, signal.SIGKILL)
-                    debug("Sent kill to group %s"%sub_pid)
-                    time.sleep(1)
-                    sys.exit(0)
+            try:
+                os.setpgid(sub_pid, sub_pid)
+            except OSError:
+                # the child got there first
+                pass
+
+            debug("Start watching %s (%s)"%(sub_pid, time_limit))
+            if not _wait_for_child(sub_pid, float(time_limit)):
+                debug("Now killing %s"%(sub_pid))
+                os.killpg(sub_pid, signal.SIGKILL)
+                debug("Sent kill to group %s"%sub_pid)
+                os.waitpid(sub_pid, 0)
+                _record_job(logdir, jid, state='timeout', ended=time.time())
+                _notify_waiters(log_path)
+                shutil.rmtree(log_path + '.run', True)
+                sys.exit(0)
             debug("Done in kid B.")
             os._exit(0)
         else:
             # the child process runs the actual module
+            os.setpgid(0, 0)
             debug("Start module (%s)"%os.getpid())
             _run_command(cmd, jid, log_path)
             debug("Module complete (%s)"%os.getpid())
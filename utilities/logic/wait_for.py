@@ -24,6 +24,9 @@ import time
 import sys
 import re
 import binascii
+import errno
+import select
+import struct
 
 HAS_PSUTIL = False
 try:
@@ -50,6 +53,8 @@ description:
      - In 1.8 and later, this module can also be used to wait for active
        connections to be closed before continuing, useful if a node
        is being rotated out of a load balancer pool.
+     - In 1.9 and later, this module can wait for several C(host:port)
+       targets at once, and waits for files are woken up by inotify on Linux.
 version_added: "0.7"
 options:
   host:
@@ -94,6 +99,20 @@ options:
     required: false
     description:
       - list of hosts or IPs to ignore when looking for active TCP connections for C(drained) state
+  targets:
+    version_added: "1.9"
+    required: false
+    description:
+      - list of C(host:port) pairs (C([address]:port) for IPv6) to wait for concurrently, instead of
+        a single I(host) and I(port). A bare port number uses I(host). Only C(started) and C(stopped)
+        are supported and the time each target took is returned in C(ready).
+  sleep:
+    version_added: "1.9"
+    required: false
+    default: 1
+    description:
+      - number of seconds to sleep between checks. Waits on files are woken up earlier by inotify
+        when it is available.
 notes:
   - The ability to use search_regex with a port connection was added in 1.7.
 requirements: []
@@ -123,6 +142,9 @@ EXAMPLES = '''
 # wait until the process is finished and pid was destroyed
 - wait_for: path=/proc/3466/status state=absent
 
+# wait for a set of backends to accept connections, checking every 0.2 seconds
+- wait_for: targets=db1:5432,db2:5432,cache1:6379 sleep=0.2
+
 # Wait 300 seconds for port 22 to become open and contain "OpenSSH", don't start checking for 10 seconds
 - local_action: wait_for port=22 host="{{ inventory_hostname }}" search_regex=OpenSSH delay=10
 
@@ -196,6 +218,11 @@ class LinuxTCPConnectionInfo(TCPConnectionInfo):
     This is a TCP Connection Info evaluation strategy class
     that utilizes information from Linux's procfs. While less universal,
     does allow Linux targets to not require an additional library.
+
+    Connections are counted with a NETLINK_SOCK_DIAG (inet_diag) dump
+    when the kernel supports it. The kernel then only returns sockets in
+    the wanted states on the wanted local port, instead of every socket on
+    the host as /proc/net/tcp does, which is read as a fallback.
     """
     platform = 'Linux'
     distribution = None
@@ -212,36 +239,317 @@ class LinuxTCPConnectionInfo(TCPConnectionInfo):
     remote_address_field = 2
     connection_state_field = 3
 
+    # linux/netlink.h, linux/sock_diag.h and linux/inet_diag.h
+    NETLINK_SOCK_DIAG = 4
+    NLMSG_ERROR = 2
+    NLMSG_DONE = 3
+    NLM_F_REQUEST = 0x1
+    NLM_F_DUMP = 0x300
+    SOCK_DIAG_BY_FAMILY = 20
+    INET_DIAG_REQ_BYTECODE = 1
+    INET_DIAG_BC_S_GE = 2
+    INET_DIAG_BC_S_LE = 3
+    nlmsghdr = struct.Struct('=IHHII')
+    nlattr = struct.Struct('=HH')
+    bc_op = struct.Struct('=BBH')
+    # family, protocol, ext, pad, states, then the socket id: sport, dport
+    # (network order), src, dst, interface and cookie
+    inet_diag_req_v2 = struct.Struct('=BBBBI2s2s16s16sI8s')
+    # family, state, timer, retrans, then the socket id
+    inet_diag_msg = struct.Struct('=BBBB2s2s16s16sI8s')
+
     def __init__(self, module):
         self.module = module
         (self.family, self.ip) = _convert_host_to_hex(module.params['host'])
         self.port = "%0.4X" % int(module.params['port'])
         self.exclude_ips = self._get_exclude_ips()
+        # the same addresses in the binary form netlink uses
+        self.port_number = int(module.params['port'])
+        self.raw_ip = socket.inet_pton(*_convert_host_to_ip(module.params['host']))
+        self.raw_exclude_ips = [ socket.inet_pton(*_convert_host_to_ip(h)) for h in module.params['exclude_hosts'] or [] ]
+        self.use_netlink = hasattr(socket, 'AF_NETLINK')
 
     def _get_exclude_ips(self):
         if self.module.params['exclude_hosts'] is None:
             return []
         exclude_hosts = self.module.params['exclude_hosts']
-        return [ _convert_host_to_hex(h) for h in exclude_hosts ]
+        return [ _convert_host_to_hex(h)[1] for h in exclude_hosts ]
 
     def get_active_connections_count(self):
+        if self.use_netlink:
+            try:
+                return self._get_active_connections_count_netlink()
+            except (socket.error, OSError, struct.error):
+                # no inet_diag support, stick to procfs from now on
+                self.use_netlink = False
+        return self._get_active_connections_count_procfs()
+
+    def _netlink_request(self):
+        """
+        Build a SOCK_DIAG_BY_FAMILY dump request for TCP sockets in the
+        states we count, with bytecode making the kernel skip every socket
+        whose local port is not ours (sport >= port and sport <= port).
+        """
+        states = 0
+        for state in self.connection_states:
+            states |= 1 << int(state, 16)
+        ge = self.bc_op.pack(self.INET_DIAG_BC_S_GE, 8, 20) + self.bc_op.pack(0, 0, self.port_number)
+        le = self.bc_op.pack(self.INET_DIAG_BC_S_LE, 8, 12) + self.bc_op.pack(0, 0, self.port_number)
+        bytecode = ge + le
+        req = self.inet_diag_req_v2.pack(self.family, socket.IPPROTO_TCP, 0, 0, states,
+                                         '', '', '', '', 0, '\xff' * 8)
+        attr = self.nlattr.pack(self.nlattr.size + len(bytecode), self.INET_DIAG_REQ_BYTECODE) + bytecode
+        length = self.nlmsghdr.size + len(req) + len(attr)
+        return self.nlmsghdr.pack(length, self.SOCK_DIAG_BY_FAMILY,
+                                  self.NLM_F_REQUEST | self.NLM_F_DUMP, 1, 0) + req + attr
+
+    def _get_active_connections_count_netlink(self):
         active_connections = 0
+        match_all = self.raw_ip == '\x00' * len(self.raw_ip)
+        addr_len = len(self.raw_ip)
+        s = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, self.NETLINK_SOCK_DIAG)
+        try:
+            s.sendto(self._netlink_request(), (0, 0))
+            while True:
+                data = s.recv(65536)
+                offset = 0
+                while offset + self.nlmsghdr.size <= len(data):
+                    (length, msg_type, flags, seq, pid) = self.nlmsghdr.unpack_from(data, offset)
+                    if msg_type == self.NLMSG_DONE:
+                        return active_connections
+                    if msg_type == self.NLMSG_ERROR:
+                        error = -struct.unpack_from('=i', data, offset + self.nlmsghdr.size)[0]
+                        raise OSError(error, os.strerror(error))
+                    (family, state, timer, retrans, sport, dport, src, dst, ifindex, cookie) = \
+                        self.inet_diag_msg.unpack_from(data, offset + self.nlmsghdr.size)
+                    if match_all or src[:addr_len] == self.raw_ip:
+                        if dst[:addr_len] not in self.raw_exclude_ips:
+                            active_connections += 1
+                    offset += (length + 3) & ~3
+                if not data:
+                    return active_connections
+        finally:
+            s.close()
+
+    def _get_active_connections_count_procfs(self):
+        active_connections = 0
+        # cheap substring test before splitting, most lines are for other ports
+        port_marker = ':%s ' % self.port
         f = open(self.source_file[self.family])
-        for tcp_connection in f.readlines():
-            tcp_connection = tcp_connection.strip().split()
-            if tcp_connection[self.local_address_field] == 'local_address':
-                continue
-            if tcp_connection[self.connection_state_field] not in self.connection_states:
-                continue
-            (local_ip, local_port) = tcp_connection[self.local_address_field].split(':')
-            if self.port == local_port and self.ip in [self.match_all_ips[self.family], local_ip]:
-                 (remote_ip, remote_port) = tcp_connection[self.remote_address_field].split(':')
-                 if remote_ip not in self.exclude_ips:
-                     active_connections += 1
-        f.close()
+        try:
+            for tcp_connection in f:
+                if port_marker not in tcp_connection:
+                    continue
+                tcp_connection = tcp_connection.split()
+                if tcp_connection[self.connection_state_field] not in self.connection_states:
+                    continue
+                (local_ip, local_port) = tcp_connection[self.local_address_field].split(':')
+                if self.port == local_port and self.ip in [self.match_all_ips[self.family], local_ip]:
+                     (remote_ip, remote_port) = tcp_connection[self.remote_address_field].split(':')
+                     if remote_ip not in self.exclude_ips:
+                         active_connections += 1
+        finally:
+            f.close()
         return active_connections
 
 
+class FileWatcher(object):
+    """
+    Waits for a file to change. On Linux the parent directory of the file is
+    watched with inotify, which reports the file being created, written,
+    renamed or removed, so waits end as soon as something happens. Elsewhere,
+    and for files inotify cannot see such as those in /proc, wait() is a
+    plain sleep.
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+
+    def __init__(self, path):
+        self.fd = None
+        if not sys.platform.startswith('linux'):
+            return
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+            fd = libc.inotify_init()
+        except (ImportError, OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        mask = (self.IN_MODIFY | self.IN_ATTRIB | self.IN_CLOSE_WRITE | self.IN_MOVED_FROM |
+                self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE | self.IN_DELETE_SELF | self.IN_MOVE_SELF)
+        watched = os.path.dirname(os.path.abspath(path))
+        if isinstance(watched, unicode):
+            # ctypes would pass unicode as a wide string
+            watched = watched.encode(sys.getfilesystemencoding() or 'utf-8')
+        if libc.inotify_add_watch(fd, watched, mask) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    def wait(self, timeout):
+        if timeout <= 0:
+            return
+        if self.fd is None:
+            time.sleep(timeout)
+            return
+        if select.select([self.fd], [], [], timeout)[0]:
+            # the events themselves do not matter, the caller checks the file again
+            os.read(self.fd, 65536)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FileTail(object):
+    """
+    Searches a file for a regex incrementally. Only data appended since the
+    previous search is read and matched, plus a bounded overlap so matches
+    spanning the boundary are still found. A truncated or replaced file is
+    searched again from the start.
+    """
+    chunk_size = 1024 * 1024
+    overlap = 64 * 1024
+
+    def __init__(self, path, regex):
+        self.path = path
+        self.regex = regex
+        self.inode = None
+        self.offset = 0
+        self.carry = ''
+        self.pos = 0
+
+    def search(self):
+        f = open(self.path)
+        try:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self.inode or st.st_size < self.offset:
+                self.inode = st.st_ino
+                self.offset = 0
+                self.carry = ''
+                self.pos = 0
+            f.seek(self.offset)
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    return False
+                self.offset += len(data)
+                text = self.carry + data
+                if self.regex.search(text, self.pos):
+                    return True
+                # the carry keeps one character before the overlap that is
+                # only context, so ^ and lookbehinds at the start of the
+                # overlap see what precedes it in the file
+                if len(text) > self.overlap + 1:
+                    self.carry = text[-self.overlap - 1:]
+                    self.pos = 1
+                else:
+                    self.carry = text
+        finally:
+            f.close()
+
+
+def _parse_target(target, default_host):
+    """
+    Split a host:port target, accepting [address]:port for IPv6 and a bare
+    port for default_host
+    """
+    target = str(target).strip()
+    if target.startswith('['):
+        host, port = target[1:].split(']:', 1)
+    elif ':' in target:
+        host, port = target.rsplit(':', 1)
+    else:
+        host, port = default_host, target
+    return (host, int(port))
+
+def _probe_targets(targets, connect_timeout):
+    """
+    Connect to all targets at once using non-blocking sockets and return the
+    targets that accepted a connection within connect_timeout seconds.
+    """
+    pending = {}
+    accepted = []
+    for target in targets:
+        try:
+            (family, socktype, proto, canonname, addr) = socket.getaddrinfo(target[0], target[1], 0, socket.SOCK_STREAM)[0]
+            s = socket.socket(family, socktype, proto)
+        except socket.error:
+            continue
+        s.setblocking(0)
+        err = s.connect_ex(addr)
+        if err == 0:
+            accepted.append(target)
+            s.close()
+        elif err in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            pending[s.fileno()] = (s, target)
+        else:
+            s.close()
+
+    deadline = time.time() + connect_timeout
+    while pending:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            writable = select.select([], pending.keys(), [], remaining)[1]
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        for fd in writable:
+            (s, target) = pending.pop(fd)
+            if s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                accepted.append(target)
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+            s.close()
+    for (s, target) in pending.values():
+        s.close()
+    return accepted
+
+def wait_for_targets(module, targets, state, start, timeout, connect_timeout, sleep):
+    """
+    Wait until every target accepts connections (started) or refuses them
+    (stopped), probing all outstanding targets concurrently. Returns the
+    number of seconds each target took.
+    """
+    end = start + timeout
+    pending = list(targets)
+    ready = {}
+    while pending:
+        accepted = _probe_targets(pending, connect_timeout)
+        if state == 'started':
+            done = accepted
+        else:
+            done = [t for t in pending if t not in accepted]
+        now = time.time()
+        for target in done:
+            ready['%s:%s' % target] = round(now - start, 3)
+            pending.remove(target)
+        if not pending:
+            break
+        if now >= end:
+            names = ', '.join(['%s:%s' % t for t in pending])
+            if state == 'started':
+                module.fail_json(msg="Timeout when waiting for %s" % names, ready=ready, elapsed=int(now - start))
+            else:
+                module.fail_json(msg="Timeout when waiting for %s to stop." % names, ready=ready, elapsed=int(now - start))
+        time.sleep(min(sleep, end - now))
+    return ready
+
 def _convert_host_to_ip(host):
     """
     Perform forward DNS resolution on host, IP will give the same IP
@@ -305,7 +613,9 @@ def main():
             path=dict(default=None),
             search_regex=dict(default=None),
             state=dict(default='started', choices=['started', 'stopped', 'present', 'absent', 'drained']),
-            exclude_hosts=dict(default=None, type='list')
+            exclude_hosts=dict(default=None, type='list'),
+            targets=dict(default=None, type='list'),
+            sleep=dict(default=1),
         ),
     )
 
@@ -322,6 +632,11 @@ def main():
     state = params['state']
     path = params['path']
     search_regex = params['search_regex']
+    sleep = float(params['sleep'])
+    if params['targets']:
+        targets = [ _parse_target(t, host) for t in params['targets'] ]
+    else:
+        targets = None
 
     if port and path:
         module.fail_json(msg="port and path parameter can not both be passed to wait_for")
@@ -331,12 +646,27 @@ def main():
         module.fail_json(msg="state=drained should only be used for checking a port in the wait_for module")
     if params['exclude_hosts'] is not None and state != 'drained':
         module.fail_json(msg="exclude_hosts should only be with state=drained")
+    if targets and (port or path):
+        module.fail_json(msg="targets can not be combined with port or path in the wait_for module")
+    if targets and (search_regex or state not in ['started', 'stopped']):
+        module.fail_json(msg="targets can only be used with state=started or state=stopped and without search_regex")
 
     start = datetime.datetime.now()
+    start_time = time.time()
 
     if delay:
         time.sleep(delay)
 
+    if targets:
+        ready = wait_for_targets(module, targets, state, start_time, timeout, connect_timeout, sleep)
+        elapsed = datetime.datetime.now() - start
+        module.exit_json(state=state, targets=params['targets'], ready=ready, elapsed=elapsed.seconds)
+
+    if path:
+        watcher = FileWatcher(path)
+        if search_regex:
+            tail = FileTail(path, re.compile(search_regex, re.MULTILINE))
+
     if state in [ 'stopped', 'absent' ]:
         ### first wait for the stop condition
         end = start + datetime.timedelta(seconds=timeout)
@@ -346,7 +676,7 @@ def main():
                 try:
                     f = open(path)
                     f.close()
-                    time.sleep(1)
+                    watcher.wait(sleep)
                     pass
                 except IOError:
                     break
@@ -357,7 +687,7 @@ def main():
                     s.connect( (host, port) )
                     s.shutdown(socket.SHUT_RDWR)
                     s.close()
-                    time.sleep(1)
+                    time.sleep(sleep)
                 except:
                     break
         else:
@@ -376,23 +706,19 @@ def main():
                     os.stat(path)
                     if search_regex:
                         try:
-                            f = open(path)
-                            try:
-                                if re.search(search_regex, f.read(), re.MULTILINE):
-                                    break
-                                else:
-                                    time.sleep(1)
-                            finally:
-                                f.close()
+                            if tail.search():
+                                break
+                            else:
+                                watcher.wait(sleep)
                         except IOError:
-                            time.sleep(1)
+                            watcher.wait(sleep)
                             pass
                     else:
                         break
                 except OSError, e:
                     # File not present
                     if e.errno == 2:
-                        time.sleep(1)
+                        watcher.wait(sleep)
                     else:
                         elapsed = datetime.datetime.now() - start
                         module.fail_json(msg="Failed to stat %s, %s" % (path, e.strerror), elapsed=elapsed.seconds)
@@ -420,7 +746,7 @@ def main():
                         s.close()
                         break
                 except:
-                    time.sleep(1)
+                    time.sleep(sleep)
                     pass
         else:
             elapsed = datetime.datetime.now() - start
@@ -445,7 +771,7 @@ def main():
                     break
             except IOError:
                 pass
-            time.sleep(1)
+            time.sleep(sleep)
         else:
             elapsed = datetime.datetime.now() - start
             module.fail_json(msg="Timeout when waiting for %s:%s to drain" % (host, port), elapsed=elapsed.seconds)
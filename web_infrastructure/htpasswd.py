@@ -32,10 +32,20 @@ options:
     description:
       - Path to the file that contains the usernames and passwords
   name:
-    required: true
+    required: false
     aliases: [ username ]
     description:
-      - User name to add or remove
+      - User name to add or remove. B(One of name and users is required.)
+  users:
+    required: false
+    version_added: "1.9"
+    description:
+      - Mapping of user names to passwords, to manage many users of the file
+        in one run. With C(state=present) every user is added or has its
+        password updated, a null password leaves an existing user alone. With
+        C(state=absent) the users are removed. The file is loaded once, the
+        passwords are checked (and new ones hashed) in a pool of processes
+        and the file is written once, atomically. Needs passlib 1.6 or later.
   password:
     required: false
     description:
@@ -74,12 +84,25 @@ EXAMPLES = """
 - htpasswd: path=/etc/nginx/passwdfile name=janedoe password=9s36?;fyNp owner=root group=www-data mode=0640
 # Remove a user from a password file
 - htpasswd: path=/etc/apache2/passwdfile name=foobar state=absent
+# Make sure several users are in a password file
+- htpasswd:
+    path: /etc/nginx/passwdfile
+    crypt_scheme: sha512_crypt
+    users:
+      janedoe: 9s36?;fyNp
+      johndoe: "{{ johndoe_password }}"
 """
 
 
 import os
+import tempfile
 from distutils.version import StrictVersion
 
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
 try:
     from passlib.apache import HtpasswdFile
     import passlib
@@ -88,6 +111,11 @@ except ImportError:
 else:
     passlib_installed = True
 
+try:
+    from passlib.apache import htpasswd_context
+except ImportError:
+    htpasswd_context = None
+
 
 def create_missing_directories(dest):
     destpath = os.path.dirname(dest)
@@ -160,6 +188,125 @@ def absent(dest, username, check_mode):
         return ("Remove %s" % username, True)
 
 
+def verify_password(args):
+    """ Pool worker: whether password matches hash """
+    (password, hash) = args
+    return htpasswd_context.verify(password, hash)
+
+
+def hash_password(args):
+    """ Pool worker: hash password with scheme (None for the default) """
+    (password, scheme) = args
+    if hasattr(htpasswd_context, 'hash'):
+        return htpasswd_context.hash(password, scheme=scheme)
+    return htpasswd_context.encrypt(password, scheme=scheme)
+
+
+def run_pool(func, items):
+    """ map() in a pool of processes, as hashing is CPU bound """
+    if len(items) < 2 or multiprocessing is None:
+        return map(func, items)
+    try:
+        pool = multiprocessing.Pool(min(len(items), multiprocessing.cpu_count()))
+    except (OSError, NotImplementedError):
+        # no working semaphores (/dev/shm) on this system
+        return map(func, items)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def write_htpasswd(module, dest, records):
+    """ replace dest with the (user, hash) records, atomically """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)),
+                               prefix='.%s.' % os.path.basename(dest))
+    f = os.fdopen(fd, 'w')
+    try:
+        for (user, hash) in records:
+            f.write('%s:%s\n' % (user, hash))
+    finally:
+        f.close()
+    if not os.path.exists(dest):
+        # mkstemp creates 0600, a new file gets the usual umask permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0666 & ~umask)
+    module.atomic_move(tmp, dest)
+
+
+def users_present(module, dest, users, crypt_scheme, create, check_mode):
+    """ Ensures all users of the mapping are present with their password
+
+    Returns (msg, changed, results) """
+    exists = os.path.exists(dest)
+    if not exists and not create:
+        raise ValueError('Destination %s does not exist' % dest)
+    if exists:
+        ht = HtpasswdFile(dest, new=False)
+    else:
+        ht = HtpasswdFile(dest, new=True)
+    if crypt_scheme:
+        # fail early on unknown schemes, like HtpasswdFile does
+        htpasswd_context.handler(crypt_scheme)
+
+    current = ht.users()
+    for (name, password) in users.items():
+        if password is None and name not in current:
+            raise ValueError('A password is needed to add %s' % name)
+
+    # check the passwords of the existing users all at once
+    check = [(name, password) for (name, password) in sorted(users.items())
+             if name in current and password is not None]
+    matches = run_pool(verify_password, [(password, ht.get_hash(name)) for (name, password) in check])
+    update = [name for ((name, password), match) in zip(check, matches) if not match]
+    add = sorted([name for name in users if name not in current])
+
+    results = []
+    for name in sorted(users):
+        if name in add:
+            results.append(dict(name=name, changed=True, msg="Add %s" % name))
+        elif name in update:
+            results.append(dict(name=name, changed=True, msg="Update %s" % name))
+        else:
+            results.append(dict(name=name, changed=False, msg="%s already present" % name))
+
+    if not add and not update:
+        return ("All users already present", False, results)
+    if not check_mode:
+        if not exists:
+            create_missing_directories(dest)
+        changed = update + add
+        hashes = dict(zip(changed, run_pool(hash_password, [(users[name], crypt_scheme) for name in changed])))
+        records = [(name, hashes.get(name) or ht.get_hash(name)) for name in current]
+        records.extend([(name, hashes[name]) for name in add])
+        write_htpasswd(module, dest, records)
+    return ("Added %d and updated %d user(s)" % (len(add), len(update)), True, results)
+
+
+def users_absent(module, dest, users, check_mode):
+    """ Ensures no user of the mapping is present
+
+    Returns (msg, changed, results) """
+    if not os.path.exists(dest):
+        raise ValueError("%s does not exists" % dest)
+    ht = HtpasswdFile(dest, new=False)
+    current = ht.users()
+    results = []
+    for name in sorted(users):
+        if name in current:
+            results.append(dict(name=name, changed=True, msg="Remove %s" % name))
+        else:
+            results.append(dict(name=name, changed=False, msg="%s not present" % name))
+    remove = [name for name in users if name in current]
+    if not remove:
+        return ("No user present", False, results)
+    if not check_mode:
+        write_htpasswd(module, dest, [(name, ht.get_hash(name)) for name in current if name not in users])
+    return ("Removed %d user(s)" % len(remove), True, results)
+
+
 def check_file_attrs(module, changed, message):
 
     file_args = module.load_file_common_arguments(module.params)
@@ -176,7 +323,8 @@ def check_file_attrs(module, changed, message):
 def main():
     arg_spec = dict(
         path=dict(required=True, aliases=["dest", "destfile"]),
-        name=dict(required=True, aliases=["username"]),
+        name=dict(required=False, aliases=["username"]),
+        users=dict(required=False, type='dict'),
         password=dict(required=False, default=None),
         crypt_scheme=dict(required=False, default=None),
         state=dict(required=False, default="present"),
@@ -185,6 +333,8 @@ def main():
     )
     module = AnsibleModule(argument_spec=arg_spec,
                            add_file_common_args=True,
+                           required_one_of=[['name', 'users']],
+                           mutually_exclusive=[['name', 'users']],
                            supports_check_mode=True)
 
     path = module.params['path']
@@ -198,6 +348,24 @@ def main():
     if not passlib_installed:
         module.fail_json(msg="This module requires the passlib Python library")
 
+    users = module.params['users']
+    if users:
+        if htpasswd_context is None or StrictVersion(passlib.__version__) < StrictVersion('1.6'):
+            module.fail_json(msg="users requires passlib 1.6 or later")
+        try:
+            if state == 'present':
+                (msg, changed, results) = users_present(module, path, users, crypt_scheme, create, check_mode)
+            elif state == 'absent':
+                (msg, changed, results) = users_absent(module, path, users, check_mode)
+            else:
+                module.fail_json(msg="Invalid state: %s" % state)
+
+            if not check_mode or os.path.exists(path):
+                (msg, changed) = check_file_attrs(module, changed, msg)
+            module.exit_json(msg=msg, changed=changed, results=results)
+        except Exception, e:
+            module.fail_json(msg=str(e))
+
     try:
         if state == 'present':
             (msg, changed) = present(path, username, password, crypt_scheme, create, check_mode)
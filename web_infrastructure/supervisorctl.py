@@ -71,9 +71,24 @@ options:
     required: false
     default: null
     version_added: "1.4"
+  use_xmlrpc:
+    description:
+      - Talk to supervisord over its XML-RPC interface, at I(server_url) or
+        the C(serverurl) of the C([supervisorctl]) section of I(config)
+        (C(unix://) sockets included), instead of running C(supervisorctl)
+        for every process. The state of all processes is fetched with one
+        call, all processes are started or stopped with one multicall and
+        then waited for together. When supervisord cannot be connected to
+        this way the module falls back to C(supervisorctl); errors reported
+        by supervisord itself fail the task.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+    version_added: "1.9"
 notes:
   - When C(state) = I(present), the module will call C(supervisorctl reread) then C(supervisorctl add) if the program/group does not exist.
   - When C(state) = I(restarted), the module will call C(supervisorctl update) then call C(supervisorctl restart).
+  - The XML-RPC interface needs Python 2.7, older versions always use C(supervisorctl).
 requirements: [ "supervisorctl" ]
 author: Matt Wright, Aaron Wang <inetfuture@gmail.com>
 '''
@@ -90,8 +105,222 @@ EXAMPLES = '''
 
 # Restart my_app, connecting to supervisord with credentials and server URL.
 - supervisorctl: name=my_app state=restarted username=test password=testpass server_url=http://localhost:9001
+
+# Start all programs of a group over XML-RPC instead of running supervisorctl.
+- supervisorctl: name='my_apps:' state=started use_xmlrpc=yes
 '''
 
+import socket
+import time
+import httplib
+import urllib
+import xmlrpclib
+import ConfigParser
+
+# supervisord defaults, as used by supervisorctl
+DEFAULT_SERVER_URL = 'http://localhost:9001'
+DEFAULT_CONFIGS = ['/etc/supervisord.conf', '/etc/supervisor/supervisord.conf']
+
+# supervisord fault codes that mean there was nothing to do
+ALREADY_STARTED = 60
+NOT_RUNNING = 70
+
+# how long to wait for processes to reach their state, and how often to look
+RPC_WAIT_TIMEOUT = 600
+RPC_POLL_INTERVAL = 0.2
+
+STOPPED_STATES = ('STOPPED', 'EXITED', 'FATAL', 'UNKNOWN')
+
+
+class RPCUnavailable(Exception):
+    pass
+
+
+class UnixStreamHTTPConnection(httplib.HTTPConnection):
+    def __init__(self, path):
+        httplib.HTTPConnection.__init__(self, 'localhost')
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+class UnixStreamTransport(xmlrpclib.Transport):
+    """ XML-RPC over the unix socket of supervisord """
+
+    def __init__(self, path):
+        xmlrpclib.Transport.__init__(self)
+        self.socket_path = path
+
+    def make_connection(self, host):
+        # keeps the Authorization header get_host_info() makes of user:pass@
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        return UnixStreamHTTPConnection(self.socket_path)
+
+
+def read_supervisorctl_config(config):
+    """ serverurl, username and password of the [supervisorctl] section """
+    paths = DEFAULT_CONFIGS
+    if config:
+        paths = [os.path.expanduser(config)]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        parser = ConfigParser.RawConfigParser()
+        try:
+            parser.read(path)
+        except ConfigParser.Error:
+            return {}
+        if not parser.has_section('supervisorctl'):
+            return {}
+        here = os.path.dirname(os.path.abspath(path))
+        values = {}
+        for key in ('serverurl', 'username', 'password'):
+            if parser.has_option('supervisorctl', key):
+                values[key] = parser.get('supervisorctl', key).replace('%(here)s', here)
+        return values
+    return {}
+
+
+def connect_rpc(module, config, server_url, username, password):
+    """ A ServerProxy for supervisord, RPCUnavailable if it cannot be
+    connected to. A fault returned by supervisord is raised as is. """
+    if not hasattr(xmlrpclib.Transport, 'single_request'):
+        raise RPCUnavailable('python 2.7 or later needed')
+    values = read_supervisorctl_config(config)
+    server_url = server_url or values.get('serverurl') or DEFAULT_SERVER_URL
+    username = username or values.get('username')
+    password = password or values.get('password')
+
+    auth = ''
+    if username:
+        auth = '%s:%s@' % (urllib.quote(username, ''), urllib.quote(password or '', ''))
+    if server_url.startswith('unix://'):
+        proxy = xmlrpclib.ServerProxy('http://%slocalhost/RPC2' % auth,
+                                      transport=UnixStreamTransport(server_url[len('unix://'):]))
+    elif server_url.startswith('http://'):
+        proxy = xmlrpclib.ServerProxy('http://%s%s/RPC2' % (auth, server_url[len('http://'):].rstrip('/')))
+    else:
+        raise RPCUnavailable('unsupported server url %s' % server_url)
+    try:
+        proxy.supervisor.getState()
+    except (socket.error, xmlrpclib.ProtocolError, httplib.HTTPException), e:
+        raise RPCUnavailable(str(e))
+    return proxy
+
+
+def process_full_name(info):
+    if info['group'] == info['name']:
+        return info['name']
+    return '%s:%s' % (info['group'], info['name'])
+
+
+def rpc_control(module, proxy, name, is_group, state):
+    """ Do what main() does with supervisorctl, over XML-RPC """
+
+    def get_matched_processes():
+        matched = []
+        for info in proxy.supervisor.getAllProcessInfo():
+            if is_group:
+                if info['group'] == name and info['group'] != info['name']:
+                    matched.append((process_full_name(info), info['statename']))
+            elif process_full_name(info) == name:
+                matched.append((process_full_name(info), info['statename']))
+        return matched
+
+    def multicall(method, names, allowed_faults):
+        calls = [dict(methodName=method, params=[process_name, False]) for process_name in names]
+        errors = []
+        for (process_name, result) in zip(names, proxy.system.multicall(calls)):
+            if isinstance(result, dict) and 'faultCode' in result and result['faultCode'] not in allowed_faults:
+                errors.append('%s: ERROR (%s)' % (process_name, result['faultString']))
+        if errors:
+            module.fail_json(msg='\n'.join(errors), name=name, state=state)
+
+    def wait_for(names, done, failed):
+        # one getAllProcessInfo per round covers every process we wait for
+        pending = dict([(process_name, True) for process_name in names])
+        deadline = time.time() + RPC_WAIT_TIMEOUT
+        while pending:
+            for info in proxy.supervisor.getAllProcessInfo():
+                process_name = process_full_name(info)
+                if process_name not in pending:
+                    continue
+                if info['statename'] in done:
+                    del pending[process_name]
+                elif info['statename'] in failed:
+                    module.fail_json(msg='%s: ERROR (%s)' % (process_name, info['statename']), name=name, state=state)
+            if pending:
+                if time.time() > deadline:
+                    module.fail_json(msg='timed out waiting for %s' % ', '.join(sorted(pending.keys())),
+                                     name=name, state=state)
+                time.sleep(RPC_POLL_INTERVAL)
+
+    def start(names):
+        multicall('supervisor.startProcess', names, (ALREADY_STARTED,))
+        wait_for(names, ('RUNNING',), ('FATAL', 'EXITED', 'STOPPED'))
+
+    def stop(names):
+        multicall('supervisor.stopProcess', names, (NOT_RUNNING,))
+        wait_for(names, STOPPED_STATES, ())
+
+    def update():
+        # what 'supervisorctl update' does
+        added, changed, removed = proxy.supervisor.reloadConfig()[0]
+        for group in removed + changed:
+            proxy.supervisor.stopProcessGroup(group)
+            proxy.supervisor.removeProcessGroup(group)
+        for group in changed + added:
+            proxy.supervisor.addProcessGroup(group)
+
+    def take_action_on_processes(processes, status_filter, action):
+        to_take_action_on = []
+        for process_name, status in processes:
+            if status_filter(status):
+                to_take_action_on.append(process_name)
+
+        if len(to_take_action_on) == 0:
+            module.exit_json(changed=False, name=name, state=state)
+        if module.check_mode:
+            module.exit_json(changed=True)
+        action(to_take_action_on)
+
+        module.exit_json(changed=True, name=name, state=state, affected=to_take_action_on)
+
+    def restart(names):
+        stop(names)
+        start(names)
+
+    try:
+        if state == 'restarted':
+            if not module.check_mode:
+                update()
+            processes = get_matched_processes()
+            take_action_on_processes(processes, lambda s: True, restart)
+
+        processes = get_matched_processes()
+
+        if state == 'present':
+            if len(processes) > 0:
+                module.exit_json(changed=False, name=name, state=state)
+
+            if module.check_mode:
+                module.exit_json(changed=True)
+            proxy.supervisor.reloadConfig()
+            proxy.supervisor.addProcessGroup(name)
+            module.exit_json(changed=True, name=name, state=state)
+
+        if state == 'started':
+            take_action_on_processes(processes, lambda s: s != 'RUNNING', start)
+
+        if state == 'stopped':
+            take_action_on_processes(processes, lambda s: s == 'RUNNING', stop)
+    except xmlrpclib.Fault, e:
+        module.fail_json(msg=e.faultString, name=name, state=state)
+    except (socket.error, xmlrpclib.ProtocolError, httplib.HTTPException), e:
+        module.fail_json(msg='error talking to supervisord: %s' % str(e), name=name, state=state)
+
 
 def main():
     arg_spec = dict(
@@ -101,6 +330,7 @@ def main():
         username=dict(required=False),
         password=dict(required=False),
         supervisorctl_path=dict(required=False),
+        use_xmlrpc=dict(required=False, default=False, type='bool'),
         state=dict(required=True, choices=['present', 'started', 'restarted', 'stopped'])
     )
 
@@ -118,6 +348,17 @@ def main():
     password = module.params.get('password')
     supervisorctl_path = module.params.get('supervisorctl_path')
 
+    if module.params['use_xmlrpc']:
+        try:
+            proxy = connect_rpc(module, config, server_url, username, password)
+        except RPCUnavailable:
+            # fall back to supervisorctl, which will report what is wrong
+            pass
+        except xmlrpclib.Fault, e:
+            module.fail_json(msg=e.faultString, name=name, state=state)
+        else:
+            rpc_control(module, proxy, name, is_group, state)
+
     if supervisorctl_path:
         supervisorctl_path = os.path.expanduser(supervisorctl_path)
         if os.path.exists(supervisorctl_path) and module.is_executable(supervisorctl_path):